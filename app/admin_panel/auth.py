@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
-from app.auth.auth import create_JWT_token, verify_user
+from app.auth.auth import create_user_JWT_token, verify_user
 from app.errors import NoAdminErr, UserNotFoundErr
 from app.storage.database import async_session_maker
 from app.storage.user import UserDAO
@@ -40,7 +40,7 @@ class AdminAuth(AuthenticationBackend):
         if not user.admin:
             raise NoAdminErr
 
-        token = create_JWT_token({"sub": str(user.id)})
+        token = await create_user_JWT_token(user)
         request.session.update({"token": token})
 
         return True
@@ -1,9 +1,18 @@
+from datetime import date
+from typing import Any, Optional, Tuple
+
 from sqladmin import ModelView
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.booking import Booking
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.models.user import User
+from app.storage.booking import BookingDAO
+from app.storage.cache import availability_cache
+from app.storage.database import async_session_maker
+from app.storage.user import UserDAO
 
 
 class UserAdmin(ModelView, model=User):
@@ -18,6 +27,27 @@ class UserAdmin(ModelView, model=User):
     icon = "fa-solid fa-user"
     page_size = 20
     page_size_options = [10, 50, 100]
+    # версия токенов меняется только отзывом
+    form_excluded_columns = [User.token_version]
+
+    async def after_model_change(self, data: dict, model: User, is_created: bool) -> None:
+        """
+        Админка пишет в обход UserDAO, поэтому токены измененного пользователя отзываются отдельно:
+        в режиме AUTH_STATELESS роль берется из токена.
+        """
+        if not is_created:
+            await self.revoke_tokens(model.id)
+
+    async def after_model_delete(self, model: User) -> None:
+        """
+        Отзыв токенов удаленного пользователя.
+        """
+        await self.revoke_tokens(model.id)
+
+    @staticmethod
+    async def revoke_tokens(user_id: int) -> None:
+        async with async_session_maker() as session:
+            await UserDAO.revoke_tokens(session, user_id)
 
 
 class HotelAdmin(ModelView, model=Hotel):
@@ -29,6 +59,18 @@ class HotelAdmin(ModelView, model=Hotel):
     name_plural = "Hotels"
     icon = "fa-solid fa-hotel"
 
+    async def after_model_change(self, data: dict, model: Hotel, is_created: bool) -> None:
+        """
+        Админка пишет в обход DAO, поэтому кэш свободных гостиниц сбрасывается целиком.
+        """
+        await availability_cache.invalidate_all()
+
+    async def after_model_delete(self, model: Hotel) -> None:
+        """
+        Админка пишет в обход DAO, поэтому кэш свободных гостиниц сбрасывается целиком.
+        """
+        await availability_cache.invalidate_all()
+
 
 class RoomAdmin(ModelView, model=Room):
     """
@@ -39,6 +81,18 @@ class RoomAdmin(ModelView, model=Room):
     name_plural = "Rooms"
     icon = "fa-solid fa-bed"
 
+    async def after_model_change(self, data: dict, model: Room, is_created: bool) -> None:
+        """
+        Админка пишет в обход DAO, поэтому кэш свободных гостиниц сбрасывается целиком.
+        """
+        await availability_cache.invalidate_all()
+
+    async def after_model_delete(self, model: Room) -> None:
+        """
+        Админка пишет в обход DAO, поэтому кэш свободных гостиниц сбрасывается целиком.
+        """
+        await availability_cache.invalidate_all()
+
 
 class BookingAdmin(ModelView, model=Booking):
     """
@@ -47,6 +101,83 @@ class BookingAdmin(ModelView, model=Booking):
     # Booking.__table__.columns - список колонок модели
     # [c.name for c in Booking.__table__.columns] - все названия колонок
     column_list = [c.name for c in Booking.__table__.columns] + [Booking.user]
+    # вычисляемый период проживания, для DATERANGE нет поля формы
+    form_excluded_columns = [Booking.stay]
     name = "Bookings"
     name_plural = "Booking"
     icon = "fa-solid fa-book"
+
+    async def insert_model(self, data: dict) -> Any:
+        """
+        Создание бронирования в админке под блокировкой номера с пересчетом учета занятости по его датам.
+        """
+        async with async_session_maker() as session:
+            await BookingDAO.lock_rooms(session, self.form_room_id(data))
+            model = await super().insert_model(data)
+            await self.refresh_inventory(session, self.stay(model))
+        return model
+
+    async def update_model(self, pk: Any, data: dict) -> Any:
+        """
+        Изменение бронирования в админке под блокировкой старого и нового номера
+        с пересчетом учета занятости по старым и новым датам.
+        """
+        async with async_session_maker() as session:
+            query = select(Booking.room_id, Booking.date_from, Booking.date_to).where(Booking.id == int(pk))
+            old_stay = (await session.execute(query)).one_or_none()
+            await BookingDAO.lock_rooms(session, old_stay.room_id if old_stay else None, self.form_room_id(data))
+            model = await super().update_model(pk, data)
+            await self.refresh_inventory(session, old_stay, self.stay(model))
+        return model
+
+    async def delete_model(self, obj: Booking) -> None:
+        """
+        Удаление бронирования в админке под блокировкой номера с пересчетом учета занятости по его датам.
+        """
+        async with async_session_maker() as session:
+            await BookingDAO.lock_rooms(session, obj.room_id)
+            await super().delete_model(obj)
+            await self.refresh_inventory(session, self.stay(obj))
+
+    @staticmethod
+    def form_room_id(data: dict) -> Optional[int]:
+        """
+        id номера из формы админки (поле связи room).
+        :param data: данные формы
+        :return: id номера, None - номер не указан
+        """
+        room = data.get("room")
+        try:
+            return int(getattr(room, "id", room))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def stay(model: Optional[Booking]) -> Optional[Tuple[int, date, date]]:
+        if model is None:
+            return None
+        return model.room_id, model.date_from, model.date_to
+
+    @staticmethod
+    async def refresh_inventory(session: AsyncSession, *stays: Optional[Tuple[int, date, date]]) -> None:
+        """
+        Админка пишет бронирования в обход BookingDAO (своей сессией), поэтому учет занятости пересчитывается
+        после ее записи, в транзакции session с блокировкой номеров (lock_rooms): бронирования этих номеров
+        через BookingDAO ждут пересчета. Сбрасывается кэш свободных гостиниц номеров за измененные даты.
+        :param session: async сессия БД с заблокированными номерами
+        :param stays: (id номера, дата 'с', дата 'по') бронирования до и после изменения
+        """
+        stays = [stay for stay in stays if stay is not None and stay[0] is not None]
+        # номер мог измениться без указания в форме - блокировка уже заблокированного номера ничего не ждет
+        await BookingDAO.lock_rooms(session, *(room_id for room_id, _, _ in stays))
+        for room_id, date_from, date_to in stays:
+            await BookingDAO.refresh_inventory(session, room_id, date_from, date_to)
+        hotel_ids = await BookingDAO.get_hotel_ids(session, *(room_id for room_id, _, _ in stays))
+        await session.commit()
+
+        if stays:
+            await availability_cache.invalidate_hotels(
+                hotel_ids,
+                min(date_from for _, date_from, _ in stays),
+                max(date_to for _, _, date_to in stays),
+            )
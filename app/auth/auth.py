@@ -1,36 +1,49 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
-from jose import jwt
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.revocation import token_versions
 from app.models.user import User
 from app.storage.user import UserDAO
 from config import cfg
 
-# хэш-движок
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# хэш-движок. Хэши с другой стоимостью (rounds) считаются устаревшими и перехэшируются при логине
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=cfg.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=cfg.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=cfg.BCRYPT_ROUNDS,
+)
+# bcrypt занимает CPU на сотни мс - выполняется в ограниченном пуле потоков, а не в event loop
+pwd_executor = ThreadPoolExecutor(max_workers=cfg.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """
     Хэширование пароля.
     :param password: пароль пользователя
     :return: хешированный пароль
     """
-    return pwd_context.hash(password)
+    return await asyncio.get_running_loop().run_in_executor(pwd_executor, pwd_context.hash, password)
 
 
-def verify_password(plain_password, hashed_password) -> bool:
+async def verify_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
     """
     Проверка на идентичность хэшированного пароля из БД и пароля введенного пользователем.
     :param plain_password: пароль пользователя
     :param hashed_password: хэшированный пароль из БД
-    :return: bool
+    :return: bool и новый хэш пароля, если хэш из БД устарел (иначе None)
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return await asyncio.get_running_loop().run_in_executor(
+        pwd_executor, pwd_context.verify_and_update, plain_password, hashed_password,
+    )
 
 
 async def verify_user(session: AsyncSession, email: EmailStr, password: str) -> Optional[User]:
@@ -42,8 +55,16 @@ async def verify_user(session: AsyncSession, email: EmailStr, password: str) ->
     :return: объект пользователя
     """
     user = await UserDAO.get_one(session, email=email)
-    if not (user and verify_password(password, user.hashed_password)):
+    if not user:
+        return None
+
+    verified, new_hash = await verify_password(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash is not None:
+        # перехэширование с текущей стоимостью bcrypt
+        await UserDAO.update_password_hash(session, user.id, new_hash)
+        user.hashed_password = new_hash
 
     return user
 
@@ -65,6 +86,39 @@ def create_JWT_token(data: dict) -> str:
 
     return encoded_jwt
 
+
+async def create_user_JWT_token(user: User) -> str:
+    """
+    Создание JWT-токена пользователя.
+    В режиме AUTH_STATELESS в токен добавляются email, роль и версия токенов пользователя,
+    чтобы авторизация не ходила в БД. Версия из БД записывается в redis.
+    :param user: пользователь
+    :return: JWT-токен
+    """
+    claims = {"sub": str(user.id)}
+    if cfg.AUTH_STATELESS:
+        claims.update({"email": user.email, "admin": user.admin, "ver": user.token_version})
+        await token_versions.set(user.id, user.token_version)
+
+    return create_JWT_token(claims)
+
+
+async def revoke_JWT_token(session: AsyncSession, token: Optional[str]) -> None:
+    """
+    Отзыв всех JWT-токенов пользователя по одному из них (логаут).
+    :param session: async сессия БД
+    :param token: JWT-токен
+    """
+    if not token:
+        return
+    try:
+        payload = jwt.decode(token, cfg.secret_key, cfg.sha_algorithm)
+        user_id = int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return
+
+    await UserDAO.revoke_tokens(session, user_id)
+
 # from secrets import token_bytes
 # from base64 import b64encode
 # salt = b64encode((token_bytes(32).decode()))
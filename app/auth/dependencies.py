@@ -4,18 +4,21 @@ from fastapi import Depends, Request
 from jose import ExpiredSignatureError, JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.revocation import token_versions
 from app.errors import (
     IncorrectJWTFormatErr,
     JWTExpiredErr,
+    JWTRevokedErr,
     NoAdminErr,
     TokenAbsentErr,
     UnauthorizedUserErr,
     UnknownJWTPareErr,
 )
 from app.logger import logger
-from app.models.user import User
+from app.schemas.user import UserPrincipal
 from app.storage.database import get_session
 from app.storage.user import UserDAO
+from app.timing import timed
 from config import cfg
 
 
@@ -39,45 +42,64 @@ def check_token(token: str = Depends(get_token)) -> Optional[dict]:
     :param token: JWT-токен
     :return: словарь с id пользователя {"sub": user.id}
     """
-    try:
-        # expire проверяется jwt.decode
-        payload = jwt.decode(
-            token, cfg.secret_key, cfg.sha_algorithm,
-        )
-    except ExpiredSignatureError:
-        raise JWTExpiredErr
-    except JWTError:
-        raise IncorrectJWTFormatErr
-    except Exception:
-        raise UnknownJWTPareErr
+    with timed("auth"):
+        try:
+            # expire проверяется jwt.decode
+            payload = jwt.decode(
+                token, cfg.secret_key, cfg.sha_algorithm,
+            )
+        except ExpiredSignatureError:
+            raise JWTExpiredErr
+        except JWTError:
+            raise IncorrectJWTFormatErr
+        except Exception:
+            raise UnknownJWTPareErr
 
-    return payload
+        return payload
 
 
 async def auth_user(
         session: AsyncSession = Depends(get_session),
         payload: Dict = Depends(check_token),
-) -> User:
+) -> UserPrincipal:
     """
     Авторизация пользователя.
+    В режиме AUTH_STATELESS пользователь берется из claims токена, в БД запрос не идет.
+    Токен проверяется по версии токенов пользователя в redis, если версия в redis неизвестна - по версии из БД.
     :param session: async сессия БД
-    :param payload: словарь с id пользователя {"sub": user.id}
-    :return: пользователь из БД
+    :param payload: словарь с id пользователя {"sub": user.id}, в режиме AUTH_STATELESS - и с email, admin, ver
+    :return: пользователь
     """
-    user_id: str = payload.get("sub")
-    if not user_id:
-        logger.error(UnauthorizedUserErr.detail, extra={"status_code": UnauthorizedUserErr.status_code})
-        raise UnauthorizedUserErr
+    with timed("auth"):
+        user_id: str = payload.get("sub")
+        if not user_id:
+            logger.error(UnauthorizedUserErr.detail, extra={"status_code": UnauthorizedUserErr.status_code})
+            raise UnauthorizedUserErr
 
-    user = await UserDAO.get_one(session, id=int(user_id))
-    if not user:
-        logger.error(UnauthorizedUserErr.detail, extra={"status_code": UnauthorizedUserErr.status_code})
-        raise UnauthorizedUserErr
+        if cfg.AUTH_STATELESS and "ver" in payload:
+            version = await token_versions.get(int(user_id))
+            if version is not None:
+                if payload["ver"] != version:
+                    logger.error(JWTRevokedErr.detail, extra={"status_code": JWTRevokedErr.status_code})
+                    raise JWTRevokedErr
+                return UserPrincipal(id=user_id, email=payload.get("email"), admin=payload.get("admin", False))
 
-    return user
+        user = await UserDAO.get_one(session, id=int(user_id))
+        if not user:
+            logger.error(UnauthorizedUserErr.detail, extra={"status_code": UnauthorizedUserErr.status_code})
+            raise UnauthorizedUserErr
 
+        if "ver" in payload:
+            # версия возвращается в redis: следующие запросы пользователя не ходят в БД
+            await token_versions.set(user.id, user.token_version)
+            if payload["ver"] != user.token_version:
+                logger.error(JWTRevokedErr.detail, extra={"status_code": JWTRevokedErr.status_code})
+                raise JWTRevokedErr
 
-async def admin_check(user: User = Depends(auth_user)):
+        return UserPrincipal.from_orm(user)
+
+
+async def admin_check(user: UserPrincipal = Depends(auth_user)):
     """
     Проверка роли 'админ'.
     :param user: Авторизованный пользователь.
@@ -0,0 +1,77 @@
+from typing import Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.logger import logger
+
+# версия удаленного пользователя - больше версии любого токена
+DELETED_VERSION = 2 ** 62
+# запись версии, только если она больше текущей: загрузка версии из БД параллельно с отзывом не откатывает отзыв
+SET_MAX_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if not current or current < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+"""
+
+
+class TokenVersions:
+    """
+    Кэш версий JWT-токенов пользователей в redis для отзыва токенов без похода в БД.
+    Версия хранится в БД (users.token_version) и пишется в токен при логине. Изменение пользователя и логаут
+    увеличивают версию, токены со старой версией перестают приниматься.
+    Без init() (например, в тестах), при ошибках redis и при отсутствии ключа (вытеснен, redis очищен)
+    версия неизвестна - токен проверяется по версии из БД.
+    """
+
+    def __init__(self, prefix: str):
+        """
+        :param prefix: префикс ключей redis
+        """
+        self.prefix = prefix
+        self.redis: Optional[aioredis.Redis] = None
+
+    def init(self, redis: aioredis.Redis) -> None:
+        """
+        Подключение redis.
+        :param redis: клиент redis
+        """
+        self.redis = redis
+
+    def key(self, user_id: int) -> str:
+        return f"{self.prefix}:user:{user_id}:version"
+
+    async def get(self, user_id: int) -> Optional[int]:
+        """
+        Текущая версия токенов пользователя.
+        :param user_id: id пользователя
+        :return: версия (None - версия неизвестна: redis недоступен или ключа нет)
+        """
+        if self.redis is None:
+            return None
+
+        try:
+            version = await self.redis.get(self.key(user_id))
+        except RedisError as err:
+            logger.warning("Token version get failed", extra={"user_id": user_id, "error": str(err)})
+            return None
+        return int(version) if version is not None else None
+
+    async def set(self, user_id: int, version: int) -> None:
+        """
+        Запись версии токенов пользователя из БД. Версия в redis не уменьшается.
+        :param user_id: id пользователя
+        :param version: версия
+        """
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.eval(SET_MAX_SCRIPT, 1, self.key(user_id), version)
+        except RedisError as err:
+            logger.error("Token version set failed", extra={"user_id": user_id, "error": str(err)})
+
+
+# версии токенов пользователей, подключается к redis при старте сервиса
+token_versions = TokenVersions(prefix="booking-cache:auth")
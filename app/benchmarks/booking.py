@@ -0,0 +1,221 @@
+"""
+Нагрузочный тест конкурентного бронирования одного номера.
+
+N пользователей одновременно бронируют один и тот же номер (room_id) на один и тот же период
+через POST /bookings (httpx + ASGI транспорт, без поднятия uvicorn).
+Результат: bookings/sec, перцентили задержки p50/p95/p99 и количество овербукингов -
+бронирований сверх Room.quantity хотя бы в одни сутки периода.
+
+Работает только с тестовой БД (MODE=TEST, cfg.db_url_test): все таблицы пересоздаются.
+Запуск:
+    MODE=TEST LOG_LEVEL=CRITICAL python -m app.benchmarks.booking --users 300 --concurrency 100 --room-id 1
+    MODE=TEST LOG_LEVEL=CRITICAL python -m app.benchmarks.booking --no-lock  # без блокировки номера
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List
+from unittest import mock
+
+from httpx import AsyncClient
+from sqlalchemy import Date, cast, func, insert, select, text
+
+from app.auth.auth import create_JWT_token
+from app.models.booking import Booking
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.models.user import User
+from app.storage.booking import BookingDAO
+from app.storage.database import Base, async_session_maker, engine
+from config import cfg
+from main import app as fastapi_app
+
+# хэш пароля "test" - пароли пользователей бенчмарка не проверяются, JWT выпускается напрямую
+PASSWORD_HASH = "$2b$12$ib8N/MddMjSxNs4UOF69c.KuO4CyglQHcNATYpHcKJJn5rbltYNFG"
+
+
+@dataclass
+class BenchResult:
+    """
+    Результат прогона бенчмарка.
+    """
+    duration: float
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    quantity: int = 0
+    overbooked: int = 0
+
+    @property
+    def bookings_per_sec(self) -> float:
+        return self.statuses[201] / self.duration if self.duration else 0.0
+
+    @property
+    def requests_per_sec(self) -> float:
+        return len(self.latencies) / self.duration if self.duration else 0.0
+
+    def percentile(self, p: int) -> float:
+        """
+        Перцентиль задержки в мс.
+        :param p: перцентиль 1..99
+        :return: задержка в мс
+        """
+        if len(self.latencies) < 2:
+            return self.latencies[0] * 1000 if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[p - 1] * 1000
+
+
+async def prepare_database(users: int) -> List[int]:
+    """
+    Пересоздание таблиц тестовой БД и наполнение гостиницами, номерами и пользователями (без бронирований).
+    :param users: количество пользователей
+    :return: id пользователей
+    """
+    assert cfg.MODE == "TEST"
+
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    def open_mock_json(model: str):
+        with open(f"app/tests/mock_jsons/{model}.json", encoding="utf-8") as file:
+            return json.load(file)
+
+    async with async_session_maker() as session:
+        for Model, values in [
+            (Hotel, open_mock_json("hotels")),
+            (Room, open_mock_json("rooms")),
+        ]:
+            await session.execute(insert(Model).values(values))
+
+        users_data = [
+            {"email": f"bench_{i}@example.com", "hashed_password": PASSWORD_HASH} for i in range(users)
+        ]
+        result = await session.execute(insert(User).values(users_data).returning(User.id))
+        user_ids = list(result.scalars().all())
+        await session.commit()
+
+    return user_ids
+
+
+async def count_overbooked(room_id: int, date_from: date, date_to: date) -> tuple:
+    """
+    Подсчет овербукинга по таблице bookings (в обход учета занятости room_inventory).
+    :param room_id: id комнаты
+    :param date_from: дата бронирования 'с'
+    :param date_to: дата бронирования 'по'
+    :return: (количество номеров, количество бронирований сверх количества номеров)
+    """
+    days = (
+        func.generate_series(cast(date_from, Date), cast(date_to - timedelta(days=1), Date), text("interval '1 day'"))
+        .table_valued("day")
+        .render_derived(name="days")
+    )
+    # максимальное количество бронирований номера в одни сутки периода
+    booked_per_day = (
+        select(func.count(Booking.id).label("booked"))
+        .select_from(days)
+        .join(Booking, Booking.stay.contains(cast(days.c.day, Date)))
+        .where(Booking.room_id == room_id)
+        .group_by(days.c.day)
+        .subquery()
+    )
+    async with async_session_maker() as session:
+        quantity = await session.scalar(select(Room.quantity).where(Room.id == room_id))
+        max_booked = await session.scalar(select(func.coalesce(func.max(booked_per_day.c.booked), 0)))
+
+    return quantity, max(max_booked - quantity, 0)
+
+
+async def run(users: int, concurrency: int, room_id: int, date_from: date, date_to: date) -> BenchResult:
+    """
+    Прогон бенчмарка: по одному бронированию на пользователя, не более concurrency запросов одновременно.
+    :param users: количество пользователей (запросов)
+    :param concurrency: максимальное количество одновременных запросов
+    :param room_id: id комнаты
+    :param date_from: дата бронирования 'с'
+    :param date_to: дата бронирования 'по'
+    :return: результат прогона
+    """
+    user_ids = await prepare_database(users)
+    tokens = [create_JWT_token({"sub": str(user_id)}) for user_id in user_ids]
+    params = {"room_id": room_id, "date_from": str(date_from), "date_to": str(date_to)}
+    semaphore = asyncio.Semaphore(concurrency)
+    # все запросы стартуют одновременно - после того, как созданы все корутины
+    start = asyncio.Event()
+    result = BenchResult(duration=0.0)
+
+    async def book(client: AsyncClient, token: str) -> None:
+        await start.wait()
+        async with semaphore:
+            begin = time.perf_counter()
+            response = await client.post("/bookings", params=params, cookies={"JWT": token})
+            result.latencies.append(time.perf_counter() - begin)
+            result.statuses[response.status_code] += 1
+
+    # письма с подтверждением остаются в outbox: без startup сервиса диспетчер outbox не запущен
+    async with AsyncClient(app=fastapi_app, base_url="http://test") as client:
+        tasks = [asyncio.create_task(book(client, token)) for token in tokens]
+        begin = time.perf_counter()
+        start.set()
+        await asyncio.gather(*tasks)
+        result.duration = time.perf_counter() - begin
+
+    result.quantity, result.overbooked = await count_overbooked(room_id, date_from, date_to)
+    await engine.dispose()
+    return result
+
+
+def report(result: BenchResult) -> str:
+    """
+    Отчет по результату прогона.
+    :param result: результат прогона
+    :return: текст отчета
+    """
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(result.statuses.items()))
+    return (
+        f"requests:     {len(result.latencies)} ({statuses})\n"
+        f"duration:     {result.duration:.3f} s\n"
+        f"requests/sec: {result.requests_per_sec:.1f}\n"
+        f"bookings/sec: {result.bookings_per_sec:.1f}\n"
+        f"latency p50:  {result.percentile(50):.1f} ms\n"
+        f"latency p95:  {result.percentile(95):.1f} ms\n"
+        f"latency p99:  {result.percentile(99):.1f} ms\n"
+        f"quantity:     {result.quantity}\n"
+        f"overbooked:   {result.overbooked}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Конкурентное бронирование одного номера.")
+    parser.add_argument("--users", type=int, default=200, help="количество пользователей (запросов)")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных запросов")
+    parser.add_argument("--room-id", type=int, default=1, help="id комнаты")
+    parser.add_argument("--date-from", type=date.fromisoformat, default=date(2030, 1, 1))
+    parser.add_argument("--days", type=int, default=7, help="длительность бронирования в сутках")
+    parser.add_argument("--no-lock", action="store_true", help="бронирование без блокировки номера")
+    args = parser.parse_args()
+
+    date_to = args.date_from + timedelta(days=args.days)
+    coro = run(args.users, args.concurrency, args.room_id, args.date_from, date_to)
+
+    if args.no_lock:
+        async def no_lock(session, *room_ids):
+            return None
+
+        with mock.patch.object(BookingDAO, "lock_rooms", no_lock):
+            result = asyncio.run(coro)
+    else:
+        result = asyncio.run(coro)
+
+    print(report(result))
+
+
+if __name__ == "__main__":
+    main()
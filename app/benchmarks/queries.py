@@ -0,0 +1,127 @@
+"""
+Бенчмарк сборки запросов DAO: запрос, собираемый на каждом вызове, против запроса, собранного один раз
+с параметрами bindparam (FREE_ROOMS, ROOMS_BY_TIME, HOTELS_BY_LOCATION).
+
+build   - стоимость подготовки запроса к выполнению без БД: сборка запроса, ключ кэша компиляции
+          и поиск скомпилированного запроса в кэше алхимии.
+execute - полный вызов через сессию к тестовой БД (кэш подготовленных запросов asyncpg включен).
+
+Работает только с тестовой БД (MODE=TEST, cfg.db_url_test): все таблицы пересоздаются.
+Запуск:
+    MODE=TEST LOG_LEVEL=CRITICAL python -m app.benchmarks.queries --calls 20000 --executes 500
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import Executable
+
+from app.benchmarks.booking import prepare_database
+from app.storage.booking import FREE_ROOMS, free_rooms_query
+from app.storage.database import async_session_maker, engine
+from app.storage.hotel import (
+    HOTELS_BY_LOCATION,
+    hotels_by_location_query,
+    location_params,
+)
+from app.storage.room import ROOMS_BY_TIME, rooms_by_time_query
+
+DATE_FROM = date(2030, 1, 1)
+DATE_TO = DATE_FROM + timedelta(days=7)
+
+# запрос: (сборка на каждом вызове, собранный запрос, параметры)
+QUERIES: Dict[str, Tuple[Callable[[], Executable], Executable, dict]] = {
+    "free_rooms": (
+        free_rooms_query,
+        FREE_ROOMS,
+        {"room_id": 1, "date_from": DATE_FROM, "date_to": DATE_TO},
+    ),
+    "rooms_by_time": (
+        rooms_by_time_query,
+        ROOMS_BY_TIME,
+        {"hotel_id": 1, "date_from": DATE_FROM, "date_to": DATE_TO, "days": 7},
+    ),
+    "hotels_by_location": (
+        hotels_by_location_query,
+        HOTELS_BY_LOCATION,
+        {**location_params("Алтай"), "date_from": DATE_FROM, "date_to": DATE_TO},
+    ),
+}
+
+
+def prepare_cost(get_stmt: Callable[[], Executable], calls: int) -> float:
+    """
+    Средняя стоимость подготовки запроса к выполнению, как в Connection.execute:
+    ключ кэша и поиск в кэше компиляции движка (компиляция - только при первом промахе).
+    :param get_stmt: функция, возвращающая запрос
+    :param calls: количество вызовов
+    :return: время одного вызова в мкс
+    """
+    dialect = engine.sync_engine.dialect
+    cache = engine.sync_engine._compiled_cache
+    begin = time.perf_counter()
+    for _ in range(calls):
+        stmt = get_stmt()
+        stmt._compile_w_cache(dialect, compiled_cache=cache, column_keys=[])
+    return (time.perf_counter() - begin) / calls * 1e6
+
+
+async def execute_cost(get_stmt: Callable[[], Executable], params: dict, executes: int) -> float:
+    """
+    Среднее время выполнения запроса через сессию на одном соединении.
+    :param get_stmt: функция, возвращающая запрос
+    :param params: параметры запроса
+    :param executes: количество выполнений
+    :return: время одного выполнения в мкс
+    """
+    async with async_session_maker() as session:
+        # прогрев: соединение и подготовленный запрос
+        await session.execute(get_stmt(), params)
+        begin = time.perf_counter()
+        for _ in range(executes):
+            (await session.execute(get_stmt(), params)).mappings().all()
+        return (time.perf_counter() - begin) / executes * 1e6
+
+
+async def run(calls: int, executes: int) -> List[str]:
+    """
+    Прогон бенчмарка по всем запросам.
+    :param calls: вызовов подготовки запроса
+    :param executes: выполнений запроса в БД, 0 - без БД
+    :return: строки отчета
+    """
+    if executes:
+        await prepare_database(users=1)
+
+    lines = [f"{'query':<20}{'mode':<10}{'rebuilt, us':>14}{'prebuilt, us':>14}{'speedup':>10}"]
+    for name, (build, prebuilt, params) in QUERIES.items():
+        rebuilt_cost = prepare_cost(build, calls)
+        prebuilt_cost = prepare_cost(lambda: prebuilt, calls)
+        lines.append(
+            f"{name:<20}{'build':<10}{rebuilt_cost:>14.1f}{prebuilt_cost:>14.1f}{rebuilt_cost / prebuilt_cost:>9.1f}x"
+        )
+        if not executes:
+            continue
+        rebuilt_cost = await execute_cost(build, params, executes)
+        prebuilt_cost = await execute_cost(lambda: prebuilt, params, executes)
+        lines.append(
+            f"{name:<20}{'execute':<10}{rebuilt_cost:>14.1f}{prebuilt_cost:>14.1f}{rebuilt_cost / prebuilt_cost:>9.1f}x"
+        )
+
+    await engine.dispose()
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сборка запросов DAO: на каждом вызове против собранных заранее.")
+    parser.add_argument("--calls", type=int, default=20000, help="вызовов подготовки запроса")
+    parser.add_argument("--executes", type=int, default=500, help="выполнений запроса в БД, 0 - без БД")
+    args = parser.parse_args()
+
+    print("\n".join(asyncio.run(run(args.calls, args.executes))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Бенчмарк чтения списков: объекты модели (get_all) против полей схемы ответа (get_all_fields).
+
+Оба варианта читают одни и те же номера гостиницы и валидируют их схемой ответа, как FastAPI
+при отдаче страницы (Page[RoomResponse]). Результат: время на строку в мкс и пик памяти
+(tracemalloc) на одну страницу.
+
+Работает только с тестовой БД (MODE=TEST, cfg.db_url_test): все таблицы пересоздаются.
+Запуск:
+    MODE=TEST LOG_LEVEL=CRITICAL python -m app.benchmarks.reads --rows 500 --repeats 50
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import insert
+
+from app.benchmarks.booking import prepare_database
+from app.models.room import Room
+from app.schemas.page import Page
+from app.schemas.room import RoomResponse
+from app.storage.database import async_session_maker, engine
+from app.storage.room import RoomDAO
+
+# гостиница, в которую добавляются номера бенчмарка
+HOTEL_ID = 1
+
+
+async def fill_rooms(rows: int) -> None:
+    """
+    Добавление номеров гостиницы HOTEL_ID с заполненными полями, которые не нужны схеме ответа.
+    :param rows: количество номеров
+    """
+    rooms = [
+        {
+            "hotel_id": HOTEL_ID,
+            "name": f"Bench room {i}",
+            "description": "Номер бенчмарка " * 10,
+            "price": 5000,
+            "services": ["Wi-Fi", "Кондиционер", "Телевизор", "Мини-бар"],
+            "quantity": 5,
+            "image_id": i,
+        }
+        for i in range(rows)
+    ]
+    async with async_session_maker() as session:
+        await session.execute(insert(Room).values(rooms))
+        await session.commit()
+
+
+async def read_page(read: Callable[..., Awaitable[List]], *args, rows: int) -> None:
+    """
+    Чтение страницы номеров в новой сессии и валидация схемой ответа.
+    :param read: метод DAO
+    :param args: аргументы метода после сессии
+    :param rows: размер страницы
+    """
+    async with async_session_maker() as session:
+        rooms = await read(session, *args, limit=rows, hotel_id=HOTEL_ID)
+        Page[RoomResponse](items=rooms, next_cursor=None)
+
+
+async def measure(read: Callable[..., Awaitable[List]], *args, rows: int, repeats: int) -> Tuple[float, float]:
+    """
+    Время на строку и пик памяти чтения страницы.
+    :param read: метод DAO
+    :param args: аргументы метода после сессии
+    :param rows: размер страницы
+    :param repeats: количество чтений
+    :return: (мкс на строку, пик памяти в КБ)
+    """
+    # прогрев: соединение, кэш компиляции и подготовленные запросы
+    await read_page(read, *args, rows=rows)
+
+    begin = time.process_time()
+    for _ in range(repeats):
+        await read_page(read, *args, rows=rows)
+    per_row = (time.process_time() - begin) / repeats / rows * 1e6
+
+    tracemalloc.start()
+    await read_page(read, *args, rows=rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_row, peak / 1024
+
+
+async def run(rows: int, repeats: int) -> str:
+    """
+    Прогон бенчмарка.
+    :param rows: размер страницы
+    :param repeats: количество чтений страницы
+    :return: текст отчета
+    """
+    await prepare_database(users=1)
+    await fill_rooms(rows)
+
+    entities = await measure(RoomDAO.get_all, rows=rows, repeats=repeats)
+    fields = await measure(RoomDAO.get_all_fields, RoomResponse, rows=rows, repeats=repeats)
+    await engine.dispose()
+
+    return (
+        f"{'read':<16}{'cpu, us/row':>14}{'peak, KB':>12}\n"
+        f"{'get_all':<16}{entities[0]:>14.1f}{entities[1]:>12.0f}\n"
+        f"{'get_all_fields':<16}{fields[0]:>14.1f}{fields[1]:>12.0f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Чтение списков: объекты модели против полей схемы ответа.")
+    parser.add_argument("--rows", type=int, default=500, help="размер страницы")
+    parser.add_argument("--repeats", type=int, default=50, help="количество чтений страницы")
+    args = parser.parse_args()
+
+    print(asyncio.run(run(args.rows, args.repeats)))
+
+
+if __name__ == "__main__":
+    main()
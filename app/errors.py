@@ -107,6 +107,12 @@ UnauthorizedUserErr = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+JWTRevokedErr = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="JWT token revoked",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
 UnknownJWTPareErr = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Unable to parse JWT token",
@@ -123,6 +129,16 @@ NoAdminErr = HTTPException(
     detail="You'r not admin",
 )
 
+IncorrectCursorErr = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Incorrect page cursor",
+)
+
+IncorrectCSVHeaderErr = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Incorrect CSV header",
+)
+
 DBErr = HTTPException(
     status_code=status.HTTP_400_BAD_REQUEST,
     detail="Db error",
@@ -132,3 +148,23 @@ UnknownErr = HTTPException(
     status_code=status.HTTP_400_BAD_REQUEST,
     detail="Unknown error",
 )
+
+ImageTooLargeErr = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail="Image is too large",
+)
+
+IncorrectImageFormatErr = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Incorrect image format, expected JPEG, PNG or WEBP",
+)
+
+ImageNotFoundErr = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Image not found",
+)
+
+ImageFormatNotSupportedErr = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Image format is not supported",
+)
@@ -1,10 +1,22 @@
+import atexit
 import logging
+import os
+import queue
+import random
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
+from prometheus_client import Counter
 from pythonjsonlogger import jsonlogger
 
 from config import cfg
 
+# логи, которые пишутся с долей LOG_SUCCESS_SAMPLE_RATE (логи успешных запросов)
+SAMPLED_MESSAGES = ("success",)
+
+# отброшенные логи: sampled - не попали в выборку, overflow - очередь логов переполнена
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Отброшенные записи лога", ["reason"])
+
 
 class CustomJsonFormatter(jsonlogger.JsonFormatter):
     """Форматтер логов"""
@@ -20,14 +32,86 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
             log_record["level"] = record.levelname
 
 
+class SuccessSampler(logging.Filter):
+    """
+    Выборка логов успешных запросов: пишется доля rate, логи уровня WARNING и выше пишутся всегда.
+    В записи из выборки добавляется поле sample_rate - для пересчета количества запросов по логам.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno >= logging.WARNING or record.msg not in SAMPLED_MESSAGES:
+            return True
+        if random.random() >= self.rate:
+            LOG_RECORDS_DROPPED.labels("sampled").inc()
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Передача логов в очередь без форматирования: JSON собирается и пишется в поток вывода в потоке QueueListener.
+    При переполнении очереди запись отбрасывается - логирование не блокирует event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # в очередь - копия записи без аргументов и исключения (могут не пережить передачу в другой поток),
+        # форматирование JSON остается потоку QueueListener
+        record = logging.makeLogRecord(record.__dict__)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels("overflow").inc()
+
+
+def start_listener() -> QueueListener:
+    """
+    Запуск записи логов из очереди в фоновом потоке.
+    :return: QueueListener
+    """
+    queue_listener = QueueListener(queueHandler.queue, logHandler, respect_handler_level=True)
+    queue_listener.start()
+    return queue_listener
+
+
+def restart_listener() -> None:
+    """
+    Перезапуск записи логов в дочернем процессе (воркеры celery, пул процессов):
+    поток родителя после fork не существует, у дочернего процесса - своя очередь и свой поток.
+    """
+    global listener
+    queueHandler.queue = queue.Queue(maxsize=cfg.LOG_QUEUE_SIZE)
+    listener = start_listener()
+
+
 # дефолтный встроенный логгер
 logger = logging.getLogger()
-# куда писать логи (консоль)
+# куда писать логи (консоль), пишет поток QueueListener
 logHandler = logging.StreamHandler()
 formatter = CustomJsonFormatter("%(timestamp)s %(level)s %(message)s %(module)s")
 # formatter = CustomJsonFormatter("%(timestamp)s %(level)s %(message)s %(module)s %(funcName)s")
-
 logHandler.setFormatter(formatter)
-logger.addHandler(logHandler)
+
+# логгер кладет записи в очередь, форматирование и запись - в фоновом потоке
+queueHandler = NonBlockingQueueHandler(queue.Queue(maxsize=cfg.LOG_QUEUE_SIZE))
+queueHandler.addFilter(SuccessSampler(cfg.LOG_SUCCESS_SAMPLE_RATE))
+logger.addHandler(queueHandler)
+listener = start_listener()
+os.register_at_fork(after_in_child=restart_listener)
+# при завершении процесса записи, оставшиеся в очереди, дописываются
+atexit.register(lambda: listener.stop())
 # установка уровня логгирования
 logger.setLevel(cfg.LOG_LEVEL)
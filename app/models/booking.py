@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Computed, Date, ForeignKey, Integer
+from sqlalchemy import Column, Computed, Date, ForeignKey, Index, Integer, cast, func
+from sqlalchemy.dialects.postgresql import DATERANGE
 from sqlalchemy.orm import relationship
 
 from app.storage.database import Base
@@ -15,10 +16,19 @@ class Booking(Base):
     price = Column(Integer, nullable=False)
     total_cost = Column(Integer, Computed("(date_to - date_from) * price"))
     total_days = Column(Integer, Computed("date_to - date_from"))
+    # период проживания [date_from, date_to)
+    stay = Column(DATERANGE, Computed("daterange(date_from, date_to)"))
 
     user = relationship("User", back_populates="booking")
     room = relationship("Room", back_populates="booking")
 
+    __table_args__ = (
+        # поиск пересекающихся бронирований номера: room_id = ... AND stay && ... (требует btree_gist)
+        Index("ix_bookings_room_id_stay", "room_id", "stay", postgresql_using="gist"),
+        # постраничная выборка бронирований пользователя: user_id = ... AND id > ... ORDER BY id
+        Index("ix_bookings_user_id_id", "user_id", "id"),
+    )
+
     def __str__(self):
         return f"Booking #{self.id}"
 
@@ -47,3 +57,13 @@ class Booking(Base):
             "date_from": self.date_from,
             "date_to": self.date_to,
         }
+
+    @classmethod
+    def overlaps(cls, date_from, date_to):
+        """
+        Условие пересечения бронирования с периодом [date_from, date_to).
+        :param date_from: дата 'с'
+        :param date_to: дата 'по'
+        :return: условие stay && daterange(date_from, date_to)
+        """
+        return cls.stay.overlaps(func.daterange(cast(date_from, Date), cast(date_to, Date)))
@@ -1,4 +1,4 @@
-from sqlalchemy import ARRAY, Column, Integer, String
+from sqlalchemy import ARRAY, Column, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.storage.database import Base
@@ -16,6 +16,12 @@ class Hotel(Base):
 
     rooms = relationship("Room", back_populates="hotel", cascade="all, delete", passive_deletes=True)
 
+    __table_args__ = (
+        # поиск по подстроке ILIKE и по похожести (требует pg_trgm)
+        Index("ix_hotels_location_trgm", "location", postgresql_using="gin", postgresql_ops={"location": "gin_trgm_ops"}),
+        Index("ix_hotels_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
     def __str__(self):
         return f"Отель {self.name} {self.location[:30]}"
 
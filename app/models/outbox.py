@@ -0,0 +1,44 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.storage.database import Base
+
+
+class Outbox(Base):
+    """
+    Модель исходящих сообщений (transactional outbox).
+    Строка пишется в той же транзакции, что и изменение данных, и отправляется в celery отдельно:
+    task - имя задачи celery, payload - именованные аргументы задачи.
+    """
+    __tablename__ = "outbox"
+
+    task = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # время отправки в брокер, NULL - сообщение еще не отправлено
+    delivered_at = Column(DateTime(timezone=True))
+    # количество неудачных попыток отправки
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # время следующей попытки после ошибки отправки, NULL - сообщение отправляется сразу
+    next_attempt_at = Column(DateTime(timezone=True))
+    # время перевода в dead letter после OUTBOX_MAX_ATTEMPTS ошибок, такие сообщения больше не отправляются
+    failed_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # выборка сообщений к отправке по порядку - индекс содержит только их
+        Index("ix_outbox_pending", "id", postgresql_where=text("delivered_at IS NULL AND failed_at IS NULL")),
+    )
+
+    def __str__(self):
+        return f"Outbox #{self.id} {self.task}"
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}, "
+            f"id={self.id}, "
+            f"task={self.task}, "
+            f"created_at={self.created_at}, "
+            f"delivered_at={self.delivered_at}, "
+            f"attempts={self.attempts}, "
+            f"failed_at={self.failed_at}, "
+        )
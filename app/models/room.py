@@ -1,4 +1,4 @@
-from sqlalchemy import ARRAY, Column, ForeignKey, Integer, String
+from sqlalchemy import ARRAY, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.storage.database import Base
@@ -19,6 +19,11 @@ class Room(Base):
     hotel = relationship("Hotel", back_populates="rooms")
     booking = relationship("Booking", back_populates="room", cascade="all, delete", passive_deletes=True)
 
+    __table_args__ = (
+        # постраничная выборка номеров гостиницы: hotel_id = ... AND id > ... ORDER BY id
+        Index("ix_rooms_hotel_id_id", "hotel_id", "id"),
+    )
+
     def __str__(self):
         return f"Room {self.name}"
 
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, UniqueConstraint
+
+from app.storage.database import Base
+
+
+class RoomInventory(Base):
+    """
+    Модель учета занятости номеров по дням.
+    Одна строка - один номер (room_id) в одни сутки (day), booked - количество забронированных номеров.
+    """
+    __tablename__ = "room_inventory"
+
+    room_id = Column(ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    booked = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # ключ для upsert (ON CONFLICT) и выборки по номеру за период
+        UniqueConstraint("room_id", "day"),
+        # выборка по всем номерам за период
+        Index("ix_room_inventory_day", "day"),
+    )
+
+    def __str__(self):
+        return f"Room #{self.room_id} {self.day}"
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}, "
+            f"id={self.id}, "
+            f"room_id={self.room_id}, "
+            f"day={self.day}, "
+            f"booked={self.booked}, "
+        )
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String
+from sqlalchemy import Boolean, Column, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.storage.database import Base
@@ -11,6 +11,8 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     hashed_password = Column(String, nullable=False)
     admin = Column(Boolean, nullable=False, default=False, server_default="false")
+    # версия JWT-токенов: увеличивается при изменении пользователя и логауте, токены старой версии отозваны
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     booking = relationship("Booking", back_populates="user")
 
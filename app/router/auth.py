@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Request, Response
 from pydantic import parse_obj_as
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.auth import create_JWT_token, get_password_hash, verify_user
+from app.auth.auth import (
+    create_user_JWT_token,
+    get_password_hash,
+    revoke_JWT_token,
+    verify_user,
+)
 from app.auth.dependencies import auth_user
 from app.errors import IncorrectEmailOrPasswordErr, UserAlreadyExistsErr
 from app.models.user import User
-from app.schemas.user import UserLoginRequest, UserRequest, UserResponse
-from app.storage.database import get_session
+from app.schemas.user import UserLoginRequest, UserPrincipal, UserRequest, UserResponse
+from app.storage.database import SessionRoute, get_session
 from app.storage.user import UserDAO
 
 # регистрация роута авторизации
 router = APIRouter(
     prefix="/auth",
     tags=["Auth"],
+    route_class=SessionRoute,
 )
 
 
@@ -32,7 +38,7 @@ async def register_user(
     if exist_user:
         raise UserAlreadyExistsErr
 
-    hashed_password: str = get_password_hash(user.password)
+    hashed_password: str = await get_password_hash(user.password)
     return await UserDAO.add(session, user.hash_pass_replace(hashed_password))
 
 
@@ -53,29 +59,36 @@ async def login_user(
     if not user:
         raise IncorrectEmailOrPasswordErr
 
-    token = create_JWT_token({"sub": str(user.id)})
+    token = await create_user_JWT_token(user)
     # response добавляет в ответ куку, возращать что то в ответе не требуется
     response.set_cookie("JWT", token, httponly=True)
     return {"JWT": token}
 
 
 @router.post("/logout")
-async def logout_user(response: Response) -> dict[str, str]:
+async def logout_user(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_session),
+) -> dict[str, str]:
     """
-    Логаут пользователя. Удаление из хедера куки с JWT-токеном
+    Логаут пользователя. Удаление из хедера куки с JWT-токеном и отзыв выписанных пользователю токенов.
+    :param request: входящий запрос с кукой JWT-токена
     :param response: http ответ, из куки которого удаляется JWT-токен
+    :param session: async сессия БД
     :return: информационное сообщение
     """
+    await revoke_JWT_token(session, request.cookies.get("JWT"))
     response.delete_cookie("JWT")
     return {"message": "logged out"}
 
 
 @router.get("/me")
-async def current_login_user(user: User = Depends(auth_user)) -> UserResponse:
+async def current_login_user(user: UserPrincipal = Depends(auth_user)) -> UserResponse:
     """
     Требуется авторизация.
     Проверка, кто залогинен.
-    :param user: пользователь из БД, полученный после авторизации
+    :param user: пользователь, полученный после авторизации
     :return: пользователь JSON
     """
     # return user
@@ -1,82 +1,141 @@
+import csv
+import io
+import json
 from datetime import date, datetime, timedelta
-from typing import Any, List
+from typing import Any, AsyncIterator, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import parse_obj_as
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.dependencies import auth_user
+from app.auth.dependencies import admin_check, auth_user
 from app.errors import (
     BookingNotFoundErr,
+    DateFromAfterDateToErr,
     EmptyFieldsToUpdateErr,
     NoAvailableRoomsErr,
     NoBookingsErr,
 )
-from app.models.user import User
 from app.schemas.booking import BookingResponse, BookingUpdateRequest
+from app.schemas.page import Page
+from app.schemas.user import UserPrincipal
 from app.storage.booking import BookingDAO
-from app.storage.database import get_session
-from app.tasks.tasks import send_booking_confirmation_email
+from app.storage.database import (
+    SessionRoute,
+    get_read_session,
+    get_session,
+    read_router,
+    read_your_writes,
+)
+from app.tasks.outbox import outbox_dispatcher
 from app.utils import set_new_fields
 
 # регистрация роута бронирования
 router = APIRouter(
     prefix="/bookings",
     tags=["Bookings"],
+    route_class=SessionRoute,
 )
 
+# количество строк в одной части выгрузки бронирований
+EXPORT_CHUNK_SIZE = 1000
+# поля выгрузки бронирований
+EXPORT_FIELDS = list(BookingResponse.__fields__)
+
 
 @router.post("", status_code=201)
 async def add_booking(
         room_id: int,
+        response: Response,
         date_from: date = Query(..., description=f"Например, {datetime.now().date()}"),
         date_to: date = Query(..., description=f"Например, {(datetime.now() + timedelta(days=14)).date()}"),
-        user: User = Depends(auth_user),
+        user: UserPrincipal = Depends(auth_user),
         session: AsyncSession = Depends(get_session),
 ):
     """
     Создание нового бронирования комнаты по ее id.
     :param room_id: id комнаты
+    :param response: ответ - кука чтения своих записей
     :param date_from: дата бронирования 'с'
     :param date_to: дата бронирования 'по'
-    :param user: пользователь из БД, полученный после авторизации
+    :param user: пользователь, полученный после авторизации
     :param session: async сессия БД
     :return: новое бронирование
     """
-    # получение свободных комнат по id комнаты в указанные даты и ифно по гостинице
-    room_hotel_info = await BookingDAO.get_free_rooms(session, room_id, date_from, date_to)
+    if date_from > date_to:
+        raise DateFromAfterDateToErr
+
+    # бронирование с проверкой свободных комнат одним запросом, вместе с названиями номера и гостиницы.
+    # Письмо с подтверждением пишется в outbox в той же транзакции - запрос не обращается к брокеру celery
+    booking = await BookingDAO.add(session, user.id, room_id, date_from, date_to)
     # проверка на свободные комнаты
-    if room_hotel_info[0]["free_rooms"] <= 0:
+    if not booking:
         raise NoAvailableRoomsErr
-    booking = await BookingDAO.add(session, user.id, room_id, date_from, date_to)
-    # парсинг ответа алхимии в словарь для celery
-    booking_dict = parse_obj_as(BookingResponse, booking).dict()
-    # фоновый вызов celery
-    send_booking_confirmation_email.delay(
-        booking_dict,
-        user.email,
-        room_hotel_info[0]["room_name"],
-        room_hotel_info[0]["hotel_name"]
-    )
+    # отправка письма в celery без ожидания интервала опроса outbox
+    outbox_dispatcher.wake()
+    # пользователь увидит свое бронирование, даже если реплика еще не догнала запись
+    read_your_writes(response)
+    # парсинг ответа алхимии в словарь
+    booking_dict = parse_obj_as(BookingResponse, dict(booking)).dict()
     # выходная валидация не требуется, booking_dict провалидирован parse_obj_as()
     return booking_dict
 
 
+async def export_bookings_chunks(format: str) -> AsyncIterator[str]:
+    """
+    Генератор выгрузки всех бронирований частями в формате NDJSON или CSV.
+    Сессия открывается в генераторе: соединение с БД живет ровно столько, сколько идет выгрузка.
+    :param format: формат выгрузки - ndjson или csv
+    :return: асинхронный генератор частей выгрузки
+    """
+    if format == "csv":
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+
+    # выгрузка - долгое чтение, идет на реплику
+    async with await read_router.session() as session:
+        async for bookings in BookingDAO.stream_all(session, EXPORT_CHUNK_SIZE):
+            if format == "csv":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows([booking[field] for field in EXPORT_FIELDS] for booking in bookings)
+                yield buffer.getvalue()
+            else:
+                yield "".join(json.dumps(dict(booking), default=str) + "\n" for booking in bookings)
+
+
+@router.get("/export", dependencies=[Depends(admin_check)])
+async def export_bookings(
+        format: Literal["ndjson", "csv"] = Query("ndjson", description="Формат выгрузки"),
+) -> StreamingResponse:
+    """
+    Доступно под ролью - админ.
+    Потоковая выгрузка всех бронирований в формате NDJSON или CSV.
+    :param format: формат выгрузки - ndjson или csv
+    :return: файл выгрузки. http response
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_bookings_chunks(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=bookings.{format}"},
+    )
+
+
 @router.get("/{booking_id}")
 async def get_booking_by_id(
         booking_id: int,
-        user: User = Depends(auth_user),
-        session: AsyncSession = Depends(get_session),
+        user: UserPrincipal = Depends(auth_user),
+        session: AsyncSession = Depends(get_read_session),
 ) -> BookingResponse:
     """
     Требуется авторизация.
     Получение бронирования по id.
     :param booking_id: id бронирования
-    :param user: пользователь из БД, полученный после авторизации
+    :param user: пользователь, полученный после авторизации
     :param session: async сессия БД
     :return: бронирование. http response
     """
-    booking = await BookingDAO.get_one(session, id=booking_id, user_id=user.id)
+    booking = await BookingDAO.get_one_fields(session, BookingResponse, id=booking_id, user_id=user.id)
     if not booking:
         raise BookingNotFoundErr
 
@@ -85,28 +144,33 @@ async def get_booking_by_id(
 
 @router.get("")
 async def get_all_bookings_by_user(
-        user: User = Depends(auth_user),
-        session: AsyncSession = Depends(get_session),
-) -> List[BookingResponse]:
+        limit: int = Query(50, ge=1, le=500, description="Размер страницы"),
+        after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущего ответа"),
+        user: UserPrincipal = Depends(auth_user),
+        session: AsyncSession = Depends(get_read_session),
+) -> Page[BookingResponse]:
     """
     Требуется авторизация.
-    Получение всех бронирований пользователя.
-    :param user: пользователь из БД, полученный после авторизации
+    Получение всех бронирований пользователя постранично.
+    :param limit: размер страницы
+    :param after: курсор страницы
+    :param user: пользователь, полученный после авторизации
     :param session: async сессия БД
-    :return: список бронирований. http response
+    :return: страница бронирований. http response
     """
-    bookings = await BookingDAO.get_all(session, user_id=user.id)
-    if len(bookings) == 0:
+    bookings, next_cursor = await BookingDAO.get_page(session, limit, after, schema=BookingResponse, user_id=user.id)
+    if len(bookings) == 0 and after is None:
         raise NoBookingsErr
 
-    return bookings
+    return {"items": bookings, "next_cursor": next_cursor}
 
 
 @router.put("/{booking_id}")
 async def update_booking_by_id(
         booking_id: int,
         new_fields: BookingUpdateRequest,
-        user: User = Depends(auth_user),
+        response: Response,
+        user: UserPrincipal = Depends(auth_user),
         session: AsyncSession = Depends(get_session),
 ) -> BookingResponse:
     """
@@ -114,7 +178,8 @@ async def update_booking_by_id(
     Изменение бронирования пользователя по id.
     :param booking_id: id бронирования
     :param new_fields: новые поля
-    :param user: пользователь из БД, полученный после авторизации
+    :param response: ответ - кука чтения своих записей
+    :param user: пользователь, полученный после авторизации
     :param session: async сессия БД
     :return: измененное бронирование. http response
     """
@@ -139,20 +204,24 @@ async def update_booking_by_id(
     if free_rooms <= 0:
         raise NoAvailableRoomsErr
 
-    return await BookingDAO.update(session, updated_fields, booking_id)
+    booking = await BookingDAO.update(session, updated_fields, booking_id)
+    read_your_writes(response)
+    return booking
 
 
 @router.delete("/{booking_id}")
 async def delete_booking_by_id(
         booking_id: int,
-        user: User = Depends(auth_user),
+        response: Response,
+        user: UserPrincipal = Depends(auth_user),
         session: AsyncSession = Depends(get_session),
 ) -> BookingResponse:
     """
     Требуется авторизация.
     Удаление бронирования пользователя по id.
     :param booking_id: id бронирования
-    :param user: пользователь из БД, полученный после авторизации
+    :param response: ответ - кука чтения своих записей
+    :param user: пользователь, полученный после авторизации
     :param session: async сессия БД
     :return: удаленное бронирование
     """
@@ -160,4 +229,6 @@ async def delete_booking_by_id(
     if not booking:
         raise BookingNotFoundErr
 
-    return await BookingDAO.delete(session, booking_id)
+    booking = await BookingDAO.delete(session, booking_id)
+    read_your_writes(response)
+    return booking
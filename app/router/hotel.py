@@ -1,9 +1,7 @@
-import asyncio
 from datetime import date, datetime, timedelta
-from typing import Any, List
+from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, Query
-from fastapi_cache.decorator import cache
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies import admin_check
@@ -22,7 +20,14 @@ from app.schemas.hotel import (
     HotelResponse,
     HotelUpdateRequest,
 )
-from app.storage.database import get_session
+from app.schemas.page import Page
+from app.storage.cache import availability_cache
+from app.storage.database import (
+    SessionRoute,
+    async_session_maker,
+    get_read_session,
+    get_session,
+)
 from app.storage.hotel import HotelDAO
 from app.utils import set_new_fields
 
@@ -30,33 +35,44 @@ from app.utils import set_new_fields
 router = APIRouter(
     prefix="/hotels",
     tags=["Hotels"],
+    route_class=SessionRoute,
 )
 
 
 @router.get("/location")
-@cache(expire=60)
 async def get_hotels_by_location(
         location: str,
         date_from: date = Query(..., description=f"Например, {datetime.now().date()}"),
         date_to: date = Query(..., description=f"Например, {(datetime.now() + timedelta(days=14)).date()}"),
-        session: AsyncSession = Depends(get_session),
 ) -> List[HotelByLocationResponse]:
     """
     Получение списока отелей по заданным параметрам, причем в отеле должен быть минимум 1 свободный номер.
     :param location: местонахождение гостиницы
     :param date_from: дата бронирования 'с'
     :param date_to: дата бронирования 'по'
-    :param session: session: async сессия БД
     :return: список гостиниц. http response. Выходная валидация через HotelByLocationResponse
     """
-    await asyncio.sleep(3)
     if date_from > date_to:
         raise DateFromAfterDateToErr
 
     if (date_to - date_from).days > 31:
         raise LongPeriodBookingErr
 
-    hotels = await HotelDAO.get_hotels_by_location(session, location, date_from, date_to)
+    # одна и та же локация - в ключе кэша и в запросе загрузки
+    location = location.strip()
+
+    async def load_hotels():
+        # своя сессия: загрузка может выполняться в фоне после ответа (обновление устаревшего значения кэша).
+        # Загрузка идет в основную БД: реплика с отставанием положила бы в кэш доступность до инвалидации
+        async with async_session_maker() as session:
+            hotels = await HotelDAO.get_hotels_by_location(session, location, date_from, date_to)
+            # теги - все гостиницы локации: после отмены бронирования в выдачу может попасть гостиница без номеров
+            hotel_ids = await HotelDAO.get_hotel_ids_by_location(session, location)
+        return [dict(hotel) for hotel in hotels], hotel_ids
+
+    # кэш инвалидируется при изменении бронирований, номеров и гостиниц
+    hotels = await availability_cache.get_or_load(location, date_from, date_to, load_hotels)
+
     if len(hotels) == 0:
         raise HotelNotFoundErr
 
@@ -85,7 +101,7 @@ async def add_hotel(
 @router.get("/{hotel_id}")
 async def get_hotel_by_id(
         hotel_id: int,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
 ) -> HotelResponse:
     """
     Получение гостиницы по id.
@@ -93,7 +109,7 @@ async def get_hotel_by_id(
     :param session: async сессия БД
     :return: гостиница. http response
     """
-    hotel = await HotelDAO.get_one(session, id=hotel_id)
+    hotel = await HotelDAO.get_one_fields(session, HotelResponse, id=hotel_id)
     if not hotel:
         raise HotelNotFoundErr
 
@@ -102,18 +118,22 @@ async def get_hotel_by_id(
 
 @router.get("")
 async def get_all_hotels(
-        session: AsyncSession = Depends(get_session),
-) -> List[HotelResponse]:
+        limit: int = Query(50, ge=1, le=500, description="Размер страницы"),
+        after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущего ответа"),
+        session: AsyncSession = Depends(get_read_session),
+) -> Page[HotelResponse]:
     """
-    Получение всех гостиниц.
+    Получение всех гостиниц постранично.
+    :param limit: размер страницы
+    :param after: курсор страницы
     :param session: async сессия БД
-    :return: список гостиниц. http response
+    :return: страница гостиниц. http response
     """
-    hotels = await HotelDAO.get_all(session)
-    if len(hotels) == 0:
+    hotels, next_cursor = await HotelDAO.get_page(session, limit, after, schema=HotelResponse)
+    if len(hotels) == 0 and after is None:
         raise NoHotelsErr
 
-    return hotels
+    return {"items": hotels, "next_cursor": next_cursor}
 
 
 @router.put("/{hotel_id}", dependencies=[Depends(admin_check)])
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+from app.errors import ImageFormatNotSupportedErr, ImageNotFoundErr
+from app.storage.images import hotel_image_path, image_cache, image_store
+from app.tasks.images import is_supported, render
+from config import cfg
+
+# регистрация роута фото
+router = APIRouter(
+    prefix="/images",
+    tags=["Images"],
+)
+
+# кэширование неизменяемых ответов браузером и nginx - год
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# кэширование варианта фото по URL без версии - час, затем перепроверка по ETag
+IMAGE_CACHE_CONTROL = "public, max-age=3600"
+# media type форматов вариантов фото
+IMAGE_MEDIA_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpeg": "image/jpeg",
+}
+
+# пул потоков построения вариантов фото: Pillow отпускает GIL при декодировании, масштабировании и кодировании
+resize_executor = ThreadPoolExecutor(max_workers=cfg.IMAGE_RESIZE_WORKERS, thread_name_prefix="image-resize")
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Раздача файлов, содержимое которых по URL не меняется (версия в имени файла),
+    с разрешением кэшировать их навсегда.
+    """
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def hotel_image_url(image_id: int, width: Optional[int] = None, height: Optional[int] = None) -> str:
+    """
+    URL варианта фото гостиницы с версией фото: при замене фото URL меняется, поэтому ответ кэшируется навсегда.
+    :param image_id: id фото
+    :param width: ширина
+    :param height: высота
+    :return: URL
+    """
+    source = hotel_image_path(image_id)
+    params = {"w": width, "h": height, "v": image_store.version(source) if source else None}
+    query = "&".join(f"{key}={value}" for key, value in params.items() if value is not None)
+    return f"{router.prefix}/hotels/{image_id}" + (f"?{query}" if query else "")
+
+
+@router.get("/hotels/{image_id}")
+async def get_hotel_image(
+        image_id: int,
+        request: Request,
+        w: Optional[int] = Query(None, ge=16, le=4000, description="Ширина"),
+        h: Optional[int] = Query(None, ge=16, le=4000, description="Высота"),
+        fmt: Literal["webp", "avif", "jpeg"] = Query("webp", description="Формат"),
+        v: Optional[str] = Query(None, description="Версия фото"),
+) -> Response:
+    """
+    Вариант фото гостиницы, вписанный в w x h с сохранением пропорций.
+    Строится при первом запросе в пуле потоков и хранится в кэше на диске.
+    :param image_id: id фото
+    :param request: запрос
+    :param w: ширина
+    :param h: высота
+    :param fmt: формат - webp, avif, jpeg
+    :param v: версия фото из hotel_image_url, если совпадает с текущей - ответ кэшируется навсегда
+    :return: фото
+    """
+    if not is_supported(fmt):
+        raise ImageFormatNotSupportedErr
+
+    source = hotel_image_path(image_id)
+    version = image_store.version(source) if source else None
+    if version is None:
+        raise ImageNotFoundErr
+
+    key = hashlib.sha256(f"{image_id}:{version}:{w}:{h}:{fmt}".encode()).hexdigest()
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if v == version else IMAGE_CACHE_CONTROL,
+    }
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    async def render_variant() -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(resize_executor, render, str(source), w, h, fmt)
+
+    path = await image_cache.get_or_render(key, render_variant)
+    return FileResponse(path, media_type=IMAGE_MEDIA_TYPES[fmt], headers=headers)
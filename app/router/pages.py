@@ -3,6 +3,8 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from app.router.hotel import get_hotels_by_location
+from app.router.images import hotel_image_url
+from app.timing import timed
 
 # регистрация роута для HTML страниц
 router = APIRouter(
@@ -12,6 +14,8 @@ router = APIRouter(
 
 # движок шаблонов
 templates = Jinja2Templates(directory="app/frontend/templates")
+# URL вариантов фото гостиниц нужного размера
+templates.env.globals["hotel_image_url"] = hotel_image_url
 
 
 @router.get("/hotels", response_class=HTMLResponse)
@@ -25,7 +29,9 @@ async def hotels(
     :param hotels: локация гостиницы
     :return: html страница
     """
-    return templates.TemplateResponse(
-        name="hotels.html",
-        context={"request": request, "hotels": hotels}
-    )
+    # шаблон рендерится при создании ответа
+    with timed("template"):
+        return templates.TemplateResponse(
+            name="hotels.html",
+            context={"request": request, "hotels": hotels}
+        )
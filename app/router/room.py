@@ -1,5 +1,5 @@
 from datetime import date, datetime, timedelta
-from typing import Any, List
+from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,8 +14,9 @@ from app.errors import (
     RoomNotFoundErr,
 )
 from app.models.room import Room
+from app.schemas.page import Page
 from app.schemas.room import RoomRequest, RoomResponse, RoomUpdateRequest
-from app.storage.database import get_session
+from app.storage.database import SessionRoute, get_read_session, get_session
 from app.storage.hotel import HotelDAO
 from app.storage.room import RoomDAO
 from app.utils import set_new_fields
@@ -24,6 +25,7 @@ from app.utils import set_new_fields
 router = APIRouter(
     prefix="/hotels",
     tags=["Rooms"],
+    route_class=SessionRoute,
 )
 
 
@@ -32,7 +34,7 @@ async def get_rooms_by_time(
         hotel_id: int,
         date_from: date = Query(..., description=f"Например, {datetime.now().date()}"),
         date_to: date = Query(..., description=f"Например, {(datetime.now() + timedelta(days=14)).date()}"),
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
 ) -> List[RoomResponse]:
     """
     Получение списока всех свободных для бронирования номеров определенной гостиницы.
@@ -74,7 +76,7 @@ async def add_room(
 async def get_room_by_id(
         room_id: int,
         hotel_id: int,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
 ) -> RoomResponse:
     """
     Получение номера по id.
@@ -87,7 +89,7 @@ async def get_room_by_id(
     if not hotel:
         raise HotelNotFoundErr
 
-    room = await RoomDAO.get_one(session, hotel_id=hotel_id, id=room_id)
+    room = await RoomDAO.get_one_fields(session, RoomResponse, hotel_id=hotel_id, id=room_id)
     if not room:
         raise RoomNotFoundErr
 
@@ -97,23 +99,27 @@ async def get_room_by_id(
 @router.get("/{hotel_id}/rooms")
 async def get_all_rooms_by_hotel(
         hotel_id: int,
-        session: AsyncSession = Depends(get_session),
-) -> List[RoomResponse]:
+        limit: int = Query(50, ge=1, le=500, description="Размер страницы"),
+        after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущего ответа"),
+        session: AsyncSession = Depends(get_read_session),
+) -> Page[RoomResponse]:
     """
-    Получение всех номеров гостиницы.
+    Получение всех номеров гостиницы постранично.
     :param hotel_id: id гостиницы
+    :param limit: размер страницы
+    :param after: курсор страницы
     :param session: async сессия БД
-    :return: список номеров. http response
+    :return: страница номеров. http response
     """
     hotel = await HotelDAO.get_one(session, id=hotel_id)
     if not hotel:
         raise HotelNotFoundErr
 
-    rooms = await RoomDAO.get_all(session, hotel_id=hotel_id)
-    if len(rooms) == 0:
+    rooms, next_cursor = await RoomDAO.get_page(session, limit, after, schema=RoomResponse, hotel_id=hotel_id)
+    if len(rooms) == 0 and after is None:
         raise NoRoomsErr
 
-    return rooms
+    return {"items": rooms, "next_cursor": next_cursor}
 
 
 @router.put("/{hotel_id}/rooms/{room_id}", dependencies=[Depends(admin_check)])
@@ -1,20 +1,37 @@
-import shutil
+import asyncio
+import time
+from typing import AsyncIterator, Literal
 
 import sqlparse
 from fastapi import APIRouter, Depends, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies import admin_check
-from app.storage.database import get_session
-from app.storage.uploader import upload_sql_queries
+from app.errors import IncorrectCSVHeaderErr
+from app.models.booking import Booking
+from app.models.hotel import Hotel
+from app.models.room import Room
+from app.storage.database import SessionRoute, get_session
+from app.storage.images import HOTEL_IMAGES_DIR, image_store, unlink_hotel_images
+from app.storage.uploader import csv_columns, upload_csv, upload_sql_queries
 from app.tasks.tasks import picture_compression
 
 # регистрация роута загрузчика
 router = APIRouter(
     prefix="/upload",
     tags=["Uploader"],
+    route_class=SessionRoute,
 )
 
+# таблицы, доступные для загрузки из CSV
+CSV_MODELS = {
+    "hotels": Hotel,
+    "rooms": Room,
+    "bookings": Booking,
+}
+# размер части файла, передаваемой в COPY
+CSV_CHUNK_SIZE = 1024 * 1024
+
 
 @router.post("/sql", dependencies=[Depends(admin_check)])
 async def upload_from_sql_file(
@@ -39,22 +56,77 @@ async def upload_from_sql_file(
     return "sql scripts loaded successfully"
 
 
+async def read_file_chunks(file: UploadFile, first: bytes) -> AsyncIterator[bytes]:
+    """
+    Генератор частей файла.
+    :param file: файл
+    :param first: уже прочитанная часть файла
+    :return: асинхронный генератор частей файла
+    """
+    if first:
+        yield first
+    while chunk := await file.read(CSV_CHUNK_SIZE):
+        yield chunk
+
+
+@router.post("/csv/{table}", dependencies=[Depends(admin_check)])
+async def upload_from_csv_file(
+        table: Literal["hotels", "rooms", "bookings"],
+        file: UploadFile,
+        session: AsyncSession = Depends(get_session)
+) -> dict:
+    """
+    Доступно под ролью - админ.
+    Хендлер загрузки в таблицу CSV-файла через COPY.
+    Первая строка файла - заголовок с названиями колонок таблицы, в любом порядке.
+    :param table: таблица - hotels, rooms или bookings
+    :param file: CSV-файл с заголовком
+    :param session: async сессия БД
+    :return: количество загруженных строк и скорость загрузки
+    """
+    start_time = time.perf_counter()
+    model = CSV_MODELS[table]
+
+    # заголовок - до первого перевода строки в первой части файла
+    header, sep, rows = (await file.read(CSV_CHUNK_SIZE)).partition(b"\n")
+    if not sep:
+        raise IncorrectCSVHeaderErr
+    columns = csv_columns(model, header)
+
+    rows_count = await upload_csv(session, model, columns, read_file_chunks(file, rows))
+    duration = time.perf_counter() - start_time
+    return {
+        "table": table,
+        "rows": rows_count,
+        "duration": round(duration, 4),
+        "rows_per_sec": round(rows_count / duration, 1) if duration else None,
+    }
+
+
 @router.post("/image/hotel", dependencies=[Depends(admin_check)])
 async def add_hotel_image(
         name: int,
         file: UploadFile,
-):
+) -> dict:
     """
     Доступно под ролью - админ.
     Хендлер загрузки в проект фото гостиниц, форматы: JPEG, PNG, WEBP.
+    Фото пишется частями в контентно-адресуемое хранилище, одинаковые фото хранятся один раз.
     :param name: id фото
     :param file: файл
-    :return: информационное сообщение
+    :return: sha256 фото, неизменяемый URL, размер в байтах, было ли фото уже в хранилище
     """
-    image_path = f"app/frontend/static/images/hotels/{name}.webp"
-    with open(image_path, "wb+") as file_object:
-        # Сохраняем файл в локальное хранилище
-        shutil.copyfileobj(file.file, file_object)
-    # фоновый вызов celery
-    picture_compression.delay(image_path)
-    return "file loaded successfully"
+    image = await image_store.save(file)
+    # имя фото гостиницы - ссылка на файл хранилища, по нему фото ищут шаблоны и обработка вариантов
+    image_path = HOTEL_IMAGES_DIR / f"{name}{image['path'].suffix}"
+    await image_store.link(image["path"], image_path)
+    # прежнее фото могло быть загружено в другом формате
+    await asyncio.to_thread(unlink_hotel_images, name, image_path)
+    # фоновый вызов celery, отправка в брокер - блокирующая, в потоке
+    await asyncio.to_thread(picture_compression.delay, str(image_path))
+    return {
+        "sha256": image["sha256"],
+        "url": image_store.blob_url(image["path"]),
+        "size": image["size"],
+        "duplicate": image["duplicate"],
+    }
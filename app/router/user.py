@@ -1,12 +1,13 @@
-from typing import Any
+from typing import Any, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies import admin_check
 from app.errors import EmptyFieldsToUpdateErr, NoUsersErr, UserNotFoundErr
+from app.schemas.page import Page
 from app.schemas.user import UserResponse, UserUpdateRequest
-from app.storage.database import get_session
+from app.storage.database import SessionRoute, get_read_session, get_session
 from app.storage.user import UserDAO
 from app.utils import set_user_new_fields
 
@@ -14,13 +15,14 @@ from app.utils import set_user_new_fields
 router = APIRouter(
     prefix="/users",
     tags=["Users"],
+    route_class=SessionRoute,
 )
 
 
 @router.get("/{user_id}")
 async def get_user_by_id(
         user_id: int,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
 ) -> UserResponse:
     """
     Получение пользователя по id.
@@ -28,7 +30,7 @@ async def get_user_by_id(
     :param session: async сессия БД
     :return: пользователь. http response
     """
-    user = await UserDAO.get_one(session, id=user_id)
+    user = await UserDAO.get_one_fields(session, UserResponse, id=user_id)
     if not user:
         raise UserNotFoundErr
 
@@ -37,18 +39,22 @@ async def get_user_by_id(
 
 @router.get("")
 async def get_all_users(
-        session: AsyncSession = Depends(get_session),
-) -> list[UserResponse]:
+        limit: int = Query(50, ge=1, le=500, description="Размер страницы"),
+        after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущего ответа"),
+        session: AsyncSession = Depends(get_read_session),
+) -> Page[UserResponse]:
     """
-    Получение всех пользователей.
+    Получение всех пользователей постранично.
+    :param limit: размер страницы
+    :param after: курсор страницы
     :param session: async сессия БД
-    :return: список пользователей. http response
+    :return: страница пользователей. http response
     """
-    users = await UserDAO.get_all(session)
-    if len(users) == 0:
+    users, next_cursor = await UserDAO.get_page(session, limit, after, schema=UserResponse)
+    if len(users) == 0 and after is None:
         raise NoUsersErr
 
-    return users
+    return {"items": users, "next_cursor": next_cursor}
 
 
 @router.put("/{user_id}", dependencies=[Depends(admin_check)])
@@ -74,7 +80,7 @@ async def update_user_by_id(
         raise UserNotFoundErr
 
     # установка новых значений полей
-    updated_fields: dict[str, Any] = set_user_new_fields(user, new_fields)
+    updated_fields: dict[str, Any] = await set_user_new_fields(user, new_fields)
     return await UserDAO.update(session, updated_fields, user_id)
 
 
@@ -0,0 +1,14 @@
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class Page(GenericModel, Generic[T]):
+    """
+    Валидационная схема исходящего запроса страницы списка.
+    next_cursor передается в параметре after для получения следующей страницы, None - страница последняя.
+    """
+    items: List[T]
+    next_cursor: Optional[str]
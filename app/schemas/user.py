@@ -53,6 +53,19 @@ class UserUpdateRequest(BaseModel):
         return True
 
 
+class UserPrincipal(BaseModel):
+    """
+    Авторизованный пользователь: из БД или из claims JWT-токена.
+    """
+    id: int
+    email: str
+    admin: bool = False
+
+    # парсинг ответа sqlalchemy в pydantic
+    class Config:
+        orm_mode = True
+
+
 class UserResponse(BaseModel):
     """
     Валидационная схема исходящего запроса полей пользователя.
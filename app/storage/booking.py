@@ -1,16 +1,84 @@
-from datetime import date
-from typing import Any
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, List, Sequence
 
-from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy import (
+    Date,
+    Integer,
+    RowMapping,
+    Select,
+    and_,
+    bindparam,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    text,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.errors import DBErr, InstanceAlreadyExistsErr, UnknownErr
 from app.logger import logger
 from app.models.booking import Booking
 from app.models.hotel import Hotel
+from app.models.outbox import Outbox
 from app.models.room import Room
+from app.models.room_inventory import RoomInventory
+from app.models.user import User
+from app.storage.cache import availability_cache
 from app.storage.dao import BaseDAO
 
+# пространство ключей advisory-блокировок номеров, pg_advisory_xact_lock(ROOM_LOCK_KEY, room_id)
+ROOM_LOCK_KEY = 1
+# задача celery отправки подтверждения бронирования, ставится через outbox
+BOOKING_CONFIRMATION_TASK = "app.tasks.tasks.send_booking_confirmation_email"
+
+
+def free_rooms_query() -> Select:
+    """
+    Запрос количества свободных комнат номера за период вместе с названиями номера и гостиницы.
+    Параметры: room_id, date_from, date_to.
+    :return: запрос
+    """
+    room_id = bindparam("room_id", type_=Integer)
+    # максимальное количество занятых номеров в сутки за период
+    booked_rooms = (
+        select(RoomInventory.room_id, func.max(RoomInventory.booked).label("rooms_booked"))
+        .where(
+            and_(
+                RoomInventory.room_id == room_id,
+                RoomInventory.day >= bindparam("date_from"),
+                RoomInventory.day < bindparam("date_to"),
+            )
+        )
+        .group_by(RoomInventory.room_id)
+        .cte("booked_rooms")
+    )
+
+    # количество свободных комнат
+    return (
+        select(
+            (Room.quantity - func.coalesce(booked_rooms.c.rooms_booked, 0)).label("free_rooms"),
+            Room.hotel_id,
+            Room.name.label("room_name"),
+            Hotel.name.label("hotel_name")
+        )
+        .select_from(Room)
+        .join(Hotel, Room.hotel_id == Hotel.id, isouter=True)
+        .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
+        .where(Room.id == room_id)
+    )
+
+
+# запрос собирается один раз: на вызове остается подстановка параметров
+FREE_ROOMS = free_rooms_query()
+
 
 class BookingDAO(BaseDAO):
     """
@@ -21,53 +89,363 @@ class BookingDAO(BaseDAO):
     @classmethod
     async def add(cls, session: AsyncSession, user_id: int, room_id: int, date_from: date, date_to: date) -> Any:
         """
-        Добавление бронирования по условиям.
+        Добавление бронирования, если на период есть свободный номер.
+        Проверка свободных номеров, цена номера, вставка бронирования, учет занятости по дням
+        и письмо с подтверждением в outbox - один запрос.
         :param session: async сессия БД
         :param user_id: id пользователя
         :param room_id: id комнаты
         :param date_from: дата бронирования 'с'
         :param date_to: дата бронирования 'по'
-        :return: новое бронирование
+        :return: новое бронирование с названиями номера и гостиницы или None, если свободных номеров нет
+        """
+        """
+        WITH booked_rooms AS (
+            SELECT room_id, MAX(booked) AS rooms_booked
+            FROM room_inventory
+            WHERE room_id = 10 AND day >= '2023-05-15' AND day < '2023-06-20'
+            GROUP BY room_id
+        ),
+        new_booking AS (
+            INSERT INTO bookings (room_id, user_id, date_from, date_to, price)
+            SELECT rooms.id, 1, '2023-05-15', '2023-06-20', rooms.price
+            FROM rooms
+            LEFT JOIN booked_rooms ON booked_rooms.room_id = rooms.id
+            WHERE rooms.id = 10 AND rooms.quantity - COALESCE(rooms_booked, 0) > 0
+            RETURNING id, room_id, user_id, date_from, date_to, price, total_cost, total_days
+        ),
+        inventory AS (
+            INSERT INTO room_inventory (room_id, day, booked)
+            SELECT new_booking.room_id, days.day::date, 1
+            FROM new_booking
+            JOIN generate_series(date_from, date_to - 1, interval '1 day') AS days(day) ON true
+            ON CONFLICT (room_id, day) DO UPDATE SET booked = room_inventory.booked + excluded.booked
+        ),
+        outbox AS (
+            INSERT INTO outbox (task, payload)
+            SELECT 'app.tasks.tasks.send_booking_confirmation_email', jsonb_build_object(
+                'booking', to_jsonb(new_booking), 'email_to', users.email,
+                'room_name', rooms.name, 'hotel_name', hotels.name
+            )
+            FROM new_booking
+            JOIN users ON users.id = new_booking.user_id
+            JOIN rooms ON rooms.id = new_booking.room_id
+            JOIN hotels ON hotels.id = rooms.hotel_id
+        )
+        SELECT new_booking.*, rooms.name AS room_name, hotels.name AS hotel_name
+        FROM new_booking
+        JOIN rooms ON rooms.id = new_booking.room_id
+        JOIN hotels ON hotels.id = rooms.hotel_id
         """
         try:
+            # блокировка - отдельный запрос: следующий запрос должен видеть учет занятости
+            # после всех закомиченных бронирований номера
+            await cls.lock_rooms(session, room_id)
+
+            # максимальное количество занятых номеров в сутки за период
+            booked_rooms = (
+                select(RoomInventory.room_id, func.max(RoomInventory.booked).label("rooms_booked"))
+                .where(
+                    and_(
+                        RoomInventory.room_id == room_id,
+                        RoomInventory.day >= date_from,
+                        RoomInventory.day < date_to,
+                    )
+                )
+                .group_by(RoomInventory.room_id)
+                .cte("booked_rooms")
+            )
+
+            # номер с ценой, если на период остался хотя бы один свободный
+            free_room = (
+                select(Room.id, literal(user_id), literal(date_from), literal(date_to), Room.price)
+                .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
+                .where(
+                    and_(
+                        Room.id == room_id,
+                        Room.quantity - func.coalesce(booked_rooms.c.rooms_booked, 0) > 0,
+                    )
+                )
+            )
+
+            # Core-таблицы: в ORM-запросе SQLAlchemy не рендерит DML CTE, добавленный через add_cte
+            bookings, rooms, hotels = Booking.__table__, Room.__table__, Hotel.__table__
+            users, inventory_table, outbox_table = User.__table__, RoomInventory.__table__, Outbox.__table__
+
+            new_booking = (
+                insert(bookings)
+                .from_select(["room_id", "user_id", "date_from", "date_to", "price"], free_room)
+                .returning(
+                    bookings.c.id,
+                    bookings.c.room_id,
+                    bookings.c.user_id,
+                    bookings.c.date_from,
+                    bookings.c.date_to,
+                    bookings.c.price,
+                    bookings.c.total_cost,
+                    bookings.c.total_days,
+                )
+                .cte("new_booking")
+            )
+
+            # учет занятости: +1 за каждые сутки нового бронирования
+            days = (
+                func.generate_series(new_booking.c.date_from, new_booking.c.date_to - 1, text("interval '1 day'"))
+                .table_valued("day")
+                .render_derived(name="days")
+            )
+            inventory = pg_insert(inventory_table).from_select(
+                ["room_id", "day", "booked"],
+                select(new_booking.c.room_id, cast(days.c.day, Date), literal(1))
+                .select_from(new_booking)
+                .join(days, true()),
+            )
+            inventory = inventory.on_conflict_do_update(
+                index_elements=[inventory_table.c.room_id, inventory_table.c.day],
+                set_={"booked": inventory_table.c.booked + inventory.excluded.booked},
+            ).cte("inventory")
+
+            # письмо с подтверждением: аргументы задачи celery, в брокер отправляет OutboxDispatcher
+            payload = func.jsonb_build_object(
+                literal_column("'booking'"), func.to_jsonb(new_booking.table_valued()),
+                literal_column("'email_to'"), users.c.email,
+                literal_column("'room_name'"), rooms.c.name,
+                literal_column("'hotel_name'"), hotels.c.name,
+            )
+            outbox = (
+                insert(outbox_table)
+                .from_select(
+                    ["task", "payload"],
+                    select(literal(BOOKING_CONFIRMATION_TASK), payload)
+                    .select_from(new_booking)
+                    .join(users, users.c.id == new_booking.c.user_id)
+                    .join(rooms, rooms.c.id == new_booking.c.room_id)
+                    .join(hotels, hotels.c.id == rooms.c.hotel_id),
+                )
+                .cte("outbox")
+            )
+
             add_booking_query = (
-                insert(Booking)
-                .values(
-                    room_id=room_id,
-                    user_id=user_id,
-                    date_from=date_from,
-                    date_to=date_to,
-                    price=await cls.get_room_price(session, room_id),
+                select(
+                    new_booking,
+                    rooms.c.hotel_id,
+                    rooms.c.name.label("room_name"),
+                    hotels.c.name.label("hotel_name"),
                 )
-                .returning(Booking)
+                .join(rooms, rooms.c.id == new_booking.c.room_id)
+                .join(hotels, hotels.c.id == rooms.c.hotel_id)
+                .add_cte(inventory, outbox)
             )
 
             new_booking = await session.execute(add_booking_query)
+            booking = new_booking.mappings().one_or_none()
             await session.commit()
-            return new_booking.scalar()
+            if booking is not None:
+                await availability_cache.invalidate_hotels([booking["hotel_id"]], date_from, date_to)
+            return booking
         except (SQLAlchemyError, Exception) as err:
             if isinstance(err, SQLAlchemyError):
-                msg = "Database Exc: Cannot add booking"
+                msg, exc = "Database Exc: Cannot add booking", DBErr
             elif isinstance(err, Exception):
-                msg = "Unknown Exc: Cannot add booking"
+                msg, exc = "Unknown Exc: Cannot add booking", UnknownErr
             extra = {
                 "room_id": room_id,
                 "date_from": date_from,
                 "date_to": date_to,
             }
             logger.error(msg, extra=extra)
+            # иначе ошибка БД неотличима от отсутствия свободных номеров
+            raise exc
 
     @classmethod
-    async def get_room_price(cls, session: AsyncSession, room_id: int) -> int:
+    async def update(cls, session: AsyncSession, data, id) -> Any:
         """
-        Получение цены аренды комнаты за сутки.
+        Обновление бронирования в БД.
+        В той же транзакции пересчитывается учет занятости по старым и новым датам бронирования.
+        :param session: async сессия БД
+        :param data: значение полей бронирования
+        :param id: id бронирования
+        :return: обновленное бронирование
+        """
+        try:
+            # старые даты читаются до flush измененного в сессии инстанса
+            with session.no_autoflush:
+                old_booking_query = select(Booking.room_id, Booking.date_from, Booking.date_to).where(Booking.id == id)
+                old_booking = (await session.execute(old_booking_query)).one_or_none()
+
+            query = update(Booking).where(Booking.id == id).values(**data).returning(Booking)
+            result = await session.execute(query)
+            booking = result.scalar_one_or_none()
+
+            if booking is not None:
+                await cls.lock_rooms(session, old_booking.room_id, booking.room_id)
+                await cls.refresh_inventory(session, old_booking.room_id, old_booking.date_from, old_booking.date_to)
+                await cls.refresh_inventory(session, booking.room_id, booking.date_from, booking.date_to)
+                hotel_ids = await cls.get_hotel_ids(session, old_booking.room_id, booking.room_id)
+
+            await session.commit()
+            if booking is not None:
+                await availability_cache.invalidate_hotels(
+                    hotel_ids,
+                    min(old_booking.date_from, booking.date_from),
+                    max(old_booking.date_to, booking.date_to),
+                )
+            return booking
+        except (SQLAlchemyError, Exception) as err:
+            if isinstance(err, SQLAlchemyError):
+                logger.error(InstanceAlreadyExistsErr.detail,
+                             extra={"status_code": InstanceAlreadyExistsErr.status_code})
+                raise InstanceAlreadyExistsErr
+            elif isinstance(err, Exception):
+                logger.error(UnknownErr.detail,
+                             extra={"status_code": UnknownErr.status_code})
+                raise UnknownErr
+
+    @classmethod
+    async def delete(cls, session: AsyncSession, id) -> Any:
+        """
+        Удаление бронирования из БД.
+        В той же транзакции пересчитывается учет занятости номера по датам удаленного бронирования.
+        :param session: async сессия БД
+        :param id: id бронирования
+        :return: удаленное бронирование
+        """
+        query = delete(Booking).where(Booking.id == id).returning(Booking)
+        result = await session.execute(query)
+        booking = result.scalar_one_or_none()
+
+        if booking is not None:
+            await cls.lock_rooms(session, booking.room_id)
+            await cls.refresh_inventory(session, booking.room_id, booking.date_from, booking.date_to)
+            hotel_ids = await cls.get_hotel_ids(session, booking.room_id)
+
+        await session.commit()
+        if booking is not None:
+            await availability_cache.invalidate_hotels(hotel_ids, booking.date_from, booking.date_to)
+        return booking
+
+    @classmethod
+    async def get_hotel_ids(cls, session: AsyncSession, *room_ids: int) -> List[int]:
+        """
+        Получение id гостиниц номеров - для инвалидации кэша свободных гостиниц.
+        :param session: async сессия БД
+        :param room_ids: id номеров
+        :return: id гостиниц
+        """
+        query = select(Room.hotel_id).where(Room.id.in_(set(room_ids))).distinct()
+        result = await session.execute(query)
+        return list(result.scalars().all())
+
+    @classmethod
+    async def lock_rooms(cls, session: AsyncSession, *room_ids: int) -> None:
+        """
+        Блокировка номеров до конца транзакции. Изменения бронирований одного номера выполняются последовательно,
+        поэтому пересчет учета занятости видит все закомиченные бронирования.
+        Номера блокируются по возрастанию id, чтобы не получить deadlock.
+        :param session: async сессия БД
+        :param room_ids: id номеров
+        """
+        for room_id in sorted({room_id for room_id in room_ids if room_id is not None}):
+            await session.execute(select(func.pg_advisory_xact_lock(ROOM_LOCK_KEY, room_id)))
+
+    @classmethod
+    async def refresh_inventory(cls, session: AsyncSession, room_id: int, date_from: date, date_to: date) -> None:
+        """
+        Пересчет учета занятости номера по дням за период [date_from, date_to).
+        Вызывается в транзакции изменения бронирования, после lock_rooms.
         :param session: async сессия БД
         :param room_id: id комнаты
-        :return: цена комнаты
+        :param date_from: дата бронирования 'с'
+        :param date_to: дата бронирования 'по'
+        """
+        """
+        WITH booked_rooms AS (
+            SELECT stay FROM bookings
+            WHERE room_id = 10 AND stay && daterange('2023-05-15', '2023-06-20')
+        )
+        INSERT INTO room_inventory (room_id, day, booked)
+        SELECT 10, days.day::date, COUNT(booked_rooms.stay)
+        FROM generate_series('2023-05-15'::date, '2023-06-19'::date, interval '1 day') AS days(day)
+        LEFT JOIN booked_rooms ON booked_rooms.stay @> days.day::date
+        GROUP BY days.day
+        ON CONFLICT (room_id, day) DO UPDATE SET booked = excluded.booked
+        """
+        if room_id is None or date_from >= date_to:
+            return
+
+        # бронирования номера, пересекающиеся с периодом (index scan по ix_bookings_room_id_stay)
+        booked_rooms = (
+            select(Booking.stay)
+            .where(
+                and_(
+                    Booking.room_id == room_id,
+                    Booking.overlaps(date_from, date_to),
+                )
+            )
+            .cte("booked_rooms")
+        )
+
+        # сутки периода
+        days = (
+            func.generate_series(
+                cast(date_from, Date),
+                cast(date_to - timedelta(days=1), Date),
+                text("interval '1 day'"),
+            )
+            .table_valued("day")
+            .render_derived(name="days")
+        )
+        day = cast(days.c.day, Date)
+
+        booked_by_day = (
+            select(literal(room_id), day, func.count(booked_rooms.c.stay))
+            .select_from(days)
+            .join(booked_rooms, booked_rooms.c.stay.contains(day), isouter=True)
+            .group_by(day)
+        )
+
+        query = pg_insert(RoomInventory).from_select(["room_id", "day", "booked"], booked_by_day)
+        query = query.on_conflict_do_update(
+            index_elements=[RoomInventory.room_id, RoomInventory.day],
+            set_={"booked": query.excluded.booked},
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def rebuild_inventory(cls, session: AsyncSession) -> None:
+        """
+        Полный пересчет учета занятости номеров по всем бронированиям.
+        Нужен после загрузки бронирований в обход DAO (sql-файлы, админка). Коммит остается за вызывающим.
+        :param session: async сессия БД
         """
-        get_room_price_query = select(Room.price).filter_by(id=room_id)
-        room_price = await session.execute(get_room_price_query)
-        return room_price.scalar()
+        """
+        DELETE FROM room_inventory;
+        INSERT INTO room_inventory (room_id, day, booked)
+        SELECT room_id, days.day::date, COUNT(*)
+        FROM bookings
+        JOIN generate_series(date_from, date_to - 1, interval '1 day') AS days(day) ON true
+        WHERE room_id IS NOT NULL
+        GROUP BY room_id, days.day
+        """
+        days = (
+            func.generate_series(Booking.date_from, Booking.date_to - 1, text("interval '1 day'"))
+            .table_valued("day")
+            .render_derived(name="days")
+        )
+        day = cast(days.c.day, Date)
+
+        booked_by_day = (
+            select(Booking.room_id, day, func.count())
+            .select_from(Booking)
+            .join(days, true())
+            .where(Booking.room_id.isnot(None))
+            .group_by(Booking.room_id, day)
+        )
+
+        await session.execute(delete(RoomInventory))
+        await session.execute(
+            insert(RoomInventory).from_select(["room_id", "day", "booked"], booked_by_day)
+        )
 
     @classmethod
     async def get_free_rooms(cls, session: AsyncSession, room_id: int, date_from: date, date_to: date) -> Any:
@@ -81,69 +459,25 @@ class BookingDAO(BaseDAO):
         """
         """
         WITH booked_rooms AS (
-            SELECT * FROM bookings
-            WHERE room_id = 10
-            AND(
-                (date_from BETWEEN '2023-05-15' AND '2023-06-20')
-                OR
-                (date_from <= '2023-05-15' AND date_to > '2023-05-15')
-            )
+            SELECT room_id, MAX(booked) AS rooms_booked
+            FROM room_inventory
+            WHERE room_id = 10 AND day >= '2023-05-15' AND day < '2023-06-20'
+            GROUP BY room_id
         )
-        SELECT rooms.quantity - COUNT(booked_rooms.room_id), rooms.hotel_id, rooms.name, hotels.name
+        SELECT rooms.quantity - COALESCE(rooms_booked, 0), rooms.hotel_id, rooms.name, hotels.name
         FROM rooms
         LEFT JOIN hotels ON rooms.hotel_id = hotels.id
         LEFT JOIN booked_rooms ON booked_rooms.room_id = rooms.id
         WHERE rooms.id = 10
-        GROUP BY rooms.quantity, booked_rooms.room_id, rooms.hotel_id, rooms.name, hotels.name
         """
         try:
-            # забронированные комнаты (таблица)
-            booked_rooms = (
-                select(Booking)
-                .where(
-                    and_(
-                        Booking.room_id == room_id,
-                        or_(
-                            and_(
-                                Booking.date_from.between(date_from, date_to)
-                            ),
-                            and_(
-                                Booking.date_from <= date_from,
-                                Booking.date_to > date_from,
-                            ),
-                        ),
-                    )
-                ).cte("booked_rooms")
-            )
-
-            """
-            SELECT rooms.quantity - COUNT(booked_rooms.room_id), rooms.hotel_id, rooms.name, hotels.name
-            FROM rooms
-            LEFT JOIN hotels ON rooms.hotel_id = hotels.id
-            LEFT JOIN booked_rooms ON booked_rooms.room_id = rooms.id
-            WHERE rooms.id = 10
-            GROUP BY rooms.quantity, booked_rooms.room_id, rooms.hotel_id, rooms.name, hotels.name
-            """
-
-            # количество свободных комнат
-            free_rooms_quant_query = (
-                select(
-                    (Room.quantity - func.count(booked_rooms.c.room_id)).label("free_rooms"),
-                    Room.hotel_id,
-                    Room.name.label("room_name"),
-                    Hotel.name.label("hotel_name")
-                )
-                .select_from(Room)
-                .join(Hotel, Room.hotel_id == Hotel.id, isouter=True)
-                .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
-                .where(Room.id == room_id)
-                .group_by(Room.quantity, booked_rooms.c.room_id, Room.hotel_id, Room.name, Hotel.name)
-            )
-
             # распечатка sql запроса
-            # print(remaining_rooms_query.compile(engine, compile_kwargs={"literal_binds": True}))
-
-            free_rooms = await session.execute(free_rooms_quant_query)
+            # print(FREE_ROOMS.compile(engine, compile_kwargs={"literal_binds": True}))
+            free_rooms = await session.execute(FREE_ROOMS, {
+                "room_id": room_id,
+                "date_from": date_from,
+                "date_to": date_to,
+            })
             return free_rooms.mappings().all()
         except (SQLAlchemyError, Exception) as err:
             if isinstance(err, SQLAlchemyError):
@@ -156,3 +490,30 @@ class BookingDAO(BaseDAO):
                 "date_to": date_to,
             }
             logger.error(msg, extra=extra)
+
+    @classmethod
+    async def stream_all(cls, session: AsyncSession, chunk_size: int) -> AsyncIterator[Sequence[RowMapping]]:
+        """
+        Выгрузка всех бронирований частями через серверный курсор (asyncpg).
+        В памяти одновременно не более chunk_size строк.
+        :param session: async сессия БД
+        :param chunk_size: количество строк в части
+        :return: асинхронный генератор частей бронирований
+        """
+        query = (
+            select(
+                Booking.id,
+                Booking.room_id,
+                Booking.user_id,
+                Booking.date_from,
+                Booking.date_to,
+                Booking.price,
+                Booking.total_cost,
+                Booking.total_days,
+            )
+            .order_by(Booking.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await session.stream(query)
+        async for chunk in result.mappings().partitions(chunk_size):
+            yield chunk
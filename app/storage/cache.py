@@ -0,0 +1,327 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError, WatchError
+
+from app.logger import logger
+
+# загрузка гостиниц из БД на промахе кэша: (гостиницы, id всех гостиниц локации - теги)
+Loader = Callable[[], Awaitable[Tuple[List[dict], List[int]]]]
+
+# инвалидация тегов: следующее значение часов инвалидаций записывается в версии тегов.
+# Атомарно: версия тега со временем только растет
+INVALIDATE_SCRIPT = """
+local clock = redis.call('INCR', KEYS[1])
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], clock, 'EX', ARGV[1])
+end
+return clock
+"""
+
+
+class AvailabilityCache:
+    """
+    Кэш свободных гостиниц по локации и периоду в redis с инвалидацией по тегам.
+    Тег - множество ключей кэша, в выдачу которых могла попасть гостиница (все гостиницы, подходящие по локации).
+    Изменение бронирований, номеров или гостиницы удаляет только затронутые ключи, поэтому TTL может быть долгим.
+
+    Промахи по одному ключу схлопываются: в воркере - общей задачей загрузки, между воркерами - блокировкой в redis.
+    После истечения свежести (TTL с разбросом) значение еще stale секунд отдается как есть,
+    пока одна фоновая задача загружает новое - нагрузка на БД на границе TTL не растет.
+
+    Без init() (например, в тестах) и при ошибках redis кэш отключен - запросы идут в БД.
+    """
+
+    def __init__(self, prefix: str, expire: int, stale: int, jitter: float = 0.1, lock_timeout: float = 10.0):
+        """
+        :param prefix: префикс ключей redis
+        :param expire: время свежести значения в секундах
+        :param stale: сколько секунд после expire значение отдается, пока загружается новое
+        :param jitter: разброс expire, доля (0.1 - ±10%), чтобы ключи не истекали одновременно
+        :param lock_timeout: TTL блокировки загрузки в redis и максимальное ожидание чужой загрузки, секунды
+        """
+        self.prefix = prefix
+        self.expire = expire
+        self.stale = stale
+        self.jitter = jitter
+        self.lock_timeout = lock_timeout
+        self.redis: Optional[aioredis.Redis] = None
+        # загрузки в процессе в этом воркере: ключ -> задача
+        self._loads: Dict[str, asyncio.Task] = {}
+
+    def init(self, redis: aioredis.Redis) -> None:
+        """
+        Подключение redis.
+        :param redis: клиент redis
+        """
+        self.redis = redis
+
+    @property
+    def clock_key(self) -> str:
+        # часы инвалидаций: счетчик, увеличивающийся при каждой инвалидации
+        return f"{self.prefix}:clock"
+
+    @staticmethod
+    def tag_version_key(tag: str) -> str:
+        # версия тега - показание часов инвалидаций при последней инвалидации тега.
+        # Значение, загрузка которого началась раньше инвалидации одного из его тегов, не записывается
+        return f"{tag}:version"
+
+    @property
+    def keys_key(self) -> str:
+        # множество всех ключей кэша
+        return f"{self.prefix}:keys"
+
+    def hotel_tag(self, hotel_id: int) -> str:
+        return f"{self.prefix}:tag:hotel:{hotel_id}"
+
+    def key(self, location: str, date_from: date, date_to: date) -> str:
+        """
+        Ключ кэша. Локация берется как есть - та же, с которой загрузка запрашивает БД: разные написания
+        могут давать разную выдачу и не должны делить одно значение.
+        :param location: местонахождение гостиницы
+        :param date_from: дата бронирования 'с'
+        :param date_to: дата бронирования 'по'
+        :return: ключ
+        """
+        return f"{self.prefix}:{location}:{date_from}:{date_to}"
+
+    @staticmethod
+    def key_period(key: str) -> Tuple[date, date]:
+        """
+        Период из ключа кэша (локация может содержать ':', даты - последние части ключа).
+        :param key: ключ
+        :return: дата 'с', дата 'по'
+        """
+        _, date_from, date_to = key.rsplit(":", 2)
+        return date.fromisoformat(date_from), date.fromisoformat(date_to)
+
+    async def get_or_load(self, location: str, date_from: date, date_to: date, loader: Loader) -> List[dict]:
+        """
+        Получение гостиниц из кэша, на промахе - загрузка через loader с записью в кэш.
+        loader может выполняться в фоне после ответа, поэтому открывает свою сессию БД.
+        :param location: местонахождение гостиницы
+        :param date_from: дата бронирования 'с'
+        :param date_to: дата бронирования 'по'
+        :param loader: загрузка гостиниц из БД
+        :return: гостиницы
+        """
+        if self.redis is None:
+            hotels, _ = await loader()
+            return hotels
+
+        key = self.key(location, date_from, date_to)
+        try:
+            value, clock = await self.redis.mget(key, self.clock_key)
+        except RedisError as err:
+            logger.warning("Availability cache get failed", extra={"error": str(err)})
+            hotels, _ = await loader()
+            return hotels
+
+        clock = int(clock or 0)
+        if value is None:
+            # отмена одного запроса не отменяет загрузку для остальных
+            hotels = await asyncio.shield(self._load(key, loader, clock, wait=True))
+            if hotels is None:
+                # в процессе было фоновое обновление, а значение успели инвалидировать
+                hotels, _ = await loader()
+            return hotels
+
+        entry = json.loads(value)
+        # stale-while-revalidate: устаревшее значение отдается сразу, обновление - в фоне
+        if entry["fresh_until"] < time.time():
+            self._load(key, loader, clock, wait=False)
+        return entry["hotels"]
+
+    def _load(self, key: str, loader: Loader, clock: int, wait: bool) -> asyncio.Task:
+        """
+        Single-flight загрузка ключа в воркере: конкурентные промахи ждут одну задачу.
+        :param key: ключ
+        :param loader: загрузка гостиниц из БД
+        :param clock: часы инвалидаций на момент чтения ключа
+        :param wait: ждать загрузку другим воркером (промах) или пропустить (фоновое обновление)
+        :return: задача загрузки
+        """
+        task = self._loads.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load_locked(key, loader, clock, wait))
+            self._loads[key] = task
+            task.add_done_callback(lambda done: self._load_done(key, done))
+        return task
+
+    def _load_done(self, key: str, task: asyncio.Task) -> None:
+        self._loads.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Availability cache load failed", extra={"key": key, "error": str(task.exception())})
+
+    async def _load_locked(self, key: str, loader: Loader, clock: int, wait: bool) -> Optional[List[dict]]:
+        """
+        Single-flight загрузка ключа между воркерами: загружает воркер, взявший блокировку в redis,
+        остальные ждут появления значения в кэше.
+        :param key: ключ
+        :param loader: загрузка гостиниц из БД
+        :param clock: часы инвалидаций на момент чтения ключа
+        :param wait: ждать загрузку другим воркером
+        :return: гостиницы (None - загрузку выполняет другой воркер, ожидание не требуется)
+        """
+        lock_key, token = f"{key}:lock", uuid.uuid4().hex
+        try:
+            locked = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+            if not locked:
+                if not wait:
+                    return None
+                hotels = await self._wait(key, lock_key)
+                if hotels is not None:
+                    return hotels
+        except RedisError as err:
+            logger.warning("Availability cache lock failed", extra={"error": str(err)})
+            locked = False
+
+        try:
+            hotels, hotel_ids = await loader()
+            await self._set(key, hotels, hotel_ids, clock)
+            return hotels
+        finally:
+            if locked:
+                await self._unlock(lock_key, token)
+
+    async def _wait(self, key: str, lock_key: str) -> Optional[List[dict]]:
+        """
+        Ожидание загрузки ключа другим воркером.
+        :param key: ключ
+        :param lock_key: ключ блокировки
+        :return: гостиницы (None - блокировка снята или истекла без записи значения)
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.01
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+            value, locked = await self.redis.mget(key, lock_key)
+            if value is not None:
+                return json.loads(value)["hotels"]
+            if locked is None:
+                return None
+        return None
+
+    async def _unlock(self, lock_key: str, token: str) -> None:
+        """
+        Снятие своей блокировки (блокировка могла истечь и быть взята другим воркером).
+        :param lock_key: ключ блокировки
+        :param token: токен блокировки
+        """
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(lock_key)
+                if await pipe.get(lock_key) != token:
+                    return
+                pipe.multi()
+                pipe.delete(lock_key)
+                await pipe.execute()
+        except (WatchError, RedisError):
+            return
+
+    async def _set(self, key: str, hotels: List[dict], hotel_ids: Iterable[int], clock: int) -> None:
+        """
+        Запись гостиниц в кэш с тегами гостиниц, подходящих по локации.
+        Если после чтения часов инвалидаций был инвалидирован один из тегов ключа, значение могло устареть
+        и не записывается. Инвалидации других тегов (других локаций) запись не отменяют.
+        :param key: ключ
+        :param hotels: гостиницы
+        :param hotel_ids: id всех гостиниц, подходящих по локации (в том числе без свободных номеров)
+        :param clock: часы инвалидаций на момент чтения ключа
+        """
+        expire = self.expire * random.uniform(1 - self.jitter, 1 + self.jitter)
+        value = json.dumps({"hotels": hotels, "fresh_until": time.time() + expire}, default=str)
+        ttl = int(expire) + self.stale
+        tags = [self.keys_key] + [self.hotel_tag(hotel_id) for hotel_id in hotel_ids]
+        versions = [self.tag_version_key(tag) for tag in tags]
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(*versions)
+                if any(int(version or 0) > clock for version in await pipe.mget(versions)):
+                    return
+                pipe.multi()
+                pipe.set(key, value, ex=ttl)
+                for tag in tags:
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, self.expire * 2 + self.stale)
+                await pipe.execute()
+        except WatchError:
+            return
+        except RedisError as err:
+            logger.warning("Availability cache set failed", extra={"error": str(err)})
+
+    async def invalidate(self, tags: List[str], date_from: Optional[date] = None, date_to: Optional[date] = None) -> None:
+        """
+        Удаление ключей кэша по тегам.
+        :param tags: теги
+        :param date_from: дата 'с' измененного периода, None - все ключи тегов
+        :param date_to: дата 'по' измененного периода
+        """
+        if self.redis is None or not tags:
+            return
+
+        try:
+            # версии тегов живут дольше любой загрузки, начатой до инвалидации
+            versions = [self.tag_version_key(tag) for tag in tags]
+            await self.redis.eval(
+                INVALIDATE_SCRIPT, len(versions) + 1, self.clock_key, *versions, self.expire * 2 + self.stale,
+            )
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.smembers(tag)
+                keys = set().union(*await pipe.execute())
+
+            if date_from is not None and date_to is not None:
+                # затронуты только ключи с пересекающимся периодом
+                keys = {key for key in keys if self._overlaps(key, date_from, date_to)}
+            if not keys:
+                return
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                for tag in tags + [self.keys_key]:
+                    pipe.srem(tag, *keys)
+                await pipe.execute()
+        except RedisError as err:
+            logger.error("Availability cache invalidation failed", extra={"tags": tags, "error": str(err)})
+
+    async def invalidate_hotels(
+            self,
+            hotel_ids: Iterable[Any],
+            date_from: Optional[date] = None,
+            date_to: Optional[date] = None,
+    ) -> None:
+        """
+        Удаление ключей кэша, в выдачу которых могли попасть гостиницы.
+        :param hotel_ids: id гостиниц
+        :param date_from: дата 'с' измененного периода, None - все ключи гостиниц
+        :param date_to: дата 'по' измененного периода
+        """
+        tags = [self.hotel_tag(hotel_id) for hotel_id in set(hotel_ids) if hotel_id is not None]
+        await self.invalidate(tags, date_from, date_to)
+
+    async def invalidate_all(self) -> None:
+        """
+        Удаление всех ключей кэша (изменение гостиниц или массовая загрузка данных).
+        """
+        await self.invalidate([self.keys_key])
+
+    def _overlaps(self, key: str, date_from: date, date_to: date) -> bool:
+        try:
+            key_from, key_to = self.key_period(key)
+        except ValueError:
+            return True
+        return key_from < date_to and date_from < key_to
+
+
+# кэш свободных гостиниц, подключается к redis при старте сервиса.
+# Свежесть - час (инвалидация точная, TTL - страховка), затем еще 5 минут значение отдается на время обновления
+availability_cache = AvailabilityCache(prefix="booking-cache:availability", expire=60 * 60, stale=5 * 60)
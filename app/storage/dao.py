@@ -1,19 +1,77 @@
-from typing import Any
+import base64
+import binascii
+import functools
+from typing import Any, List, Optional, Tuple, Type
 
-from sqlalchemy import delete, insert, select, update
+from pydantic import BaseModel
+from sqlalchemy import Column, delete, insert, select, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.errors import InstanceAlreadyExistsErr, UnknownErr
+from app.errors import IncorrectCursorErr, InstanceAlreadyExistsErr, UnknownErr
 from app.logger import logger
+from app.storage.metrics import instrument_dao
+
+
+def escape_like(value: str) -> str:
+    """
+    Экранирование спецсимволов LIKE/ILIKE во входящей строке (escape-символ - обратный слэш).
+    :param value: строка поиска
+    :return: экранированная строка
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def encode_cursor(id: int) -> str:
+    """
+    Курсор следующей страницы - непрозрачный для клиента токен с id последнего инстанса страницы.
+    :param id: id последнего инстанса страницы
+    :return: курсор
+    """
+    return base64.urlsafe_b64encode(f"id:{id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Получение id последнего инстанса предыдущей страницы из курсора.
+    :param cursor: курсор
+    :return: id
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, id = value.split(":")
+        if prefix != "id":
+            raise ValueError
+        return int(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise IncorrectCursorErr
+
+
+@functools.lru_cache(maxsize=None)
+def schema_columns(model: type, schema: Type[BaseModel]) -> Tuple[Column, ...]:
+    """
+    Колонки модели, нужные схеме ответа: поля схемы, которые есть в таблице модели, и id для курсора страницы.
+    Поля схемы, которых нет в таблице, заполняются значениями по умолчанию схемы.
+    :param model: модель алхимии
+    :param schema: pydantic-схема ответа
+    :return: колонки
+    """
+    columns = model.__table__.columns
+    names = ["id", *(name for name in schema.__fields__ if name != "id")]
+    return tuple(columns[name] for name in names if name in columns)
 
 
 class BaseDAO:
     """
     Data Access Object модель с универсальными CRUD методами.
+    Запросы coroutine-методов DAO размечаются именем метода в метриках БД.
     """
     model = None
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_dao(cls)
+
     @classmethod
     async def add(cls, session: AsyncSession, data: dict) -> Any:
         """
@@ -26,7 +84,9 @@ class BaseDAO:
             query = insert(cls.model).values(**data).returning(cls.model)
             result = await session.execute(query)
             await session.commit()
-            return result.scalar_one_or_none()
+            instance = result.scalar_one_or_none()
+            await cls.invalidate_cache(instance)
+            return instance
         except (SQLAlchemyError, Exception) as err:
             if isinstance(err, SQLAlchemyError):
                 logger.error(InstanceAlreadyExistsErr.detail,
@@ -50,17 +110,83 @@ class BaseDAO:
         return result.scalar_one_or_none()
 
     @classmethod
-    async def get_all(cls, session: AsyncSession, **filters) -> Any:
+    async def get_all(cls, session: AsyncSession, limit: Optional[int] = None, after: Optional[int] = None,
+                      **filters) -> Any:
         """
         Получение инстансов из БД.
+        Keyset-пагинация по id: id > after ORDER BY id LIMIT limit.
         :param session: async сессия БД
+        :param limit: максимальное количество инстансов
+        :param after: id, после которого выбираются инстансы
         :param filters: фильтры запроса
         :return: инстансы
         """
         query = select(cls.model).filter_by(**filters)
+        if after is not None:
+            query = query.where(cls.model.id > after)
+        query = query.order_by(cls.model.id).limit(limit)
         result = await session.execute(query)
         return result.scalars().all()
 
+    @classmethod
+    async def get_one_fields(cls, session: AsyncSession, schema: Type[BaseModel], **filters) -> Optional[dict]:
+        """
+        Получение полей инстанса, нужных схеме ответа, без загрузки объекта модели.
+        Для чтения на отдачу: строка не попадает в identity map сессии и не проходит ORM-маппинг.
+        :param session: async сессия БД
+        :param schema: pydantic-схема ответа
+        :param filters: фильтры запроса
+        :return: поля инстанса или None
+        """
+        query = select(*schema_columns(cls.model, schema)).filter_by(**filters)
+        result = await session.execute(query)
+        row = result.mappings().one_or_none()
+        return dict(row) if row is not None else None
+
+    @classmethod
+    async def get_all_fields(cls, session: AsyncSession, schema: Type[BaseModel], limit: Optional[int] = None,
+                             after: Optional[int] = None, **filters) -> List[dict]:
+        """
+        Получение полей инстансов, нужных схеме ответа, без загрузки объектов модели.
+        Keyset-пагинация по id, как в get_all.
+        :param session: async сессия БД
+        :param schema: pydantic-схема ответа
+        :param limit: максимальное количество инстансов
+        :param after: id, после которого выбираются инстансы
+        :param filters: фильтры запроса
+        :return: поля инстансов
+        """
+        query = select(*schema_columns(cls.model, schema)).filter_by(**filters)
+        if after is not None:
+            query = query.where(cls.model.id > after)
+        query = query.order_by(cls.model.id).limit(limit)
+        result = await session.execute(query)
+        return [dict(row) for row in result.mappings()]
+
+    @classmethod
+    async def get_page(cls, session: AsyncSession, limit: int, cursor: Optional[str] = None,
+                       schema: Optional[Type[BaseModel]] = None, **filters) -> Tuple[List[Any], Optional[str]]:
+        """
+        Получение страницы инстансов из БД.
+        :param session: async сессия БД
+        :param limit: размер страницы
+        :param cursor: курсор страницы из предыдущего ответа, None - первая страница
+        :param schema: pydantic-схема ответа - выбираются только ее поля (get_all_fields), None - объекты модели
+        :param filters: фильтры запроса
+        :return: инстансы страницы и курсор следующей страницы (None - страница последняя)
+        """
+        after = decode_cursor(cursor) if cursor is not None else None
+        # +1 инстанс - признак наличия следующей страницы без отдельного count
+        if schema is not None:
+            instances = await cls.get_all_fields(session, schema, limit=limit + 1, after=after, **filters)
+        else:
+            instances = await cls.get_all(session, limit=limit + 1, after=after, **filters)
+        if len(instances) > limit:
+            last = instances[limit - 1]
+            return instances[:limit], encode_cursor(last["id"] if schema is not None else last.id)
+
+        return instances, None
+
     @classmethod
     async def update(cls, session: AsyncSession, data, id) -> Any:
         """
@@ -74,7 +200,9 @@ class BaseDAO:
         try:
             result = await session.execute(query)
             await session.commit()
-            return result.scalar_one_or_none()
+            instance = result.scalar_one_or_none()
+            await cls.invalidate_cache(instance)
+            return instance
         except (SQLAlchemyError, Exception) as err:
             if isinstance(err, SQLAlchemyError):
                 logger.error(InstanceAlreadyExistsErr.detail,
@@ -96,7 +224,21 @@ class BaseDAO:
         query = delete(cls.model).where(cls.model.id == id).returning(cls.model)
         result = await session.execute(query)
         await session.commit()
-        return result.scalar_one_or_none()
+        instance = result.scalar_one_or_none()
+        await cls.invalidate_cache(instance)
+        return instance
+
+    @classmethod
+    async def invalidate_cache(cls, instance) -> None:
+        """
+        Инвалидация кэшей, зависящих от инстанса, после добавления, обновления или удаления.
+        По умолчанию кэшей нет, переопределяется в DAO моделей.
+        :param instance: добавленный, обновленный или удаленный инстанс (None - инстанс не найден)
+        """
+
+
+# метрики БД по методам BaseDAO (методы наследников размечаются в __init_subclass__)
+instrument_dao(BaseDAO)
 
 # scalars() преобразует ответ алхимии к списку объектов модели
 # (без scalars() вернется список из кортежей объектов алхимии)
@@ -1,29 +1,225 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from fastapi import Request, Response
 from sqlalchemy import Column, Integer, NullPool
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase, declared_attr
 
+from app.logger import logger
+from app.storage.metrics import InstrumentedQueuePool, instrument_engine
+from app.timing import TimedRoute
 from config import cfg
 
+# кука чтения своих записей: пока она есть, чтение пользователя идет в основную БД
+READ_YOUR_WRITES_COOKIE = "read_primary"
+
 if cfg.MODE == "TEST":
     DATABASE_URL = cfg.db_url_test
+    REPLICA_DATABASE_URL = cfg.db_replica_url_test
     DATABASE_PARAMS = {"poolclass": NullPool}
 else:
     DATABASE_URL = cfg.db_url
-    DATABASE_PARAMS = {}
+    REPLICA_DATABASE_URL = cfg.db_replica_url
+    DATABASE_PARAMS = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": cfg.DB_POOL_SIZE,
+        "max_overflow": cfg.DB_MAX_OVERFLOW,
+        "pool_timeout": cfg.DB_POOL_TIMEOUT,
+        "pool_recycle": cfg.DB_POOL_RECYCLE,
+        "pool_pre_ping": cfg.DB_POOL_PRE_PING,
+    }
+# кэши запросов: скомпилированные алхимией и подготовленные в postgres (на соединение)
+DATABASE_PARAMS.update(
+    query_cache_size=cfg.SQL_COMPILED_CACHE_SIZE,
+    connect_args={"prepared_statement_cache_size": cfg.DB_STATEMENT_CACHE_SIZE},
+)
 
 # асинхронный движок алхимии
-engine = create_async_engine(DATABASE_URL)  # **DATABASE_PARAMS
+engine = create_async_engine(DATABASE_URL, pool_logging_name="primary", **DATABASE_PARAMS)
+# метрики запросов и лог медленных запросов
+instrument_engine(engine.sync_engine)
 # асинхронный генератор сессий для бд
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+class ReadRouter:
+    """
+    Маршрутизация чтения: сессии читающих запросов открываются на реплике.
+    Если реплика недоступна, чтение retry секунд идет в основную БД, затем реплика пробуется снова.
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine], retry: float):
+        """
+        :param engine: движок реплики, None - реплики нет, чтение идет в основную БД
+        :param retry: время в секундах, на которое реплика исключается после ошибки подключения
+        """
+        self.engine = engine
+        self.retry = retry
+        self.session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False) if engine else None
+        # время (monotonic), до которого реплика исключена
+        self.down_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.session_maker is not None
+
+    async def session(self, primary: bool = False) -> AsyncSession:
+        """
+        Сессия для чтения: на реплике с уже полученным соединением или, при ошибке подключения, на основной БД.
+        :param primary: чтение в основную БД (чтение своих записей)
+        :return: async сессия БД
+        """
+        if not self.enabled or primary or time.monotonic() < self.down_until:
+            return async_session_maker()
+
+        session = self.session_maker()
+        try:
+            # соединение берется сразу: ошибка подключения к реплике - до запросов хендлера
+            await session.connection()
+            return session
+        except (SQLAlchemyError, OSError) as err:
+            await session.close()
+            self.down_until = time.monotonic() + self.retry
+            logger.warning("DB replica is unavailable, reading from primary", extra={"error": str(err)})
+            return async_session_maker()
+
+
+# движок реплики БД для чтения
+# метрики пула реплики размечаются engine="replica" и не смешиваются с метриками основной БД
+replica_engine = (
+    create_async_engine(REPLICA_DATABASE_URL, pool_logging_name="replica", **DATABASE_PARAMS)
+    if REPLICA_DATABASE_URL else None
+)
+if replica_engine is not None:
+    instrument_engine(replica_engine.sync_engine)
+# маршрутизация читающих сессий
+read_router = ReadRouter(replica_engine, retry=cfg.DB_REPLICA_RETRY)
+
+
+async def prewarm_pool() -> None:
+    """
+    Открытие постоянных соединений пула при старте сервиса: первые запросы не ждут подключения к БД.
+    Если БД недоступна, соединения откроются при первых запросах.
+    """
+    if not cfg.DB_POOL_PREWARM or DATABASE_PARAMS.get("poolclass") is NullPool:
+        return
+
+    results = await asyncio.gather(*(engine.connect() for _ in range(cfg.DB_POOL_SIZE)), return_exceptions=True)
+    connections = [result for result in results if not isinstance(result, BaseException)]
+    # соединения возвращаются в пул открытыми
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+    errors = [str(result) for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.warning("DB pool prewarm failed", extra={"connections": len(connections), "error": errors[0]})
+        return
+    logger.info("DB pool prewarmed", extra={"connections": len(connections)})
+
+
+# сессии БД текущего запроса, соединения которых возвращаются в пул сразу после хендлера (SessionRoute)
+request_sessions: ContextVar[Optional[List[AsyncSession]]] = ContextVar("request_sessions", default=None)
+
+
+async def release_sessions() -> None:
+    """
+    Возврат соединений сессий текущего запроса в пул. Сессия остается рабочей:
+    следующий запрос через нее снова возьмет соединение из пула.
+    """
+    for session in request_sessions.get() or []:
+        await session.close()
+
+
+class SessionRoute(TimedRoute):
+    """
+    Роут, возвращающий соединения сессий БД в пул, как только хендлер завершился (или упала зависимость),
+    а не после отправки ответа, когда закрываются зависимости с yield.
+    Сессия берет соединение из пула только при первом запросе к БД: запрос, отвеченный из кэша
+    или не прошедший авторизацию до запросов, соединение не занимает.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = self.release_after(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def release_after(endpoint: Callable) -> Callable:
+        # сигнатура хендлера сохраняется functools.wraps - по ней FastAPI собирает параметры и response_model
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                # соединения возвращаются до сериализации ответа
+                await release_sessions()
+
+        return wrapper
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            token = request_sessions.set([])
+            try:
+                return await handler(request)
+            finally:
+                await release_sessions()
+                request_sessions.reset(token)
+
+        return route_handler
+
+
+def track_session(session: AsyncSession) -> AsyncSession:
+    """
+    Регистрация сессии в запросе: соединение вернется в пул после хендлера (SessionRoute).
+    :param session: async сессия БД
+    :return: сессия
+    """
+    sessions = request_sessions.get()
+    if sessions is not None:
+        sessions.append(session)
+    return session
+
+
 async def get_session() -> AsyncSession:
     """
     Асинхронный генератор сессий соединений с БД.
     :return: асинхронная сессия
     """
     async with async_session_maker() as session:
-        yield session
+        yield track_session(session)
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """
+    Асинхронный генератор сессий для читающих хендлеров: реплика, при ее недоступности - основная БД.
+    После своих записей (кука чтения своих записей) пользователь читает из основной БД.
+    :param request: входящий запрос
+    :return: асинхронная сессия
+    """
+    primary = READ_YOUR_WRITES_COOKIE in request.cookies
+    async with await read_router.session(primary) as session:
+        yield track_session(session)
+
+
+def read_your_writes(response: Response) -> None:
+    """
+    Чтение своих записей: следующие DB_READ_YOUR_WRITES секунд чтение пользователя идет в основную БД,
+    пока реплика догоняет запись.
+    :param response: ответ на пишущий запрос
+    """
+    if read_router.enabled and cfg.DB_READ_YOUR_WRITES > 0:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, "1", max_age=cfg.DB_READ_YOUR_WRITES, httponly=True)
 
 
 class Base(DeclarativeBase):
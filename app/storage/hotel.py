@@ -1,16 +1,112 @@
 from datetime import date
-from typing import Any
+from typing import Any, Dict, List
 
-from sqlalchemy import Integer, and_, func, or_, select
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Select,
+    String,
+    and_,
+    bindparam,
+    func,
+    or_,
+    select,
+)
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.logger import logger
-from app.models.booking import Booking
 from app.models.hotel import Hotel
 from app.models.room import Room
-from app.storage.dao import BaseDAO
+from app.models.room_inventory import RoomInventory
+from app.storage.cache import availability_cache
+from app.storage.dao import BaseDAO, escape_like
+
+
+def location_match() -> ColumnElement[bool]:
+    """
+    Условие поиска гостиниц по локации: по подстроке и по похожести слов (опечатки),
+    оба условия идут по триграммным GIN индексам. Параметры запроса - location_params.
+    :return: условие WHERE
+    """
+    location = bindparam("location", type_=String)
+    pattern = bindparam("pattern", type_=String)
+    return or_(
+        Hotel.location.ilike(pattern, escape="\\"),
+        Hotel.name.ilike(pattern, escape="\\"),
+        location.op("<%")(Hotel.location),
+        location.op("<%")(Hotel.name),
+    )
+
+
+def location_params(location: str) -> Dict[str, str]:
+    """
+    Параметры условия поиска гостиниц по локации.
+    :param location: местонахождение гостиницы
+    :return: параметры запроса
+    """
+    return {"location": location, "pattern": f"%{escape_like(location)}%"}
+
+
+def hotels_by_location_query() -> Select:
+    """
+    Запрос гостиниц локации со свободными номерами за период.
+    Параметры: location_params, date_from, date_to.
+    :return: запрос
+    """
+    location = bindparam("location", type_=String)
+    # релевантность - наибольшая похожесть запроса на слова адреса или названия гостиницы
+    relevance = func.greatest(
+        func.word_similarity(location, Hotel.location),
+        func.word_similarity(location, Hotel.name),
+    )
+
+    # максимальное количество занятых номеров в сутки за период
+    booked_rooms = (
+        select(RoomInventory.room_id, func.max(RoomInventory.booked).label("rooms_booked"))
+        .where(
+            and_(
+                RoomInventory.day >= bindparam("date_from"),
+                RoomInventory.day < bindparam("date_to"),
+            )
+        )
+        .group_by(RoomInventory.room_id)
+        .cte("booked_rooms")
+    )
+
+    booked_hotels = (
+        select(Room.hotel_id,
+               func.sum(Room.quantity - func.coalesce(booked_rooms.c.rooms_booked, 0)).label("rooms_left"),
+               func.array_agg(Room.id, type_=ARRAY(Integer)).label("room_ids"))
+        .select_from(Room)
+        .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
+        # свободные номера считаются только для найденных гостиниц
+        .where(Room.hotel_id.in_(select(Hotel.id).where(location_match())))
+        .group_by(Room.hotel_id)
+        .cte("booked_hotels")
+    )
+
+    return (
+        # Hotels.__table__.columns - алхимия отдает все столбцы по одному, как отдельный атрибут.
+        # Если передать всю модель Hotels и один дополнительный столбец rooms_left,
+        # то будет проблематично для Pydantic распарсить такую структуру данных.
+        # Используется hotels_with_rooms.mappings().all() не hotels_with_rooms.scalars().all()
+        select(
+            Hotel.__table__.columns,
+            booked_hotels.c.rooms_left,
+            booked_hotels.c.room_ids,
+        )
+        .join(booked_hotels, booked_hotels.c.hotel_id == Hotel.id, isouter=True)
+        .where(booked_hotels.c.rooms_left > 0)
+        .order_by(relevance.desc(), Hotel.id)
+    )
+
+
+# запросы горячих путей собираются один раз: ключ кэша и скомпилированный SQL алхимия считает при первом вызове,
+# на вызове остается подстановка параметров
+HOTEL_IDS_BY_LOCATION = select(Hotel.id).where(location_match())
+HOTELS_BY_LOCATION = hotels_by_location_query()
 
 
 class HotelDAO(BaseDAO):
@@ -19,6 +115,26 @@ class HotelDAO(BaseDAO):
     """
     model = Hotel
 
+    @classmethod
+    async def invalidate_cache(cls, instance) -> None:
+        """
+        Новая, измененная или удаленная гостиница может попасть в выдачу по любой локации - кэш сбрасывается целиком.
+        :param instance: гостиница
+        """
+        if instance is not None:
+            await availability_cache.invalidate_all()
+
+    @classmethod
+    async def get_hotel_ids_by_location(cls, session: AsyncSession, location: str) -> List[int]:
+        """
+        Получение id всех гостиниц по локации, в том числе без свободных номеров - теги кэша свободных гостиниц.
+        :param session: async сессия БД
+        :param location: местонахождение гостиницы
+        :return: id гостиниц
+        """
+        result = await session.execute(HOTEL_IDS_BY_LOCATION, location_params(location))
+        return list(result.scalars().all())
+
     @classmethod
     async def get_hotels_by_location(cls, session: AsyncSession, location: str, date_from: date, date_to: date) -> Any:
         """
@@ -31,74 +147,31 @@ class HotelDAO(BaseDAO):
         """
         """
         WITH booked_rooms AS (
-            SELECT room_id, COUNT(room_id) AS rooms_booked
-            FROM bookings
-            WHERE
-                (date_from >= '2023-05-15' AND date_from <= '2023-06-20') OR
-                (date_from <= '2023-05-15' AND date_to > '2023-05-15')
+            SELECT room_id, MAX(booked) AS rooms_booked
+            FROM room_inventory
+            WHERE day >= '2023-05-15' AND day < '2023-06-20'
             GROUP BY room_id
         ),
         booked_hotels AS (
             SELECT hotel_id, SUM(rooms.quantity - COALESCE(rooms_booked, 0)) AS rooms_left, array_agg(id) as room_ids
             FROM rooms
             LEFT JOIN booked_rooms ON booked_rooms.room_id = rooms.id
+            WHERE hotel_id IN (
+                SELECT id FROM hotels
+                WHERE location ILIKE '%Алтай%' OR name ILIKE '%Алтай%' OR 'Алтай' <% location OR 'Алтай' <% name
+            )
             GROUP BY hotel_id
         )
         SELECT * FROM hotels
         LEFT JOIN booked_hotels ON booked_hotels.hotel_id = hotels.id
-        WHERE rooms_left > 0 AND location LIKE '%Алтай%';
+        WHERE rooms_left > 0
+        ORDER BY GREATEST(word_similarity('Алтай', location), word_similarity('Алтай', name)) DESC, id;
         """
         try:
-            booked_rooms = (
-                select(Booking.room_id, func.count(Booking.room_id).label("rooms_booked"))
-                .select_from(Booking)
-                .where(
-                    or_(
-                        and_(
-                            Booking.date_from >= date_from,
-                            Booking.date_from <= date_to,
-                        ),
-                        and_(
-                            Booking.date_from <= date_from,
-                            Booking.date_to > date_from,
-                        ),
-                    ),
-                )
-                .group_by(Booking.room_id)
-                .cte("booked_rooms")
-            )
-
-            booked_hotels = (
-                select(Room.hotel_id,
-                       func.sum(Room.quantity - func.coalesce(booked_rooms.c.rooms_booked, 0)).label("rooms_left"),
-                       func.array_agg(Room.id, type_=ARRAY(Integer)).label("room_ids"))
-                .select_from(Room)
-                .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
-                .group_by(Room.hotel_id)
-                .cte("booked_hotels")
-            )
-
-            get_hotels_with_rooms = (
-                # Hotels.__table__.columns - алхимия отдает все столбцы по одному, как отдельный атрибут.
-                # Если передать всю модель Hotels и один дополнительный столбец rooms_left,
-                # то будет проблематично для Pydantic распарсить такую структуру данных.
-                # Используется hotels_with_rooms.mappings().all() не hotels_with_rooms.scalars().all()
-                select(
-                    Hotel.__table__.columns,
-                    booked_hotels.c.rooms_left,
-                    booked_hotels.c.room_ids,
-                )
-                .join(booked_hotels, booked_hotels.c.hotel_id == Hotel.id, isouter=True)
-                .where(
-                    and_(
-                        booked_hotels.c.rooms_left > 0,
-                        Hotel.location.like(f"%{location}%"),
-                    )
-                )
+            # logger.debug(HOTELS_BY_LOCATION.compile(engine, compile_kwargs={"literal_binds": True}))
+            hotels_with_rooms = await session.execute(
+                HOTELS_BY_LOCATION, {**location_params(location), "date_from": date_from, "date_to": date_to},
             )
-
-            # logger.debug(get_hotels_with_rooms.compile(engine, compile_kwargs={"literal_binds": True}))
-            hotels_with_rooms = await session.execute(get_hotels_with_rooms)
             return hotels_with_rooms.mappings().all()
         except (SQLAlchemyError, Exception) as err:
             if isinstance(err, SQLAlchemyError):
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import UploadFile
+
+from app.errors import ImageTooLargeErr, IncorrectImageFormatErr
+from config import cfg
+
+# фото гостиниц: {image_id}.{ext} - ссылки на файлы хранилища (или файлы, загруженные до хранилища)
+HOTEL_IMAGES_DIR = Path("app/frontend/static/images/hotels")
+# расширения фото гостиниц в порядке поиска
+HOTEL_IMAGE_EXTS = ("webp", "jpeg", "png")
+# сигнатуры форматов фото -> расширение файла
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+}
+
+
+def image_format(head: bytes) -> Optional[str]:
+    """
+    Формат фото по первым байтам файла.
+    :param head: начало файла (не меньше 12 байт)
+    :return: jpeg, png, webp или None - не фото
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, ext in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def hotel_image_path(image_id: int) -> Optional[Path]:
+    """
+    Путь к фото гостиницы по id, расширение - формат загруженного фото.
+    :param image_id: id фото
+    :return: путь или None - фото нет
+    """
+    for ext in HOTEL_IMAGE_EXTS:
+        path = HOTEL_IMAGES_DIR / f"{image_id}.{ext}"
+        if path.exists():
+            return path
+    return None
+
+
+def unlink_hotel_images(image_id: int, keep: Path) -> None:
+    """
+    Удаление имен фото гостиницы в других форматах после загрузки нового фото.
+    :param image_id: id фото
+    :param keep: путь нового фото
+    """
+    for ext in HOTEL_IMAGE_EXTS:
+        path = HOTEL_IMAGES_DIR / f"{image_id}.{ext}"
+        if path != keep:
+            path.unlink(missing_ok=True)
+
+
+class ImageStore:
+    """
+    Контентно-адресуемое хранилище фото: файл лежит по sha256 содержимого - {root}/{sha[:2]}/{sha}.{ext}.
+    Одинаковые загрузки хранятся один раз, содержимое по адресу не меняется - URL можно кэшировать навсегда.
+    Имена фото (hotels/1.jpeg) - символические ссылки на файлы хранилища.
+    """
+
+    def __init__(self, root: str, url: str, max_size: int, chunk_size: int = 64 * 1024):
+        """
+        :param root: папка хранилища
+        :param url: URL, под которым отдается папка хранилища
+        :param max_size: максимальный размер фото в байтах
+        :param chunk_size: размер части файла при загрузке
+        """
+        self.root = Path(root)
+        self.url = url
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256: str, ext: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}.{ext}"
+
+    def blob_url(self, blob: Path) -> str:
+        """
+        Неизменяемый URL файла хранилища (версия - хэш содержимого в имени файла).
+        :param blob: путь к файлу хранилища
+        :return: URL
+        """
+        return f"{self.url}/{blob.relative_to(self.root).as_posix()}"
+
+    async def save(self, file: UploadFile) -> dict:
+        """
+        Потоковое сохранение фото: файл пишется частями во временный файл в потоке, хэш считается по ходу записи.
+        Если такое фото уже есть в хранилище, временный файл удаляется.
+        :param file: загружаемый файл
+        :return: sha256, путь к файлу хранилища, размер в байтах, duplicate - фото уже было в хранилище
+        """
+        if file.size is not None and file.size > self.max_size:
+            raise ImageTooLargeErr
+
+        head = await file.read(self.chunk_size)
+        ext = image_format(head)
+        if ext is None:
+            raise IncorrectImageFormatErr
+
+        digest, size = hashlib.sha256(), 0
+        tmp = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=self.root / "tmp", delete=False)
+        try:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > self.max_size:
+                    raise ImageTooLargeErr
+                digest.update(chunk)
+                await asyncio.to_thread(tmp.write, chunk)
+                chunk = await file.read(self.chunk_size)
+            await asyncio.to_thread(tmp.close)
+
+            sha256 = digest.hexdigest()
+            blob = self.blob_path(sha256, ext)
+            duplicate = await asyncio.to_thread(blob.exists)
+            if not duplicate:
+                await asyncio.to_thread(blob.parent.mkdir, exist_ok=True)
+                await asyncio.to_thread(os.replace, tmp.name, blob)
+        finally:
+            tmp.close()
+            if os.path.exists(tmp.name):
+                os.remove(tmp.name)
+
+        return {"sha256": sha256, "path": blob, "size": size, "duplicate": duplicate}
+
+    async def link(self, blob: Path, name: Path) -> None:
+        """
+        Привязка имени фото к файлу хранилища: атомарная замена символической ссылки.
+        :param blob: путь к файлу хранилища
+        :param name: путь имени фото
+        """
+        def replace_link():
+            tmp_link = name.with_name(f".{name.name}.tmp")
+            if tmp_link.is_symlink():
+                tmp_link.unlink()
+            tmp_link.symlink_to(os.path.relpath(blob, name.parent))
+            os.replace(tmp_link, name)
+
+        await asyncio.to_thread(replace_link)
+
+    @staticmethod
+    def version(name: Path) -> Optional[str]:
+        """
+        Версия фото по имени: хэш файла хранилища или, для фото, загруженных до хранилища, - время изменения и размер.
+        :param name: путь имени фото
+        :return: версия или None - фото нет
+        """
+        try:
+            stat_result = os.stat(name)
+            if name.is_symlink():
+                return Path(os.readlink(name)).stem[:16]
+        except OSError:
+            return None
+        return f"{stat_result.st_mtime_ns:x}{stat_result.st_size:x}"
+
+
+class ImageCache:
+    """
+    Кэш вариантов фото на диске с вытеснением давно не запрошенных (LRU), суммарный размер - не больше max_size.
+    Порядок обращений хранится в памяти процесса и восстанавливается при старте по времени изменения файлов.
+    Конкурентные промахи по одному ключу в процессе схлопываются в одно построение варианта.
+    """
+
+    def __init__(self, root: str, max_size: int):
+        """
+        :param root: папка кэша
+        :param max_size: максимальный суммарный размер файлов в байтах
+        """
+        self.root = Path(root)
+        self.max_size = max_size
+        self.size = 0
+        # ключ -> размер файла, от давно запрошенных к недавним
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        # построения вариантов в процессе: ключ -> задача
+        self._renders: Dict[str, asyncio.Task] = {}
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _load(self) -> None:
+        files = [path for path in self.root.glob("*/*") if path.is_file()]
+        for path in sorted(files, key=lambda path: path.stat().st_mtime):
+            self._entries[path.name] = path.stat().st_size
+            self.size += self._entries[path.name]
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> Path:
+        """
+        Путь к варианту в кэше, на промахе - построение через render и запись в кэш.
+        :param key: ключ варианта
+        :param render: построение варианта
+        :return: путь к файлу варианта
+        """
+        path = self.path(key)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            try:
+                # время изменения - порядок вытеснения после перезапуска
+                await asyncio.to_thread(os.utime, path)
+                return path
+            except FileNotFoundError:
+                # файл удален другим процессом
+                self.size -= self._entries.pop(key)
+
+        task = self._renders.get(key)
+        if task is None:
+            task = asyncio.create_task(self._render(key, render))
+            self._renders[key] = task
+            task.add_done_callback(lambda _: self._renders.pop(key, None))
+        # отмена одного запроса не отменяет построение для остальных
+        return await asyncio.shield(task)
+
+    async def _render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> Path:
+        content = await render()
+        path = self.path(key)
+
+        def write():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f".{key}.tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, path)
+
+        await asyncio.to_thread(write)
+        if key not in self._entries:
+            self.size += len(content)
+        self._entries[key] = len(content)
+        await self._evict(keep=key)
+        return path
+
+    async def _evict(self, keep: str) -> None:
+        """
+        Удаление давно запрошенных вариантов, пока размер кэша больше max_size.
+        :param keep: ключ, который не удаляется (только что построенный вариант)
+        """
+        evicted = []
+        while self.size > self.max_size and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self.size -= size
+            evicted.append(self.path(key))
+        if evicted:
+            await asyncio.to_thread(lambda: [path.unlink(missing_ok=True) for path in evicted])
+
+
+# хранилище фото, папка отдается под /images/store с кэшированием навсегда
+image_store = ImageStore(root=cfg.IMAGE_STORE_DIR, url="/images/store", max_size=cfg.IMAGE_MAX_SIZE)
+# кэш вариантов фото, построенных по запросу
+image_cache = ImageCache(root=cfg.IMAGE_CACHE_DIR, max_size=cfg.IMAGE_CACHE_SIZE)
@@ -0,0 +1,217 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.logger import logger
+from app.timing import add_timing
+from config import cfg
+
+# DAO-метод, выполняющий запрос (HotelDAO.get_all), запросы вне DAO - other
+current_query: ContextVar[str] = ContextVar("current_query", default="other")
+
+# метрики запросов к БД, публикуются на /metrics вместе с метриками HTTP
+SQL_QUERY_SECONDS = Histogram(
+    "sql_query_duration_seconds",
+    "Время выполнения запроса к БД, секунды",
+    ["query"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+SQL_QUERY_ROWS = Histogram(
+    "sql_query_rows",
+    "Количество строк, возвращенных или измененных запросом",
+    ["query"],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+SQL_SLOW_QUERIES = Counter("sql_slow_queries_total", "Медленные запросы к БД", ["query"])
+# кэши запросов: compiled - скомпилированные алхимией, prepared - подготовленные asyncpg на соединении
+SQL_STATEMENT_CACHE = Counter(
+    "sql_statement_cache_total",
+    "Обращения к кэшам запросов: попадания (hit) и промахи (miss)",
+    ["cache", "result"],
+)
+SQL_STATEMENT_CACHE_SIZE = Gauge(
+    "sql_statement_cache_size",
+    "Размер кэшей запросов (prepared - на соединение)",
+    ["cache"],
+    multiprocess_mode="max",
+)
+
+# метрики пулов соединений с БД по движкам (engine - pool_logging_name движка: primary, replica),
+# в multiprocess режиме (несколько воркеров) суммируются по живым процессам
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity",
+    "Размер пула соединений с БД: постоянные (size) и дополнительные (overflow) соединения",
+    ["engine", "kind"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Выданные из пула соединения с БД",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "db_pool_acquire_seconds",
+    "Время получения соединения из пула, секунды",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Соединение из пула не получено за DB_POOL_TIMEOUT", ["engine"])
+
+# максимальная длина параметров запроса в логе медленных запросов
+SLOW_QUERY_PARAMS_MAX_LENGTH = 1000
+# запросы, для которых строится план (EXPLAIN без ANALYZE запрос не выполняет)
+EXPLAIN_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def instrument(func):
+    """
+    Декоратор coroutine-метода DAO: запросы внутри метода размечаются его именем (Класс.метод).
+    :param func: coroutine-функция classmethod
+    :return: обертка
+    """
+    @functools.wraps(func)
+    async def wrapper(cls, *args, **kwargs):
+        token = current_query.set(f"{cls.__name__}.{func.__name__}")
+        try:
+            return await func(cls, *args, **kwargs)
+        finally:
+            current_query.reset(token)
+
+    return wrapper
+
+
+def instrument_dao(dao: type) -> None:
+    """
+    Разметка всех coroutine classmethod, объявленных в классе DAO.
+    :param dao: класс DAO
+    """
+    for name, attr in list(vars(dao).items()):
+        if isinstance(attr, classmethod) and inspect.iscoroutinefunction(attr.__func__):
+            setattr(dao, name, classmethod(instrument(attr.__func__)))
+
+
+def explain(conn, statement: str, parameters) -> str:
+    """
+    План медленного запроса. Выполняется отдельным курсором в точке сохранения:
+    ошибка EXPLAIN не прерывает транзакцию запроса.
+    :param conn: соединение алхимии
+    :param statement: запрос
+    :param parameters: параметры запроса
+    :return: план запроса
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        except Exception as err:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            plan = f"EXPLAIN failed: {err}"
+        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        cursor.close()
+
+
+def statement_cache_result(conn, statement: str, context) -> None:
+    """
+    Учет попаданий в кэши запросов. Запросы без ключа кэша (text, DDL) не учитываются.
+    :param conn: соединение алхимии
+    :param statement: запрос
+    :param context: контекст выполнения запроса
+    """
+    dialect = context.dialect
+    if context.cache_hit == dialect.CACHE_HIT:
+        SQL_STATEMENT_CACHE.labels("compiled", "hit").inc()
+    elif context.cache_hit == dialect.CACHE_MISS:
+        SQL_STATEMENT_CACHE.labels("compiled", "miss").inc()
+
+    # кэш адаптера asyncpg, None - кэш выключен (DB_STATEMENT_CACHE_SIZE=0)
+    prepared = getattr(conn.connection.dbapi_connection, "_prepared_statement_cache", None)
+    if prepared is not None:
+        SQL_STATEMENT_CACHE.labels("prepared", "hit" if statement in prepared else "miss").inc()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statement_cache_result(conn, statement, context)
+    context.query_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context.query_start
+    query = current_query.get()
+    SQL_QUERY_SECONDS.labels(query).observe(duration)
+    add_timing("db", duration)
+    if cursor.rowcount >= 0:
+        SQL_QUERY_ROWS.labels(query).observe(cursor.rowcount)
+
+    if duration < cfg.SQL_SLOW_QUERY_THRESHOLD:
+        return
+    SQL_SLOW_QUERIES.labels(query).inc()
+    extra = {
+        "query": query,
+        "duration": round(duration, 4),
+        "rows": cursor.rowcount,
+        "statement": statement,
+        "parameters": repr(parameters)[:SLOW_QUERY_PARAMS_MAX_LENGTH],
+    }
+    if cfg.SQL_SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().upper().startswith(EXPLAIN_STATEMENTS):
+        extra["plan"] = explain(conn, statement, parameters)
+    logger.warning("Slow query", extra=extra)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений asyncio с замером времени получения соединения:
+    ожидание свободного соединения или открытие нового.
+    Метрики размечаются именем пула - pool_logging_name движка.
+    """
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        self.engine_label = self.logging_name or "primary"
+        DB_POOL_CAPACITY.labels(self.engine_label, "size").set(pool_size)
+        DB_POOL_CAPACITY.labels(self.engine_label, "overflow").set(max_overflow)
+
+    def _do_get(self):
+        begin = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.engine_label).inc()
+            raise
+        finally:
+            DB_POOL_ACQUIRE_SECONDS.labels(self.engine_label).observe(time.perf_counter() - begin)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Подключение метрик и лога медленных запросов к движку алхимии.
+    Метрики пула размечаются pool_logging_name движка.
+    :param engine: синхронный движок (AsyncEngine.sync_engine)
+    """
+    checked_out = DB_POOL_CHECKED_OUT.labels(engine.pool.logging_name or "primary")
+
+    def pool_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+
+    def pool_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+    SQL_STATEMENT_CACHE_SIZE.labels("compiled").set(cfg.SQL_COMPILED_CACHE_SIZE)
+    SQL_STATEMENT_CACHE_SIZE.labels("prepared").set(cfg.DB_STATEMENT_CACHE_SIZE)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    event.listen(engine, "checkout", pool_checkout)
+    event.listen(engine, "checkin", pool_checkin)
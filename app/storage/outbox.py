@@ -0,0 +1,78 @@
+from typing import List, Sequence
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logger import logger
+from app.models.outbox import Outbox
+from app.storage.dao import BaseDAO
+from config import cfg
+
+
+class OutboxDAO(BaseDAO):
+    """
+    Класс для использования DAO методов.
+    """
+    model = Outbox
+
+    @classmethod
+    async def claim(cls, session: AsyncSession, limit: int) -> Sequence[Outbox]:
+        """
+        Выборка пачки неотправленных сообщений с блокировкой строк до конца транзакции.
+        Строки, заблокированные другим диспетчером, пропускаются - диспетчеры не отправляют одно сообщение дважды.
+        :param session: async сессия БД
+        :param limit: размер пачки
+        :return: сообщения
+        """
+        """
+        SELECT * FROM outbox
+        WHERE delivered_at IS NULL AND failed_at IS NULL
+        AND (next_attempt_at IS NULL OR next_attempt_at <= now())
+        ORDER BY id
+        LIMIT 100
+        FOR UPDATE SKIP LOCKED
+        """
+        query = (
+            select(Outbox)
+            .where(
+                Outbox.delivered_at.is_(None),
+                Outbox.failed_at.is_(None),
+                or_(Outbox.next_attempt_at.is_(None), Outbox.next_attempt_at <= func.now()),
+            )
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        messages = await session.execute(query)
+        return messages.scalars().all()
+
+    @classmethod
+    async def complete(cls, session: AsyncSession, delivered: List[int], failed: List[int]) -> None:
+        """
+        Отметка результата отправки пачки и снятие блокировок (commit).
+        Неотправленное сообщение откладывается с экспоненциальной задержкой,
+        после OUTBOX_MAX_ATTEMPTS ошибок - переводится в dead letter (failed_at).
+        :param session: async сессия БД
+        :param delivered: id отправленных сообщений
+        :param failed: id сообщений, которые не удалось отправить
+        """
+        if delivered:
+            await session.execute(update(Outbox).where(Outbox.id.in_(delivered)).values(delivered_at=func.now()))
+        if failed:
+            # в SET используются значения строки до обновления: attempts - число прошлых ошибок
+            backoff = func.least(cfg.OUTBOX_RETRY_BACKOFF * func.power(2, Outbox.attempts), cfg.OUTBOX_RETRY_MAX_BACKOFF)
+            query = (
+                update(Outbox)
+                .where(Outbox.id.in_(failed))
+                .values(
+                    attempts=Outbox.attempts + 1,
+                    next_attempt_at=func.now() + func.make_interval(0, 0, 0, 0, 0, 0, backoff),
+                    failed_at=case((Outbox.attempts + 1 >= cfg.OUTBOX_MAX_ATTEMPTS, func.now()), else_=None),
+                )
+                .returning(Outbox.id, Outbox.failed_at)
+            )
+            result = await session.execute(query)
+            dead = [row.id for row in result if row.failed_at is not None]
+            if dead:
+                logger.error("Outbox messages moved to dead letter", extra={"ids": dead})
+        await session.commit()
@@ -1,22 +1,91 @@
 from datetime import date
 from typing import Any
 
-from sqlalchemy import and_, func, or_, select
+from sqlalchemy import Integer, Select, and_, bindparam, func, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.logger import logger
-from app.models.booking import Booking
 from app.models.room import Room
+from app.models.room_inventory import RoomInventory
+from app.storage.cache import availability_cache
 from app.storage.dao import BaseDAO
 
 
+def rooms_by_time_query() -> Select:
+    """
+    Запрос номеров гостиницы со стоимостью и количеством свободных номеров за период.
+    Параметры: hotel_id, date_from, date_to, days - количество суток.
+    :return: запрос
+    """
+    hotel_id = bindparam("hotel_id", type_=Integer)
+    # максимальное количество занятых номеров в сутки за период по номерам гостиницы
+    booked_rooms = (
+        select(RoomInventory.room_id, func.max(RoomInventory.booked).label("rooms_booked"))
+        .join(Room, Room.id == RoomInventory.room_id)
+        .where(
+            and_(
+                Room.hotel_id == hotel_id,
+                RoomInventory.day >= bindparam("date_from"),
+                RoomInventory.day < bindparam("date_to"),
+            )
+        )
+        .group_by(RoomInventory.room_id)
+        .cte("booked_rooms")
+    )
+
+    return (
+        select(
+            Room.__table__.columns,
+            (Room.price * bindparam("days", type_=Integer)).label("total_cost"),
+            (Room.quantity - func.coalesce(booked_rooms.c.rooms_booked, 0)).label("rooms_left"),
+        )
+        .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
+        .where(
+            Room.hotel_id == hotel_id
+        )
+    )
+
+
+# запрос собирается один раз: на вызове остается подстановка параметров
+ROOMS_BY_TIME = rooms_by_time_query()
+
+
 class RoomDAO(BaseDAO):
     """
     Класс для использования DAO методов.
     """
     model = Room
 
+    @classmethod
+    async def update(cls, session: AsyncSession, data, id) -> Any:
+        """
+        Обновление номера в БД. При переносе номера в другую гостиницу инвалидируются обе гостиницы.
+        :param session: async сессия БД
+        :param data: значение полей номера
+        :param id: id номера
+        :return: обновленный номер
+        """
+        old_hotel_id = None
+        if "hotel_id" in data:
+            # строка блокируется до коммита обновления: гостиница номера не сменится между чтением и UPDATE
+            query = select(Room.hotel_id).where(Room.id == id).with_for_update()
+            old_hotel_id = (await session.execute(query)).scalar_one_or_none()
+
+        instance = await super().update(session, data, id)
+        if instance is not None and old_hotel_id not in (None, instance.hotel_id):
+            await availability_cache.invalidate_hotels([old_hotel_id])
+        return instance
+
+    @classmethod
+    async def invalidate_cache(cls, instance) -> None:
+        """
+        Изменение номера влияет на свободные номера его гостиницы за любой период.
+        :param instance: номер
+        """
+        if instance is not None:
+            await availability_cache.invalidate_hotels([instance.hotel_id])
+
     @classmethod
     async def get_rooms_by_time(cls, session: AsyncSession, hotel_id: int, date_from: date, date_to: date) -> Any:
         """
@@ -29,10 +98,10 @@ class RoomDAO(BaseDAO):
         """
         """
         WITH booked_rooms AS (
-            SELECT room_id, COUNT(room_id) AS rooms_booked
-            FROM bookings
-            WHERE (date_from >= '2023-05-15' AND date_from <= '2023-06-20') OR
-                  (date_from <= '2023-05-15' AND date_to > '2023-05-15')
+            SELECT room_id, MAX(booked) AS rooms_booked
+            FROM room_inventory
+            JOIN rooms ON rooms.id = room_inventory.room_id
+            WHERE hotel_id = 1 AND day >= '2023-05-15' AND day < '2023-06-20'
             GROUP BY room_id
         )
         SELECT
@@ -42,39 +111,13 @@ class RoomDAO(BaseDAO):
         WHERE hotel_id = 1
         """
         try:
-            booked_rooms = (
-                select(Booking.room_id, func.count(Booking.room_id).label("rooms_booked"))
-                .select_from(Booking)
-                .where(
-                    or_(
-                        and_(
-                            Booking.date_from >= date_from,
-                            Booking.date_from <= date_to,
-                        ),
-                        and_(
-                            Booking.date_from <= date_from,
-                            Booking.date_to > date_from,
-                        ),
-                    ),
-                )
-                .group_by(Booking.room_id)
-                .cte("booked_rooms")
-            )
-
-            get_rooms = (
-                select(
-                    Room.__table__.columns,
-                    (Room.price * (date_to - date_from).days).label("total_cost"),
-                    (Room.quantity - func.coalesce(booked_rooms.c.rooms_booked, 0)).label("rooms_left"),
-                )
-                .join(booked_rooms, booked_rooms.c.room_id == Room.id, isouter=True)
-                .where(
-                    Room.hotel_id == hotel_id
-                )
-            )
-
-            # logger.debug(get_rooms.compile(engine, compile_kwargs={"literal_binds": True}))
-            rooms = await session.execute(get_rooms)
+            # logger.debug(ROOMS_BY_TIME.compile(engine, compile_kwargs={"literal_binds": True}))
+            rooms = await session.execute(ROOMS_BY_TIME, {
+                "hotel_id": hotel_id,
+                "date_from": date_from,
+                "date_to": date_to,
+                "days": (date_to - date_from).days,
+            })
             return rooms.mappings().all()
         except (SQLAlchemyError, Exception) as err:
             if isinstance(err, SQLAlchemyError):
@@ -1,14 +1,22 @@
+import csv
+from typing import AsyncIterator, List, Type
+
+from asyncpg import PostgresError
 from fastapi import HTTPException, status
-from sqlalchemy import text
+from sqlalchemy import func, select, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.errors import UnknownErr
+from app.errors import IncorrectCSVHeaderErr, UnknownErr
+from app.storage.booking import BookingDAO
+from app.storage.cache import availability_cache
+from app.storage.database import Base
 
 
 async def upload_sql_queries(session: AsyncSession, queries: list[str]) -> None:
     """
     Загрузка в БД sql-запросов.
+    Бронирования загружаются в обход BookingDAO, поэтому учет занятости номеров пересчитывается целиком.
     :param session: async сессия БД
     :param queries: список из sql-запросов
     :return: None
@@ -16,7 +24,9 @@ async def upload_sql_queries(session: AsyncSession, queries: list[str]) -> None:
     try:
         for query in queries:
             await session.execute(text(query))
+        await BookingDAO.rebuild_inventory(session)
         await session.commit()
+        await availability_cache.invalidate_all()
     except (SQLAlchemyError, Exception) as err:
         if isinstance(err, SQLAlchemyError):
             raise HTTPException(
@@ -25,3 +35,77 @@ async def upload_sql_queries(session: AsyncSession, queries: list[str]) -> None:
             )
         elif isinstance(err, Exception):
             raise UnknownErr
+
+
+def csv_columns(model: Type[Base], header: bytes) -> List[str]:
+    """
+    Сопоставление заголовка CSV с колонками таблицы.
+    Вычисляемые колонки загружать нельзя, обязательные колонки (NOT NULL без default) должны быть в заголовке.
+    :param model: модель таблицы
+    :param header: первая строка CSV
+    :return: колонки таблицы в порядке заголовка
+    """
+    try:
+        columns = [column.strip().lower() for column in next(csv.reader([header.decode("utf-8-sig")]))]
+    except (UnicodeDecodeError, StopIteration):
+        raise IncorrectCSVHeaderErr
+
+    table_columns = {column.name: column for column in model.__table__.columns if column.computed is None}
+    required = {
+        name for name, column in table_columns.items()
+        if not column.nullable and not column.primary_key and column.server_default is None
+    }
+
+    unknown = [column for column in columns if column not in table_columns]
+    missing = required - set(columns)
+    if unknown or missing or len(columns) != len(set(columns)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IncorrectCSVHeaderErr.detail}: unknown columns {unknown}, missing columns {sorted(missing)}",
+        )
+
+    return columns
+
+
+async def upload_csv(session: AsyncSession, model: Type[Base], columns: List[str], rows: AsyncIterator[bytes]) -> int:
+    """
+    Загрузка в таблицу строк CSV (без заголовка) через COPY (asyncpg copy_to_table) одной транзакцией.
+    Строки передаются в БД по мере чтения файла, без разбора на стороне сервиса.
+    Если загружены id, sequence таблицы сдвигается на максимальный id.
+    Бронирования загружаются в обход BookingDAO, поэтому учет занятости номеров пересчитывается целиком.
+    :param session: async сессия БД
+    :param model: модель таблицы
+    :param columns: колонки таблицы в порядке CSV
+    :param rows: асинхронный генератор частей CSV
+    :return: количество загруженных строк
+    """
+    table = model.__tablename__
+    try:
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        # 'COPY 1000'
+        copy_status = await raw_connection.driver_connection.copy_to_table(
+            table, source=rows, columns=columns, format="csv",
+        )
+
+        if "id" in columns:
+            await session.execute(
+                select(func.setval(func.pg_get_serial_sequence(table, "id"), func.max(model.id))).having(
+                    func.max(model.id).isnot(None)
+                )
+            )
+        if table == BookingDAO.model.__tablename__:
+            await BookingDAO.rebuild_inventory(session)
+
+        await session.commit()
+        await availability_cache.invalidate_all()
+        return int(copy_status.split()[-1])
+    except (SQLAlchemyError, PostgresError, Exception) as err:
+        await session.rollback()
+        if isinstance(err, (SQLAlchemyError, PostgresError)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(err),
+            )
+        elif isinstance(err, Exception):
+            raise UnknownErr
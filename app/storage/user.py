@@ -1,3 +1,9 @@
+from typing import Any
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.revocation import DELETED_VERSION, token_versions
 from app.models.user import User
 from app.storage.dao import BaseDAO
 
@@ -7,3 +13,65 @@ class UserDAO(BaseDAO):
     Класс для использования DAO методов.
     """
     model = User
+
+    @classmethod
+    async def update(cls, session: AsyncSession, data, id) -> Any:
+        """
+        Обновление пользователя в БД с отзывом его JWT-токенов.
+        :param session: async сессия БД
+        :param data: значение полей пользователя
+        :param id: id пользователя
+        :return: обновленный пользователь
+        """
+        return await super().update(session, {**data, "token_version": User.token_version + 1}, id)
+
+    @classmethod
+    async def delete(cls, session: AsyncSession, id) -> Any:
+        """
+        Удаление пользователя из БД с отзывом его JWT-токенов.
+        :param session: async сессия БД
+        :param id: id пользователя
+        :return: удаленный пользователь
+        """
+        instance = await super().delete(session, id)
+        if instance is not None:
+            await token_versions.set(instance.id, DELETED_VERSION)
+        return instance
+
+    @classmethod
+    async def invalidate_cache(cls, instance) -> None:
+        """
+        Запись версии JWT-токенов добавленного или измененного пользователя в redis.
+        :param instance: пользователь
+        """
+        if instance is not None:
+            await token_versions.set(instance.id, instance.token_version)
+
+    @classmethod
+    async def revoke_tokens(cls, session: AsyncSession, id: int) -> None:
+        """
+        Отзыв всех выписанных JWT-токенов пользователя (логаут, изменение в админке).
+        Удаленного пользователя в БД нет - его токены отзываются в redis.
+        :param session: async сессия БД
+        :param id: id пользователя
+        """
+        query = (
+            update(User)
+            .where(User.id == id)
+            .values(token_version=User.token_version + 1)
+            .returning(User.token_version)
+        )
+        version = (await session.execute(query)).scalar_one_or_none()
+        await session.commit()
+        await token_versions.set(id, version if version is not None else DELETED_VERSION)
+
+    @classmethod
+    async def update_password_hash(cls, session: AsyncSession, id: int, hashed_password: str) -> None:
+        """
+        Обновление хэша пароля без изменения пароля (перехэширование при логине), токены пользователя не отзываются.
+        :param session: async сессия БД
+        :param id: id пользователя
+        :param hashed_password: новый хэш пароля
+        """
+        await session.execute(update(User).where(User.id == id).values(hashed_password=hashed_password))
+        await session.commit()
@@ -0,0 +1,224 @@
+"""
+Обработка фото гостиниц: варианты заданных размеров и форматов из одного декодирования исходника.
+
+Пачка фото обрабатывается параллельно, по одному исходнику на исполнителя: из командной строки - в пуле
+процессов, в задаче celery - в пуле потоков (процессы воркера celery не могут порождать дочерние процессы,
+а Pillow отпускает GIL на декодировании, ресайзе и кодировании).
+Запуск для уже загруженных фото:
+    python -m app.tasks.images app/frontend/static/images/hotels/*.webp --workers 8
+"""
+import argparse
+import hashlib
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from PIL import Image
+
+from app.logger import logger
+from config import cfg
+
+try:
+    # AVIF в Pillow регистрирует pillow-avif-plugin, без него AVIF-варианты пропускаются
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# параметры кодирования форматов
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60, "speed": 8},
+    "jpeg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+}
+# размер части файла при подсчете хэша
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Variant:
+    """
+    Вариант фото: вписывается в width x height с сохранением пропорций, кодируется в format.
+    """
+    width: int
+    height: int
+    format: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}_{self.height}.{self.format}"
+
+    def path(self, source: Path, output_dir: Path) -> Path:
+        """
+        Путь варианта: {width}_{height}_{имя исходника}.{format}.
+        :param source: исходник
+        :param output_dir: папка вариантов
+        :return: путь
+        """
+        return output_dir / f"{self.width}_{self.height}_{source.stem}.{self.format}"
+
+
+def get_variants(sizes: Iterable[Sequence[int]], formats: Iterable[str]) -> List[Variant]:
+    """
+    Варианты фото для всех сочетаний размеров и форматов. Форматы, которые Pillow не умеет сохранять, пропускаются.
+    :param sizes: размеры (ширина, высота)
+    :param formats: форматы - webp, avif, jpeg
+    :return: варианты
+    """
+    supported = [fmt for fmt in formats if is_supported(fmt)]
+    skipped = set(formats) - set(supported)
+    if skipped:
+        logger.warning("Image formats are not supported", extra={"formats": sorted(skipped)})
+    return [Variant(width, height, fmt) for width, height in sizes for fmt in supported]
+
+
+def file_hash(path: Path) -> str:
+    """
+    sha256 содержимого файла.
+    :param path: путь к файлу
+    :return: hex-дайджест
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decode(path: Path, width: int, height: int) -> Image.Image:
+    """
+    Декодирование исходника сразу с уменьшением, но не меньше width x height:
+    JPEG - масштабированием при декодировании (draft), остальные форматы - быстрым целочисленным reduce.
+    :param path: исходник
+    :param width: максимальная ширина вариантов
+    :param height: максимальная высота вариантов
+    :return: фото
+    """
+    with Image.open(path) as image:
+        image.draft("RGB", (width, height))
+        image.load()
+        factor = min(image.width // width, image.height // height)
+        if factor >= 2:
+            image = image.reduce(factor)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        return image
+
+
+def process_image(path: str, variants: Sequence[Variant], output_dir: Optional[str] = None) -> dict:
+    """
+    Варианты одного фото: исходник декодируется один раз, каждый размер считается один раз для всех форматов.
+    Если хэш исходника совпадает с хэшем из манифеста прошлой обработки и все варианты на месте - работа пропускается.
+    :param path: путь к исходнику
+    :param variants: варианты
+    :param output_dir: папка вариантов, по умолчанию - resized рядом с исходником
+    :return: манифест обработки - хэш исходника, время декодирования и каждого варианта в секундах
+    """
+    source = Path(path)
+    output = Path(output_dir) if output_dir else source.parent / "resized"
+    output.mkdir(parents=True, exist_ok=True)
+    manifest_path = output / f"{source.stem}.json"
+
+    source_hash = file_hash(source)
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if (
+                manifest["sha256"] == source_hash
+                and {variant.name for variant in variants} <= set(manifest["timings"])
+                and all(variant.path(source, output).exists() for variant in variants)
+        ):
+            return {**manifest, "skipped": True}
+
+    begin = time.perf_counter()
+    image = decode(source, max(v.width for v in variants), max(v.height for v in variants))
+    manifest = {"source": str(source), "sha256": source_hash, "decode": time.perf_counter() - begin, "timings": {}}
+
+    resized: Dict[tuple, Image.Image] = {}
+    for variant in variants:
+        begin = time.perf_counter()
+        size = (variant.width, variant.height)
+        if size not in resized:
+            resized[size] = image.copy()
+            # вписывание в размер с сохранением пропорций, без увеличения
+            resized[size].thumbnail(size, Image.LANCZOS, reducing_gap=3.0)
+        variant_image = resized[size]
+        if variant.format == "jpeg" and variant_image.mode != "RGB":
+            variant_image = variant_image.convert("RGB")
+        variant_image.save(variant.path(source, output), **SAVE_OPTIONS[variant.format])
+        manifest["timings"][variant.name] = time.perf_counter() - begin
+
+    manifest_path.write_text(json.dumps(manifest))
+    return {**manifest, "skipped": False}
+
+
+def render(path: str, width: Optional[int], height: Optional[int], format: str) -> bytes:
+    """
+    Вариант фото по запросу: вписывание в width x height с сохранением пропорций, без увеличения.
+    Если задан один размер, второй не ограничивается; если не задан ни один - исходный размер.
+    :param path: путь к исходнику
+    :param width: ширина
+    :param height: высота
+    :param format: формат - webp, avif, jpeg
+    :return: закодированное фото
+    """
+    with Image.open(path) as image:
+        source_width, source_height = image.size
+    size = (width or source_width, height or source_height)
+
+    image = decode(Path(path), *size)
+    image.thumbnail(size, Image.LANCZOS, reducing_gap=3.0)
+    if format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, **SAVE_OPTIONS[format])
+    return buffer.getvalue()
+
+
+def is_supported(format: str) -> bool:
+    """
+    Умеет ли Pillow сохранять формат (AVIF - только с pillow-avif-plugin).
+    :param format: формат - webp, avif, jpeg
+    :return: bool
+    """
+    Image.init()
+    return SAVE_OPTIONS[format]["format"] in Image.SAVE
+
+
+def process_images(paths: Sequence[str], variants: Sequence[Variant], workers: int, threads: bool = False) -> List[dict]:
+    """
+    Обработка пачки фото в пуле процессов или потоков.
+    :param paths: пути к исходникам
+    :param variants: варианты
+    :param workers: количество исполнителей
+    :param threads: пул потоков вместо пула процессов
+    :return: манифесты обработки
+    """
+    if workers <= 1 or len(paths) <= 1:
+        return [process_image(path, variants) for path in paths]
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with pool(max_workers=min(workers, len(paths))) as executor:
+        return list(executor.map(process_image, paths, [variants] * len(paths)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Варианты фото гостиниц.")
+    parser.add_argument("paths", nargs="+", help="пути к исходникам")
+    parser.add_argument("--workers", type=int, default=cfg.IMAGE_WORKERS, help="количество процессов")
+    args = parser.parse_args()
+
+    variants = get_variants(cfg.IMAGE_SIZES, cfg.IMAGE_FORMATS)
+    begin = time.perf_counter()
+    manifests = process_images(args.paths, variants, args.workers)
+    duration = time.perf_counter() - begin
+
+    skipped = sum(manifest["skipped"] for manifest in manifests)
+    print(f"images:   {len(manifests)} (skipped: {skipped})")
+    print(f"variants: {len(variants)} per image")
+    print(f"duration: {duration:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+from typing import List, Optional, Sequence, Tuple
+
+from app.logger import logger
+from app.models.outbox import Outbox
+from app.storage.booking import BOOKING_CONFIRMATION_TASK
+from app.storage.database import async_session_maker
+from app.storage.outbox import OutboxDAO
+from app.tasks.engine import celery
+from config import cfg
+
+# задачи, сообщения которых отправляются в celery одной пакетной задачей: задача -> пакетная задача
+BATCH_TASKS = {
+    BOOKING_CONFIRMATION_TASK: "app.tasks.tasks.send_booking_confirmation_emails",
+}
+
+
+def group(messages: Sequence[Outbox]) -> List[Tuple[str, dict, List[int]]]:
+    """
+    Группировка сообщений в задачи celery: сообщения задач из BATCH_TASKS объединяются в одну пакетную задачу.
+    :param messages: сообщения
+    :return: [(имя задачи, аргументы задачи, id сообщений)]
+    """
+    calls, batches = [], {}
+    for message in messages:
+        batch_task = BATCH_TASKS.get(message.task)
+        if batch_task is None:
+            calls.append((message.task, message.payload, [message.id]))
+        elif batch_task not in batches:
+            batches[batch_task] = (batch_task, {"messages": [message.payload]}, [message.id])
+            calls.append(batches[batch_task])
+        else:
+            batches[batch_task][1]["messages"].append(message.payload)
+            batches[batch_task][2].append(message.id)
+    return calls
+
+
+def publish(messages: Sequence[Outbox]) -> Tuple[List[int], List[int]]:
+    """
+    Отправка пачки сообщений в брокер celery через одно соединение.
+    Блокирующий вызов kombu - выполняется в потоке.
+    После первой ошибки остальные задачи пачки не отправляются: брокер, скорее всего, недоступен.
+    :param messages: сообщения
+    :return: (id отправленных, id сообщений задачи с ошибкой)
+    """
+    delivered = []
+    with celery.producer_or_acquire() as producer:
+        for task, kwargs, ids in group(messages):
+            try:
+                celery.send_task(task, kwargs=kwargs, producer=producer)
+            except Exception as err:
+                logger.error("Outbox publish failed", extra={"ids": ids, "error": str(err)})
+                return delivered, ids
+            delivered.extend(ids)
+    return delivered, []
+
+
+class OutboxDispatcher:
+    """
+    Фоновая отправка outbox в celery: пачка неотправленных сообщений блокируется (FOR UPDATE SKIP LOCKED),
+    отправляется в брокер и отмечается отправленной в той же транзакции.
+    Доставка "хотя бы один раз": при падении между отправкой и commit пачка будет отправлена повторно.
+    Диспетчер запускается в каждом воркере сервиса, воркеры разбирают разные пачки.
+    """
+
+    def __init__(self, batch_size: int, interval: float):
+        """
+        :param batch_size: размер пачки
+        :param interval: интервал опроса таблицы в секундах, если новых сообщений нет
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        # создается в start() на работающем цикле: диспетчер создается при импорте, до запуска цикла сервера
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """
+        Запуск фоновой задачи отправки.
+        """
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Остановка фоновой задачи отправки.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        """
+        Отправка без ожидания интервала опроса (после записи сообщения в outbox).
+        Без запущенного диспетчера сообщение отправится после запуска.
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    async def dispatch(self) -> int:
+        """
+        Отправка одной пачки.
+        :return: количество отправленных сообщений
+        """
+        async with async_session_maker() as session:
+            messages = await OutboxDAO.claim(session, self.batch_size)
+            if not messages:
+                return 0
+            delivered, failed = await asyncio.to_thread(publish, messages)
+            await OutboxDAO.complete(session, delivered, failed)
+        return len(delivered)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                sent = await self.dispatch()
+            except Exception as err:
+                logger.error("Outbox dispatch failed", extra={"error": str(err)})
+                sent = 0
+            # полная пачка - в таблице, вероятно, есть еще сообщения
+            if sent == self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            except Exception as err:
+                # ошибка ожидания не должна останавливать отправку
+                logger.error("Outbox wait failed", extra={"error": str(err)})
+                await asyncio.sleep(self.interval)
+            self._wake.clear()
+
+
+# отправка outbox в celery, запускается при старте сервиса
+outbox_dispatcher = OutboxDispatcher(batch_size=cfg.OUTBOX_BATCH_SIZE, interval=cfg.OUTBOX_INTERVAL)
@@ -0,0 +1,212 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from queue import Empty, LifoQueue
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from app.logger import logger
+from config import cfg
+
+# метрики отправки почты, публикуются воркером celery (app/tasks/engine.py)
+SMTP_MESSAGES = Counter("smtp_messages_total", "Отправленные письма", ["status"])
+SMTP_SEND_SECONDS = Histogram("smtp_send_seconds", "Время отправки одного письма, секунды")
+SMTP_BATCH_SECONDS = Histogram("smtp_batch_seconds", "Время отправки пачки писем, секунды")
+SMTP_CONNECTIONS = Counter("smtp_connections_total", "Открытые SMTP-соединения (в том числе переподключения)")
+
+
+def is_transient(err: Exception) -> bool:
+    """
+    Временная ошибка отправки: разрыв соединения или ответ сервера 4xx (например, 421 - сервер закрывает соединение).
+    Письмо с такой ошибкой отправляется повторно, с остальными - отклоняется.
+    :param err: ошибка smtplib или сокета
+    :return: bool
+    """
+    if isinstance(err, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in err.recipients.values())
+    if isinstance(err, smtplib.SMTPResponseException):
+        return 400 <= err.smtp_code < 500
+    return isinstance(err, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class PooledConnection:
+    """
+    SMTP-соединение пула со счетчиком отправленных через него писем.
+    """
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+
+    def close(self) -> None:
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPPool:
+    """
+    Пул постоянных SMTP-соединений процесса: TLS-рукопожатие и логин выполняются один раз на соединение,
+    а не на каждое письмо. Соединение открывается при первой отправке (после fork воркера celery)
+    и переоткрывается после max_messages писем или при разрыве.
+    Потокобезопасен: не больше size соединений, остальные потоки ждут свободное.
+    """
+
+    def __init__(
+            self,
+            host: Optional[str],
+            port: Optional[int],
+            user: Optional[str] = None,
+            password: Optional[str] = None,
+            use_ssl: bool = True,
+            size: int = 2,
+            max_messages: int = 100,
+            timeout: float = 10.0,
+    ):
+        """
+        :param host: хост SMTP
+        :param port: порт SMTP
+        :param user: логин, None - без авторизации
+        :param password: пароль
+        :param use_ssl: SMTP поверх TLS
+        :param size: максимальное количество соединений
+        :param max_messages: писем на одно соединение до переподключения
+        :param timeout: таймаут операций с сокетом, секунды
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.max_messages = max_messages
+        self.timeout = timeout
+        # последнее возвращенное соединение выдается первым - реже простаивает и рвется по таймауту сервера
+        self._idle: LifoQueue = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> PooledConnection:
+        """
+        Открытие нового соединения.
+        :return: соединение
+        """
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.user and self.password:
+                smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        SMTP_CONNECTIONS.inc()
+        return PooledConnection(smtp)
+
+    @contextmanager
+    def connection(self, fresh: bool = False) -> Iterator[PooledConnection]:
+        """
+        Соединение из пула на время отправки. При ошибке соединение закрывается и в пул не возвращается.
+        :param fresh: открыть новое соединение, даже если в пуле есть свободное
+        :return: соединение
+        """
+        self._slots.acquire()
+        try:
+            try:
+                if fresh:
+                    raise Empty
+                conn = self._idle.get_nowait()
+            except Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            if conn.sent >= self.max_messages:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def send(self, messages: Sequence[EmailMessage]) -> Tuple[List[EmailMessage], List[EmailMessage]]:
+        """
+        Отправка писем через соединения пула. При разрыве соединения или временной ошибке сервера (4xx)
+        письмо отправляется повторно через новое соединение; постоянный отказ (5xx) - ошибка только этого письма.
+        :param messages: письма
+        :return: (неотправленные письма - можно отправить повторно позже, письма, отклоненные сервером)
+        """
+        begin = time.perf_counter()
+        pending, rejected = list(messages), []
+        try:
+            while pending:
+                # соединение из пула могло быть закрыто сервером по простою - повтор через новое соединение.
+                # Ошибка и на новом соединении - сервер недоступен, остаток пачки - на повтор позже
+                if not self._send_batch(pending, rejected) and not self._send_batch(pending, rejected, fresh=True):
+                    break
+        except (smtplib.SMTPException, OSError) as err:
+            # сервер недоступен (соединение не открылось или не прошла авторизация)
+            logger.error("SMTP connection failed", extra={"host": self.host, "error": str(err)})
+        finally:
+            SMTP_BATCH_SECONDS.observe(time.perf_counter() - begin)
+
+        SMTP_MESSAGES.labels("retry").inc(len(pending))
+        return pending, rejected
+
+    def _send_batch(self, pending: List[EmailMessage], rejected: List[EmailMessage], fresh: bool = False) -> bool:
+        """
+        Отправка писем через одно соединение до первой ошибки соединения.
+        Отправленные и отклоненные письма удаляются из pending.
+        :param pending: неотправленные письма
+        :param rejected: отклоненные сервером письма
+        :param fresh: отправка через новое соединение
+        :return: False - ошибка соединения до отправки хотя бы одного письма
+        """
+        progressed = False
+        with self.connection(fresh) as conn:
+            while pending and conn.sent < self.max_messages:
+                message = pending[0]
+                begin = time.perf_counter()
+                try:
+                    conn.smtp.send_message(message)
+                except (smtplib.SMTPException, OSError) as err:
+                    if is_transient(err):
+                        logger.warning("SMTP send failed, reconnecting", extra={"host": self.host, "error": str(err)})
+                        # соединение закрывается при возврате в пул
+                        conn.sent = self.max_messages
+                        return progressed
+                    logger.error("SMTP message rejected", extra={"to": message["To"], "error": str(err)})
+                    SMTP_MESSAGES.labels("rejected").inc()
+                    rejected.append(message)
+                else:
+                    SMTP_SEND_SECONDS.observe(time.perf_counter() - begin)
+                    SMTP_MESSAGES.labels("sent").inc()
+                conn.sent += 1
+                pending.pop(0)
+                progressed = True
+        return progressed
+
+    def close(self) -> None:
+        """
+        Закрытие свободных соединений (при остановке процесса воркера).
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+
+# пул SMTP-соединений процесса воркера celery
+smtp_pool = SMTPPool(
+    host=cfg.SMTP_HOST,
+    port=cfg.SMTP_PORT,
+    user=cfg.SMTP_GMAIL,
+    password=cfg.SMTP_PASSWORD,
+    use_ssl=cfg.SMTP_SSL,
+    size=cfg.SMTP_POOL_SIZE,
+    max_messages=cfg.SMTP_MAX_MESSAGES,
+    timeout=cfg.SMTP_TIMEOUT,
+)
@@ -1,35 +1,78 @@
-import smtplib
-from pathlib import Path
+import os
+from typing import List
 
-from PIL import Image
+from celery.signals import worker_init, worker_process_shutdown
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    multiprocess,
+    start_http_server,
+)
 from pydantic import EmailStr
 
+from app.logger import logger
 from app.tasks.email_templates import create_booking_confirmation_template
 from app.tasks.engine import celery
+from app.tasks.images import get_variants, process_image, process_images
+from app.tasks.smtp import smtp_pool
 from config import cfg
 
+# повтор отправки писем при недоступности SMTP: попыток и пауза между ними в секундах
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_COUNTDOWN = 30
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """
+    Публикация метрик воркера celery для prometheus на CELERY_METRICS_PORT.
+    Метрики пишут дочерние процессы воркера, поэтому при prefork задается PROMETHEUS_MULTIPROC_DIR
+    и метрики процессов собираются из общей папки.
+    """
+    if cfg.CELERY_METRICS_PORT is None:
+        return
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(cfg.CELERY_METRICS_PORT, registry=registry)
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(**kwargs):
+    """
+    Закрытие SMTP-соединений процесса воркера при остановке.
+    """
+    smtp_pool.close()
+
 
 @celery.task
 def picture_compression(path: str):
     """
-    Фоновая задача сжатия картинок.
+    Фоновая задача сжатия картинок: варианты IMAGE_SIZES x IMAGE_FORMATS с сохранением пропорций.
     :param path: путь к файлу
     """
-    # конвертация строки в объект Path
-    image_path = Path(path)
-    image = Image.open(image_path)
-    for width, height in [
-        (1000, 500),
-        (200, 100)
-    ]:
-        resized_img = image.resize(size=(width, height))
-        resized_img.save(f"app/frontend/static/images/hotels/resized/{width}_{height}_{image_path.name}")
+    variants = get_variants(cfg.IMAGE_SIZES, cfg.IMAGE_FORMATS)
+    manifest = process_image(path, variants)
+    logger.info("Image processed", extra=manifest)
 
 
 @celery.task
-def send_booking_confirmation_email(booking: dict, email_to: EmailStr, room_name, hotel_name):
+def pictures_compression(paths: List[str]):
+    """
+    Фоновая задача сжатия пачки картинок в пуле из IMAGE_WORKERS потоков.
+    :param paths: пути к файлам
+    """
+    variants = get_variants(cfg.IMAGE_SIZES, cfg.IMAGE_FORMATS)
+    for manifest in process_images(paths, variants, cfg.IMAGE_WORKERS, threads=True):
+        logger.info("Image processed", extra=manifest)
+
+
+@celery.task(bind=True, max_retries=EMAIL_MAX_RETRIES, default_retry_delay=EMAIL_RETRY_COUNTDOWN)
+def send_booking_confirmation_email(self, booking: dict, email_to: EmailStr, room_name, hotel_name):
     """
     Фоновая задача отправки подтверждения бронирования номера на почту пользователя.
+    Письмо отправляется через постоянное соединение пула, при недоступности SMTP - повтор задачи.
     :param hotel_name: название гостиницы
     :param room_name: название номера
     :param booking: словарь из БД
@@ -37,6 +80,26 @@ def send_booking_confirmation_email(booking: dict, email_to: EmailStr, room_name
     """
     msg_content = create_booking_confirmation_template(booking, email_to, room_name, hotel_name)
 
-    with smtplib.SMTP_SSL(cfg.SMTP_HOST, cfg.SMTP_PORT) as server:
-        server.login(cfg.SMTP_GMAIL, cfg.SMTP_PASSWORD)
-        server.send_message(msg_content)
+    pending, _ = smtp_pool.send([msg_content])
+    if pending:
+        raise self.retry()
+
+
+@celery.task(bind=True, max_retries=EMAIL_MAX_RETRIES, default_retry_delay=EMAIL_RETRY_COUNTDOWN)
+def send_booking_confirmation_emails(self, messages: List[dict]):
+    """
+    Фоновая задача отправки пачки подтверждений бронирования через постоянные соединения пула.
+    При недоступности SMTP повторяется задача только с неотправленными письмами.
+    :param messages: аргументы send_booking_confirmation_email для каждого письма
+    """
+    emails = [create_booking_confirmation_template(**message) for message in messages]
+
+    pending, rejected = smtp_pool.send(emails)
+    if rejected:
+        logger.error("Booking confirmations rejected", extra={"count": len(rejected)})
+    if pending:
+        # письмо -> аргументы: неотправленные письма - подмножество emails
+        pending_ids = {id(email) for email in pending}
+        raise self.retry(kwargs={"messages": [
+            message for message, email in zip(messages, emails) if id(email) in pending_ids
+        ]})
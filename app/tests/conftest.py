@@ -4,13 +4,24 @@ from datetime import datetime
 
 import pytest
 from httpx import AsyncClient
-from sqlalchemy import insert
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import insert, text
+from sqlalchemy.exc import SQLAlchemyError
 
+from app.auth.revocation import token_versions
 from app.models.booking import Booking
 from app.models.hotel import Hotel
 from app.models.room import Room
 from app.models.user import User
-from app.storage.database import Base, async_session_maker, engine
+from app.storage.booking import BookingDAO
+from app.storage.database import (
+    Base,
+    async_session_maker,
+    engine,
+    read_router,
+    replica_engine,
+)
 from config import cfg
 from main import app as fastapi_app
 
@@ -25,6 +36,10 @@ async def prepare_database():
     assert cfg.MODE == "TEST"
 
     async with engine.begin() as conn:
+        # расширение для GiST индекса по (room_id, stay) в bookings
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+        # расширение для триграммных индексов поиска гостиниц
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         # Удаление всех таблиц из БД
         await conn.run_sync(Base.metadata.drop_all)
         # Добавление всех таблиц в БД
@@ -51,8 +66,34 @@ async def prepare_database():
             query = insert(Model).values(values)
             await session.execute(query)
 
+        # учет занятости номеров по дням для загруженных бронирований
+        await BookingDAO.rebuild_inventory(session)
         await session.commit()
 
+    await wait_replica()
+
+
+async def wait_replica(timeout: float = 5.0) -> None:
+    """
+    Ожидание, пока тестовая потоковая реплика применит все записи основной БД: тесты читают данные фикстуры
+    через реплику. Реплика на той же БД (не в режиме восстановления) или недоступная реплика не ожидается.
+    :param timeout: максимальное время ожидания в секундах
+    """
+    if replica_engine is None:
+        return
+    async with engine.connect() as conn:
+        lsn = (await conn.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+    query = text("SELECT coalesce(pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), true)")
+    deadline = asyncio.get_running_loop().time() + timeout
+    try:
+        async with replica_engine.connect() as conn:
+            while not (await conn.execute(query, {"lsn": lsn})).scalar():
+                if asyncio.get_running_loop().time() > deadline:
+                    return
+                await asyncio.sleep(0.01)
+    except (SQLAlchemyError, OSError):
+        return
+
 
 @pytest.fixture(scope="function")
 async def async_client():
@@ -103,6 +144,58 @@ async def session():
         yield session
 
 
+@pytest.fixture(scope="function")
+async def redis_client():
+    """
+    Клиент тестового redis (cfg.redis_url_test), БД очищается до и после теста. Без redis тест пропускается.
+    """
+    redis = aioredis.from_url(cfg.redis_url_test, encoding="utf8", decode_responses=True)
+    try:
+        await redis.flushdb()
+    except (RedisError, OSError):
+        await redis.close()
+        pytest.skip("redis is unavailable")
+
+    yield redis
+    await redis.flushdb()
+    await redis.close()
+
+
+@pytest.fixture(scope="function")
+async def redis_token_versions(redis_client):
+    """
+    Версии JWT-токенов в тестовом redis.
+    """
+    token_versions.init(redis_client)
+    yield token_versions
+    token_versions.redis = None
+
+
+@pytest.fixture(scope="function")
+async def replica_lag():
+    """
+    Отставание тестовой реплики: применение WAL на реплике приостанавливается на время теста.
+    Без потоковой реплики (make pytest_replica_up) тест пропускается.
+    """
+    try:
+        async with replica_engine.connect() as conn:
+            in_recovery = (await conn.execute(text("SELECT pg_is_in_recovery()"))).scalar()
+    except (SQLAlchemyError, OSError):
+        pytest.skip("DB replica is unavailable")
+    if not in_recovery:
+        pytest.skip("DB replica is not a streaming replica")
+
+    async with replica_engine.connect() as conn:
+        await conn.execute(text("SELECT pg_wal_replay_pause()"))
+    # реплика могла быть исключена из чтения ошибкой подключения в предыдущих тестах
+    read_router.down_until = 0.0
+    try:
+        yield
+    finally:
+        async with replica_engine.connect() as conn:
+            await conn.execute(text("SELECT pg_wal_replay_resume()"))
+
+
 @pytest.fixture(scope="session")
 def event_loop(request):
     """
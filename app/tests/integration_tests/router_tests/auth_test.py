@@ -1,5 +1,10 @@
 import pytest
 from httpx import AsyncClient
+from passlib.context import CryptContext
+
+from app.auth import auth
+from app.storage.user import UserDAO
+from config import cfg
 
 
 @pytest.mark.parametrize(
@@ -56,3 +61,68 @@ async def test_current_login_user(auth_async_client: AsyncClient):
     resp = await auth_async_client.get("/auth/me")
     assert resp.status_code == 200
     assert resp.json().get("email") == "ruauka@test.com"
+
+
+async def test_current_login_user_stateless(async_client: AsyncClient, monkeypatch):
+    """Тест авторизации в режиме AUTH_STATELESS без redis - пользователь берется из БД"""
+    monkeypatch.setattr(cfg, "AUTH_STATELESS", True)
+    await async_client.post("/auth/login", json={
+        "email": "admin@test.com",
+        "password": "test",
+    })
+
+    resp = await async_client.get("/auth/me")
+    assert resp.status_code == 200
+    assert resp.json().get("email") == "admin@test.com"
+    assert resp.json().get("admin") is True
+
+
+async def test_logout_revokes_stateless_token(async_client: AsyncClient, monkeypatch):
+    """Тест отзыва токена логаутом в режиме AUTH_STATELESS без redis - версия токена сверяется с БД"""
+    monkeypatch.setattr(cfg, "AUTH_STATELESS", True)
+    resp = await async_client.post("/auth/login", json={"email": "admin@test.com", "password": "test"})
+    token = resp.json()["JWT"]
+
+    await async_client.post("/auth/logout")
+    resp = await async_client.get("/auth/me", cookies={"JWT": token})
+    assert resp.status_code == 401
+    assert resp.json()["detail"] == "JWT token revoked"
+
+
+async def test_revoked_token_with_redis(async_client: AsyncClient, session, redis_token_versions, monkeypatch):
+    """Тест отзыва токена в режиме AUTH_STATELESS с redis, в том числе после потери ключа версии в redis"""
+    monkeypatch.setattr(cfg, "AUTH_STATELESS", True)
+    resp = await async_client.post("/auth/login", json={"email": "admin@test.com", "password": "test"})
+    token = resp.json()["JWT"]
+    user = await UserDAO.get_one(session, email="admin@test.com")
+    version = user.token_version
+
+    resp = await async_client.get("/auth/me", cookies={"JWT": token})
+    assert resp.status_code == 200
+    assert await redis_token_versions.get(user.id) == version
+
+    await UserDAO.revoke_tokens(session, user.id)
+    resp = await async_client.get("/auth/me", cookies={"JWT": token})
+    assert resp.status_code == 401
+
+    # ключ вытеснен или redis очищен: отозванный токен не становится снова валидным
+    await redis_token_versions.redis.flushdb()
+    resp = await async_client.get("/auth/me", cookies={"JWT": token})
+    assert resp.status_code == 401
+    assert await redis_token_versions.get(user.id) == version + 1
+
+
+async def test_login_user_rehash(async_client: AsyncClient, session, monkeypatch):
+    """Тест перехэширования пароля при логине после изменения стоимости bcrypt"""
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(
+        schemes=["bcrypt"], bcrypt__default_rounds=4, bcrypt__min_rounds=4, bcrypt__max_rounds=4,
+    ))
+    resp = await async_client.post("/auth/login", json={
+        "email": "ruauka@test.com",
+        "password": "test",
+    })
+    assert resp.status_code == 200
+
+    user = await UserDAO.get_one(session, email="ruauka@test.com")
+    assert user.hashed_password.startswith("$2b$04$")
+    assert auth.pwd_context.verify("test", user.hashed_password)
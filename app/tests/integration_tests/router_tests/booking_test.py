@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.storage.database import READ_YOUR_WRITES_COOKIE
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+async def test_export_bookings(admin_async_client: AsyncClient, format):
+    """Тест потоковой выгрузки всех бронирований"""
+    resp = await admin_async_client.get("/bookings/export", params={"format": format})
+    assert resp.status_code == 200
+
+    if format == "csv":
+        bookings = list(csv.DictReader(io.StringIO(resp.text)))
+    else:
+        bookings = [json.loads(line) for line in resp.text.splitlines()]
+
+    assert [int(booking["id"]) for booking in bookings] == [1, 2, 3]
+    assert int(bookings[0]["total_days"]) > 0
+
+
+async def test_export_bookings_not_admin(auth_async_client: AsyncClient):
+    """Тест выгрузки бронирований без роли админа"""
+    resp = await auth_async_client.get("/bookings/export")
+    assert resp.status_code == 401
+
+
+async def test_server_timing(auth_async_client: AsyncClient):
+    """Тест времени этапов запроса в заголовке Server-Timing"""
+    resp = await auth_async_client.get("/bookings")
+    assert resp.status_code == 200
+
+    stages = {metric.split(";")[0] for metric in resp.headers["server-timing"].split(", ")}
+    assert {"auth", "db", "serialize", "total"} <= stages
+
+
+async def test_add_booking_read_your_writes(auth_async_client: AsyncClient):
+    """Тест чтения своих записей: после бронирования чтение пользователя идет в основную БД"""
+    resp = await auth_async_client.post("/bookings", params={
+        "room_id": 1,
+        "date_from": "2030-05-01",
+        "date_to": "2030-05-05",
+    })
+    assert resp.status_code == 201
+    assert auth_async_client.cookies[READ_YOUR_WRITES_COOKIE]
+
+    resp = await auth_async_client.get("/bookings")
+    assert resp.status_code == 200
+    assert any(booking["date_from"] == "2030-05-01" for booking in resp.json()["items"])
+
+
+async def test_read_your_writes_replica_lag(auth_async_client: AsyncClient, replica_lag):
+    """Тест чтения своих записей при отстающей реплике: с кукой read_primary бронирование видно, без нее - еще нет"""
+    resp = await auth_async_client.post("/bookings", params={
+        "room_id": 1,
+        "date_from": "2030-06-01",
+        "date_to": "2030-06-05",
+    })
+    assert resp.status_code == 201
+
+    resp = await auth_async_client.get("/bookings")
+    assert resp.status_code == 200
+    assert any(booking["date_from"] == "2030-06-01" for booking in resp.json()["items"])
+
+    # без куки чтение идет на реплику, которая еще не применила бронирование
+    auth_async_client.cookies.delete(READ_YOUR_WRITES_COOKIE)
+    resp = await auth_async_client.get("/bookings")
+    assert resp.status_code == 200
+    assert not any(booking["date_from"] == "2030-06-01" for booking in resp.json()["items"])
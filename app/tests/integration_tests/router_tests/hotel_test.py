@@ -1,5 +1,8 @@
 import pytest
 from httpx import AsyncClient
+from prometheus_client import REGISTRY
+
+from main import app as fastapi_app
 
 
 @pytest.mark.parametrize(
@@ -47,6 +50,28 @@ async def test_get_all_hotels(async_client: AsyncClient):
     """Тест получения всех гостиниц"""
     resp = await async_client.get("/hotels")
     assert resp.status_code == 200
+    assert resp.json()["next_cursor"] is None
+
+
+async def test_get_all_hotels_pagination(async_client: AsyncClient):
+    """Тест постраничного получения всех гостиниц"""
+    hotels = (await async_client.get("/hotels")).json()["items"]
+
+    ids, params = [], {"limit": 2}
+    while True:
+        resp = await async_client.get("/hotels", params=params)
+        assert resp.status_code == 200
+        page = resp.json()
+        assert len(page["items"]) <= 2
+        ids.extend(hotel["id"] for hotel in page["items"])
+        if page["next_cursor"] is None:
+            break
+        params["after"] = page["next_cursor"]
+
+    assert ids == [hotel["id"] for hotel in hotels]
+
+    resp = await async_client.get("/hotels", params={"after": "incorrect"})
+    assert resp.status_code == 400
 
 
 @pytest.mark.parametrize(
@@ -91,3 +116,42 @@ async def test_delete_hotel_by_id(admin_async_client: AsyncClient, hotel_id, sta
     """Тест удаления гостиницы по id"""
     resp = await admin_async_client.delete(f"/hotels/{hotel_id}")
     assert resp.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "location, date_from, date_to, status_code",
+    [
+        ("Алтай", "2023-05-01", "2023-05-15", 200),
+        ("Москва", "2023-05-01", "2023-05-15", 400),
+        ("Алтай", "2023-05-15", "2023-05-01", 400),
+    ]
+)
+async def test_get_hotels_by_location(async_client: AsyncClient, location, date_from, date_to, status_code):
+    """Тест получения гостиниц со свободными номерами по локации"""
+    resp = await async_client.get("/hotels/location", params={
+        "location": location,
+        "date_from": date_from,
+        "date_to": date_to,
+    })
+    assert resp.status_code == status_code
+
+
+async def test_session_released_before_response():
+    """Тест возврата соединения с БД в пул до отправки ответа"""
+    checked_out = REGISTRY.get_sample_value("db_pool_checked_out", {"engine": "primary"})
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append((message["type"], REGISTRY.get_sample_value("db_pool_checked_out", {"engine": "primary"})))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/hotels/1", "raw_path": b"/hotels/1", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"test")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    await fastapi_app(scope, receive, send)
+
+    assert messages[0] == ("http.response.start", checked_out)
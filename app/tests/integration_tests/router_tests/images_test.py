@@ -0,0 +1,27 @@
+import io
+
+from httpx import AsyncClient
+from PIL import Image
+
+from app.router import images
+from app.storage.images import ImageCache
+
+
+async def test_get_hotel_image(async_client: AsyncClient, tmp_path, monkeypatch):
+    """Тест варианта фото гостиницы по запросу: размер с сохранением пропорций, кэш, ETag"""
+    monkeypatch.setattr(images, "image_cache", ImageCache(root=str(tmp_path), max_size=1024 * 1024))
+
+    resp = await async_client.get("/images/hotels/1", params={"w": 100, "fmt": "jpeg"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/jpeg"
+    with Image.open(io.BytesIO(resp.content)) as image:
+        with Image.open("app/frontend/static/images/hotels/1.webp") as source:
+            assert image.size == (100, round(100 * source.height / source.width))
+    assert len(list(tmp_path.glob("*/*"))) == 1
+
+    etag = resp.headers["etag"]
+    resp = await async_client.get("/images/hotels/1", params={"w": 100, "fmt": "jpeg"}, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    resp = await async_client.get("/images/hotels/100")
+    assert resp.status_code == 404
@@ -0,0 +1,43 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.parametrize(
+    "table, content, rows, status_code",
+    [
+        ("hotels", "id,name,location,services,rooms_quantity\n"
+                   "100,CSV Hotel,\"Москва, Тверская улица, 1\",\"{Wi-Fi,Парковка}\",10\n"
+                   "101,CSV Hotel 2,Москва,{},5\n", 2, 200),
+        ("rooms", "hotel_id,name,price,quantity\n1,CSV Room,1000,2\n", 1, 200),
+        ("bookings", "room_id,user_id,date_from,date_to,price\n1,1,2030-01-01,2030-01-05,24500\n", 1, 200),
+        ("hotels", "name,location,unknown\nCSV Hotel,Москва,1\n", None, 400),
+        ("hotels", "name,location,rooms_quantity\nCSV Hotel,Москва,many\n", None, 400),
+        ("users", "email,hashed_password\ncsv@test.com,hash\n", None, 422),
+    ]
+)
+async def test_upload_from_csv_file(admin_async_client: AsyncClient, table, content, rows, status_code):
+    """Тест загрузки CSV-файла в таблицу"""
+    resp = await admin_async_client.post(
+        f"/upload/csv/{table}", files={"file": ("data.csv", content.encode("utf-8"), "text/csv")},
+    )
+
+    assert resp.status_code == status_code
+    if rows is not None:
+        assert resp.json()["rows"] == rows
+
+
+async def test_upload_from_csv_file_sequence(admin_async_client: AsyncClient):
+    """Тест добавления гостиницы после загрузки CSV-файла с id"""
+    content = "id,name,location,rooms_quantity\n100,CSV Hotel,Москва,10\n"
+    resp = await admin_async_client.post(
+        "/upload/csv/hotels", files={"file": ("data.csv", content.encode("utf-8"), "text/csv")},
+    )
+    assert resp.status_code == 200
+
+    resp = await admin_async_client.post("/hotels", json={
+        "name": "test_name1",
+        "location": "test_location1",
+        "rooms_quantity": 10,
+    })
+    assert resp.status_code == 201
+    assert resp.json()["id"] == "101"
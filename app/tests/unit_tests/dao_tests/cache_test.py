@@ -0,0 +1,71 @@
+import json
+from datetime import date
+
+from app.storage.cache import AvailabilityCache
+
+DATE_FROM, DATE_TO = date(2030, 1, 1), date(2030, 1, 8)
+
+
+async def test_invalidate_other_tags_keeps_load(redis_client):
+    """ Тест записи загрузки при инвалидации гостиницы другой локации во время загрузки """
+    cache = AvailabilityCache(prefix="test-availability", expire=60, stale=10)
+    cache.init(redis_client)
+
+    async def load_altai():
+        # бронирование в гостинице другой локации, пока идет загрузка
+        await cache.invalidate_hotels([4], DATE_FROM, DATE_TO)
+        return [{"id": 1}], [1, 2]
+
+    assert await cache.get_or_load("Алтай", DATE_FROM, DATE_TO, load_altai) == [{"id": 1}]
+    assert await redis_client.exists(cache.key("Алтай", DATE_FROM, DATE_TO))
+
+
+async def test_invalidate_own_tag_drops_load(redis_client):
+    """ Тест отмены записи загрузки при инвалидации гостиницы ключа во время загрузки """
+    cache = AvailabilityCache(prefix="test-availability", expire=60, stale=10)
+    cache.init(redis_client)
+
+    async def load_altai():
+        # бронирование в гостинице из выдачи, пока идет загрузка: загруженное значение могло устареть
+        await cache.invalidate_hotels([2], DATE_FROM, DATE_TO)
+        return [{"id": 1}], [1, 2]
+
+    assert await cache.get_or_load("Алтай", DATE_FROM, DATE_TO, load_altai) == [{"id": 1}]
+    assert not await redis_client.exists(cache.key("Алтай", DATE_FROM, DATE_TO))
+
+    async def load_all():
+        await cache.invalidate_all()
+        return [{"id": 1}], [1, 2]
+
+    await cache.get_or_load("Алтай", DATE_FROM, DATE_TO, load_all)
+    assert not await redis_client.exists(cache.key("Алтай", DATE_FROM, DATE_TO))
+
+
+async def test_stale_refresh_with_other_invalidation(redis_client):
+    """ Тест фонового обновления устаревшего значения при инвалидации гостиницы другой локации """
+    cache = AvailabilityCache(prefix="test-availability", expire=60, stale=10)
+    cache.init(redis_client)
+    key = cache.key("Алтай", DATE_FROM, DATE_TO)
+
+    async def load_old():
+        return [{"id": 1}], [1, 2]
+
+    await cache.get_or_load("Алтай", DATE_FROM, DATE_TO, load_old)
+    # свежесть значения истекла
+    await redis_client.set(key, json.dumps({"hotels": [{"id": 1}], "fresh_until": 0}))
+
+    async def load_new():
+        await cache.invalidate_hotels([4], DATE_FROM, DATE_TO)
+        return [{"id": 2}], [1, 2]
+
+    # устаревшее значение отдается сразу, обновление - в фоне
+    assert await cache.get_or_load("Алтай", DATE_FROM, DATE_TO, load_new) == [{"id": 1}]
+    await cache._loads[key]
+    assert json.loads(await redis_client.get(key))["hotels"] == [{"id": 2}]
+
+
+def test_key_location_as_queried():
+    """ Тест ключа кэша: локация в ключе - та же, с которой загрузка запрашивает БД """
+    cache = AvailabilityCache(prefix="test-availability", expire=60, stale=10)
+    assert cache.key("Алтай", DATE_FROM, DATE_TO) != cache.key("алтай", DATE_FROM, DATE_TO)
+    assert cache.key("Алтай", DATE_FROM, DATE_TO) != cache.key("Алтай ", DATE_FROM, DATE_TO)
@@ -0,0 +1,65 @@
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from app.storage import images
+from app.storage.images import ImageStore, hotel_image_path, unlink_hotel_images
+
+
+def make_upload(image_format: str, color: str = "red") -> UploadFile:
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 200), color).save(buffer, format=image_format)
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename="image")
+
+
+async def test_image_store_dedupe(tmp_path):
+    """ Тест контентно-адресуемого хранилища фото: одинаковые загрузки хранятся один раз """
+    store = ImageStore(root=str(tmp_path / "store"), url="/images/store", max_size=1024 * 1024, chunk_size=64)
+
+    image = await store.save(make_upload("PNG"))
+    assert not image["duplicate"]
+    assert image["path"].read_bytes()[:4] == b"\x89PNG"
+    assert store.blob_url(image["path"]) == f"/images/store/{image['sha256'][:2]}/{image['sha256']}.png"
+
+    duplicate = await store.save(make_upload("PNG"))
+    assert duplicate["duplicate"]
+    assert duplicate["path"] == image["path"]
+    assert list((tmp_path / "store" / "tmp").iterdir()) == []
+
+    name = tmp_path / "hotels" / "1.webp"
+    name.parent.mkdir()
+    await store.link(image["path"], name)
+    other = await store.save(make_upload("WEBP", "blue"))
+    await store.link(other["path"], name)
+    assert name.resolve() == other["path"].resolve()
+    assert name.read_bytes()[8:12] == b"WEBP"
+
+
+@pytest.mark.parametrize("max_size, content", [(100, None), (1024 * 1024, b"not an image")])
+async def test_image_store_rejects(tmp_path, max_size, content):
+    """ Тест отказа в загрузке: фото больше лимита или не фото """
+    store = ImageStore(root=str(tmp_path / "store"), url="/images/store", max_size=max_size, chunk_size=64)
+    upload = make_upload("JPEG") if content is None else UploadFile(file=io.BytesIO(content), filename="image")
+
+    with pytest.raises(HTTPException):
+        await store.save(upload)
+    assert list((tmp_path / "store" / "tmp").iterdir()) == []
+
+
+async def test_hotel_image_format(tmp_path, monkeypatch):
+    """ Тест имени фото гостиницы: расширение - формат загрузки, имя в прежнем формате удаляется """
+    monkeypatch.setattr(images, "HOTEL_IMAGES_DIR", tmp_path / "hotels")
+    (tmp_path / "hotels").mkdir()
+    store = ImageStore(root=str(tmp_path / "store"), url="/images/store", max_size=1024 * 1024, chunk_size=64)
+    assert hotel_image_path(1) is None
+
+    for image_format, ext in (("WEBP", "webp"), ("PNG", "png")):
+        image = await store.save(make_upload(image_format))
+        name = tmp_path / "hotels" / f"1{image['path'].suffix}"
+        await store.link(image["path"], name)
+        unlink_hotel_images(1, name)
+        assert hotel_image_path(1) == tmp_path / "hotels" / f"1.{ext}"
+    assert [path.name for path in (tmp_path / "hotels").iterdir()] == ["1.png"]
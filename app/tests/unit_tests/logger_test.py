@@ -0,0 +1,31 @@
+import logging
+import queue
+
+from app.logger import NonBlockingQueueHandler, SuccessSampler
+
+
+def make_record(level: int, msg: str) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, msg, None, None)
+
+
+def test_success_sampler(monkeypatch):
+    """Тест выборки логов успешных запросов: ошибки и прочие логи пишутся всегда"""
+    assert not SuccessSampler(0).filter(make_record(logging.INFO, "success"))
+    assert SuccessSampler(0).filter(make_record(logging.ERROR, "failed"))
+    assert SuccessSampler(0).filter(make_record(logging.INFO, "other"))
+
+    monkeypatch.setattr("app.logger.random.random", lambda: 0.3)
+    assert not SuccessSampler(0.25).filter(make_record(logging.INFO, "success"))
+    record = make_record(logging.INFO, "success")
+    assert SuccessSampler(0.5).filter(record)
+    assert record.sample_rate == 0.5
+    assert not hasattr(make_record(logging.INFO, "success"), "sample_rate")
+
+
+def test_queue_handler_overflow():
+    """Тест логирования при переполненной очереди: запись отбрасывается без ожидания"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record(logging.INFO, "first"))
+    handler.handle(make_record(logging.INFO, "second"))
+    assert handler.queue.get_nowait().msg == "first"
+    assert handler.queue.empty()
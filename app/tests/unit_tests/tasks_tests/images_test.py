@@ -0,0 +1,48 @@
+import multiprocessing
+
+from PIL import Image
+
+from app.tasks.images import Variant, process_image
+from app.tasks.tasks import pictures_compression
+
+
+def test_process_image(tmp_path):
+    """ Тест вариантов фото: пропорции сохраняются, неизмененный исходник не обрабатывается повторно """
+    source = tmp_path / "1.webp"
+    Image.new("RGB", (3000, 2000), "red").save(source, format="JPEG")
+    variants = [Variant(1000, 500, "webp"), Variant(1000, 500, "jpeg"), Variant(200, 100, "webp")]
+
+    manifest = process_image(str(source), variants)
+    assert not manifest["skipped"]
+    assert set(manifest["timings"]) == {"1000_500.webp", "1000_500.jpeg", "200_100.webp"}
+    with Image.open(tmp_path / "resized" / "1000_500_1.webp") as image:
+        assert image.size == (750, 500)
+    with Image.open(tmp_path / "resized" / "1000_500_1.jpeg") as image:
+        assert (image.format, image.size) == ("JPEG", (750, 500))
+    with Image.open(tmp_path / "resized" / "200_100_1.webp") as image:
+        assert image.size == (150, 100)
+
+    assert process_image(str(source), variants)["skipped"]
+
+    Image.new("RGB", (3000, 2000), "blue").save(source, format="JPEG")
+    assert not process_image(str(source), variants)["skipped"]
+
+
+def compress_in_daemon(paths):
+    """ Задача пачки фото в демоническом процессе, как в воркере celery """
+    pictures_compression(paths)
+
+
+def test_pictures_compression_daemon(tmp_path):
+    """ Тест задачи пачки фото: процесс воркера celery не может порождать дочерние процессы """
+    paths = []
+    for i in range(2):
+        source = tmp_path / f"{i}.webp"
+        Image.new("RGB", (400, 200), "red").save(source, format="JPEG")
+        paths.append(str(source))
+
+    worker = multiprocessing.get_context("fork").Process(target=compress_in_daemon, args=(paths,), daemon=True)
+    worker.start()
+    worker.join(60)
+    assert worker.exitcode == 0
+    assert (tmp_path / "resized" / "200_100_1.webp").exists()
@@ -0,0 +1,80 @@
+import socket
+from email.message import EmailMessage
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.tasks.smtp import SMTPPool
+
+
+class Handler:
+    """ Локальный SMTP: сохраняет полученные письма и адреса клиентов """
+
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("rejected"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.rcpt_tos)
+        self.peers.add(session.peer)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    controller = Controller(Handler(), hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+def make_messages(*emails):
+    messages = []
+    for email_to in emails:
+        message = EmailMessage()
+        message["To"], message["From"], message["Subject"] = email_to, "test@test.com", "test"
+        message.set_content("test")
+        messages.append(message)
+    return messages
+
+
+def test_smtp_pool_reuses_connection(smtp_server):
+    """ Тест отправки писем через одно постоянное соединение, с переподключением после разрыва """
+    pool = SMTPPool(smtp_server.hostname, smtp_server.port, use_ssl=False, size=1, max_messages=100)
+    handler = smtp_server.handler
+
+    pending, rejected = pool.send(make_messages(*[f"user_{i}@test.com" for i in range(5)]))
+    assert pending == rejected == []
+    assert len(handler.messages) == 5
+    assert len(handler.peers) == 1
+
+    # соединение в пуле закрыто (например, сервером по простою) - письмо отправляется через новое
+    pool._idle.queue[0].smtp.close()
+    pending, rejected = pool.send(make_messages("user@test.com", "rejected@test.com"))
+    assert pending == []
+    assert [message["To"] for message in rejected] == ["rejected@test.com"]
+    assert len(handler.messages) == 6
+    assert len(handler.peers) == 2
+    pool.close()
+
+
+def test_smtp_pool_server_unavailable():
+    """ Тест недоступного SMTP: все письма возвращаются на повтор """
+    pool = SMTPPool("127.0.0.1", free_port(), use_ssl=False)
+
+    messages = make_messages("user@test.com", "admin@test.com")
+    pending, rejected = pool.send(messages)
+    assert pending == messages
+    assert rejected == []
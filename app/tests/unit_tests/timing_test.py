@@ -0,0 +1,35 @@
+import time
+
+from fastapi import APIRouter, FastAPI
+from httpx import AsyncClient
+from pydantic import BaseModel, validator
+
+from app.timing import TimedRoute, TimingMiddleware
+
+
+class SlowResponse(BaseModel):
+    name: str
+
+    @validator("name")
+    def slow(cls, value):
+        time.sleep(0.05)
+        return value
+
+
+async def test_serialize_timing():
+    """ Тест этапа serialize: в него входит валидация ответа по response_model, а не только рендер JSON """
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/slow", response_model=SlowResponse)
+    async def slow():
+        return {"name": "slow"}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(TimingMiddleware)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        resp = await client.get("/slow")
+
+    timings = dict(metric.split(";dur=") for metric in resp.headers["server-timing"].split(", "))
+    assert float(timings["serialize"]) >= 50
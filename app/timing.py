@@ -0,0 +1,182 @@
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.logger import logger
+
+# время этапов текущего запроса в секундах: этап -> суммарное время.
+# Словарь создается middleware, этапы дописываются в него из любой задачи/потока запроса (контекст копируется)
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# время завершения хендлера эндпоинта текущего роута (список - виден и из потока синхронного хендлера)
+endpoint_finished: ContextVar[Optional[List[float]]] = ContextVar("endpoint_finished", default=None)
+
+# статусы ответов, которые логируются как ошибки
+FAILED_STATUS_CODES = {400, 401, 403, 422, 500}
+# запросы, которые не логируются
+NOT_LOGGED_PATHS = {"/metrics"}
+
+
+def add_timing(stage: str, duration: float) -> None:
+    """
+    Добавление времени этапа к текущему запросу (вне запроса - ничего не делает).
+    :param stage: этап - auth, db, serialize, template
+    :param duration: время в секундах
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + duration
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Замер этапа запроса: with timed("template"): ...
+    :param stage: этап
+    """
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(stage, time.perf_counter() - begin)
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """
+    Значение заголовка Server-Timing, время в мс.
+    :param timings: время этапов в секундах
+    :param total: время запроса в секундах
+    :return: "auth;dur=1.2, db;dur=3.4, total;dur=7.8"
+    """
+    metrics = [*timings.items(), ("total", total)]
+    return ", ".join(f"{stage};dur={duration * 1000:.1f}" for stage, duration in metrics)
+
+
+class TimedRoute(APIRoute):
+    """
+    Роут с замером этапа serialize: от завершения хендлера эндпоинта до готового ответа.
+    Обработчик роута FastAPI (APIRoute.get_route_handler) после хендлера валидирует результат по response_model,
+    приводит его jsonable_encoder и рендерит JSON в response_class - все это входит в этап.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, self.timed_endpoint(endpoint), **kwargs)
+
+    @staticmethod
+    def timed_endpoint(endpoint: Callable) -> Callable:
+        # сигнатура хендлера сохраняется functools.wraps, синхронный хендлер остается синхронным
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    finish_endpoint()
+
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                finish_endpoint()
+
+        return wrapper
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            finished: List[float] = []
+            token = endpoint_finished.set(finished)
+            try:
+                response = await handler(request)
+            finally:
+                endpoint_finished.reset(token)
+            if finished:
+                add_timing("serialize", time.perf_counter() - finished[-1])
+            return response
+
+        return route_handler
+
+
+def finish_endpoint() -> None:
+    """
+    Отметка завершения хендлера эндпоинта текущего роута (вне TimedRoute - ничего не делает).
+    """
+    finished = endpoint_finished.get()
+    if finished is not None:
+        finished.append(time.perf_counter())
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware времени запроса: время этапов (auth, db, serialize, template) и общее время
+    отдается в заголовке Server-Timing и пишется в лог запроса.
+    Этапы могут пересекаться: запрос к БД при авторизации входит и в auth, и в db.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        begin = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = request_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(timings, time.perf_counter() - begin))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            self.log(scope, status_code, timings, time.perf_counter() - begin)
+
+    @staticmethod
+    def log(scope: Scope, status_code: int, timings: Dict[str, float], duration: float) -> None:
+        """
+        Лог запроса.
+        :param scope: ASGI scope запроса
+        :param status_code: статус ответа
+        :param timings: время этапов в секундах
+        :param duration: время запроса в секундах (вместе с отправкой тела ответа)
+        """
+        if scope["path"] in NOT_LOGGED_PATHS:
+            return
+
+        route = scope.get("route")
+        extra = {
+            "func": getattr(route, "name", None),
+            "endpoint": scope["path"],
+            "method": scope["method"],
+            "status_code": status_code,
+            "duration": round(duration, 4),
+            **{f"{stage}_duration": round(value, 4) for stage, value in timings.items()},
+        }
+
+        # failed ответы
+        if status_code in FAILED_STATUS_CODES:
+            logger.error(msg="failed", extra=extra)
+            return
+
+        # success ответы
+        logger.info(msg="success", extra=extra)
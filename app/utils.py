@@ -4,7 +4,7 @@ from app.auth.auth import get_password_hash
 from app.schemas.user import UserUpdateRequest
 
 
-def set_user_new_fields(user, new_fields: UserUpdateRequest) -> dict[str, Any]:
+async def set_user_new_fields(user, new_fields: UserUpdateRequest) -> dict[str, Any]:
     """
     Установка новых значений полей пользователя. Функция только для модели пользователя.
     :param user: пользователь
@@ -18,7 +18,7 @@ def set_user_new_fields(user, new_fields: UserUpdateRequest) -> dict[str, Any]:
                 continue
         if key == "password":
             key = "hashed_password"
-            value = get_password_hash(value)
+            value = await get_password_hash(value)
         setattr(user, key, value)
 
     updated_fields = {
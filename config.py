@@ -1,4 +1,4 @@
-from typing import Literal, Optional
+from typing import List, Literal, Optional, Tuple
 
 from pydantic import BaseSettings
 
@@ -11,6 +11,10 @@ class Cfg(BaseSettings):
     MODE: Optional[Literal["DEV", "TEST", "PROD"]]
     # уровень логирования
     LOG_LEVEL: Optional[Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]]
+    # доля логов успешных запросов, которые пишутся в лог (ошибки пишутся всегда)
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+    # размер очереди логов, при переполнении логи отбрасываются
+    LOG_QUEUE_SIZE: int = 10000
 
     # конфиг БД
     DB_HOST: Optional[str]
@@ -45,6 +49,61 @@ class Cfg(BaseSettings):
                f"5432/" \
                f"test"
 
+    # реплика БД для чтения (пользователь, пароль и БД - как у основной), без DB_REPLICA_HOST чтение идет в основную БД
+    DB_REPLICA_HOST: Optional[str]
+    DB_REPLICA_PORT: Optional[int]
+    # тестовая потоковая реплика тестовой БД на localhost (make pytest_replica_up)
+    DB_REPLICA_TEST_PORT: int = 5433
+    # после ошибки подключения к реплике чтение идет в основную БД DB_REPLICA_RETRY секунд
+    DB_REPLICA_RETRY: float = 10.0
+    # чтение своих записей: после бронирования чтение пользователя идет в основную БД DB_READ_YOUR_WRITES секунд
+    DB_READ_YOUR_WRITES: int = 5
+
+    @property
+    def db_replica_url(self) -> Optional[str]:
+        """
+        Путь подключения к реплике PostgresSQL
+        :return: dsn или None - реплики нет
+        """
+        if not self.DB_REPLICA_HOST:
+            return None
+        return f"postgresql+asyncpg://" \
+               f"{self.POSTGRES_USER}:" \
+               f"{self.POSTGRES_PASSWORD}@" \
+               f"{self.DB_REPLICA_HOST}:" \
+               f"{self.DB_REPLICA_PORT or self.DB_PORT}/" \
+               f"{self.POSTGRES_DB}"
+
+    @property
+    def db_replica_url_test(self) -> str:
+        """
+        Путь подключения к тестовой реплике PostgresSQL для запуска unit-тестов.
+        :return: dsn
+        """
+        return f"postgresql+asyncpg://" \
+               f"test:" \
+               f"test@" \
+               f"localhost:" \
+               f"{self.DB_REPLICA_TEST_PORT}/" \
+               f"test"
+
+    # пул соединений с БД (на процесс): постоянные соединения, дополнительные сверх них, ожидание соединения
+    # в секундах, пересоздание соединений старше DB_POOL_RECYCLE секунд (-1 - не пересоздаются), проверка
+    # соединения перед выдачей, открытие DB_POOL_SIZE соединений при старте сервиса
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_PREWARM: bool = True
+    # кэш подготовленных запросов asyncpg на соединение (0 - выключен) и кэш скомпилированных запросов алхимии
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    SQL_COMPILED_CACHE_SIZE: int = 500
+
+    # лог медленных запросов к БД: порог в секундах и план запроса (EXPLAIN) в логе
+    SQL_SLOW_QUERY_THRESHOLD: float = 0.5
+    SQL_SLOW_QUERY_EXPLAIN: bool = False
+
     # секреты для JWT
     SECRET_KEY: str = "secretKey"
     ALGORITHM: str = "HS256"
@@ -57,6 +116,14 @@ class Cfg(BaseSettings):
     def sha_algorithm(self) -> str:
         return self.ALGORITHM
 
+    # авторизация без похода в БД: пользователь берется из claims JWT,
+    # отзыв токенов - по версии токенов пользователя в redis
+    AUTH_STATELESS: bool = False
+
+    # стоимость bcrypt (2^rounds итераций) и размер пула потоков хэширования паролей
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_WORKERS: int = 4
+
     # конфиг для redis
     REDIS_HOST: Optional[str]
     REDIS_PORT: Optional[int]
@@ -65,11 +132,50 @@ class Cfg(BaseSettings):
     def redis_url(self):
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
 
+    @property
+    def redis_url_test(self) -> str:
+        """
+        Путь подключения к тестовому redis (отдельная БД 15) для тестов с redis.
+        :return: dsn
+        """
+        return "redis://localhost:6379/15"
+
+    # отправка outbox в celery: размер пачки и интервал опроса таблицы в секундах
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_INTERVAL: float = 1.0
+    # повтор после ошибки отправки: задержка OUTBOX_RETRY_BACKOFF * 2^(попытка-1) секунд, не больше
+    # OUTBOX_RETRY_MAX_BACKOFF; после OUTBOX_MAX_ATTEMPTS ошибок сообщение переводится в dead letter
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETRY_BACKOFF: float = 5.0
+    OUTBOX_RETRY_MAX_BACKOFF: float = 3600.0
+
     # конфиг для почтовой рассылки для celery
     SMTP_HOST: Optional[str]
     SMTP_PORT: Optional[int]
     SMTP_GMAIL: Optional[str]
     SMTP_PASSWORD: Optional[str]
+    # SMTP поверх TLS (SMTP_SSL), False - без шифрования (локальный SMTP, например aiosmtpd в тестах)
+    SMTP_SSL: bool = True
+    SMTP_TIMEOUT: float = 10.0
+    # постоянные SMTP-соединения на процесс воркера celery и писем на одно соединение до переподключения
+    SMTP_POOL_SIZE: int = 2
+    SMTP_MAX_MESSAGES: int = 100
+
+    # варианты фото гостиниц: размеры (вписываются с сохранением пропорций) и форматы (webp, avif, jpeg),
+    # исполнителей для обработки пачки фото (потоки в задаче celery, процессы из командной строки)
+    IMAGE_SIZES: List[Tuple[int, int]] = [(1000, 500), (200, 100)]
+    IMAGE_FORMATS: List[Literal["webp", "avif", "jpeg"]] = ["webp", "avif", "jpeg"]
+    IMAGE_WORKERS: int = 4
+    # хранилище загруженных фото (вне static, отдается только под /images/store) и максимальный размер фото в байтах
+    IMAGE_STORE_DIR: str = "storage/images"
+    IMAGE_MAX_SIZE: int = 10 * 1024 * 1024
+    # кэш вариантов фото, построенных по запросу: папка, максимальный размер в байтах, потоков построения
+    IMAGE_CACHE_DIR: str = "cache/images"
+    IMAGE_CACHE_SIZE: int = 512 * 1024 * 1024
+    IMAGE_RESIZE_WORKERS: int = 4
+
+    # порт метрик воркера celery (prometheus), None - метрики не публикуются
+    CELERY_METRICS_PORT: Optional[int]
 
     class Config:
         """
@@ -1,7 +1,5 @@
-import time
-
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi_cache import FastAPICache
@@ -11,15 +9,21 @@ from sqladmin import Admin
 
 from app.admin_panel.auth import authentication_backend
 from app.admin_panel.views import BookingAdmin, HotelAdmin, RoomAdmin, UserAdmin
-from app.logger import logger
+from app.auth.revocation import token_versions
 from app.router.auth import router as auth_router
 from app.router.booking import router as booking_router
 from app.router.hotel import router as hotel_router
+from app.router.images import ImmutableStaticFiles
+from app.router.images import router as images_router
 from app.router.pages import router as pages_router
 from app.router.room import router as room_router
 from app.router.uploader import router as uploader_router
 from app.router.user import router as user_router
-from app.storage.database import engine
+from app.storage.cache import availability_cache
+from app.storage.database import engine, prewarm_pool
+from app.storage.images import image_store
+from app.tasks.outbox import outbox_dispatcher
+from app.timing import TimingMiddleware
 from config import cfg
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -35,9 +39,12 @@ app.include_router(hotel_router)
 app.include_router(room_router)
 app.include_router(booking_router)
 app.include_router(pages_router)
+app.include_router(images_router)
 
 # монтирование папки static
 app.mount("/frontend/static", StaticFiles(directory="app/frontend/static"), "static")
+# фото из контентно-адресуемого хранилища: URL версионирован хэшем, кэшируется навсегда
+app.mount(image_store.url, ImmutableStaticFiles(directory=image_store.root), "images_store")
 # Подключение CORS, чтобы запросы к API могли приходить из браузера
 origins = [
     # 3000 - порт, на котором работает фронтенд на React.js
@@ -53,44 +60,8 @@ app.add_middleware(
                    "Access-Control-Allow-Origin",
                    "Authorization"],
 )
-
-
-@app.middleware("http")
-async def request_time_count(request: Request, call_next):
-    """
-    Middleware для запросов.
-    :param request: тело запроса
-    :param call_next: хендлер
-    """
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-
-    func = request.scope.get("route", None)
-    if func is not None:
-        func = func.name
-
-    URL = request.url.path
-    if URL == "/metrics":
-        return response
-
-    extra = {
-        "func": func,
-        "endpoint": URL,
-        "method": request.method,
-        "status_code": response.status_code,
-        "duration": round(process_time, 4),
-    }
-
-    # failed ответы
-    if response.status_code in [400, 401, 403, 422, 500]:
-        logger.error(msg="failed", extra=extra)
-        return response
-
-    # success ответы
-    logger.info(msg="success", extra=extra)
-
-    return response
+# время запроса и его этапов: заголовок Server-Timing и лог запроса
+app.add_middleware(TimingMiddleware)
 
 
 # логгирование ошибок в SENTRY
@@ -113,6 +84,21 @@ async def startup():
     """
     redis = aioredis.from_url(cfg.redis_url, encoding="utf8", decode_responses=True)
     FastAPICache.init(RedisBackend(redis), prefix="booking-cache")
+    availability_cache.init(redis)
+    token_versions.init(redis)
+    # открытие соединений пула с БД до первых запросов
+    await prewarm_pool()
+    # фоновая отправка outbox (письма с подтверждением бронирований) в celery
+    outbox_dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Вызывается при остановке сервиса (при событии 'shutdown').
+    Остановка отправки outbox: неотправленные сообщения отправит следующий запуск.
+    """
+    await outbox_dispatcher.stop()
 
 
 # Подключение Prometheus
@@ -8,6 +8,7 @@ from config import cfg
 # from app.models.user import User
 # from app.models.booking import Booking
 # from app.models.hotel import Hotel
+from app.models.outbox import Outbox
 # from app.models.room import Room
 
 # this is the Alembic Config object, which provides
@@ -24,7 +25,9 @@ if config.config_file_name is not None:
 # импорт моделей для обогащения Base
 from app.models.booking import Booking
 from app.models.hotel import Hotel
+from app.models.outbox import Outbox
 from app.models.room import Room
+from app.models.room_inventory import RoomInventory
 from app.models.user import User
 
 # add your model's MetaData object here
@@ -36,7 +39,9 @@ __all__ = (
     "User",
     "Booking",
     "Hotel",
-    "Room"
+    "Room",
+    "RoomInventory",
+    "Outbox",
 )
 
 target_metadata = Base.metadata